@@ -44,10 +44,13 @@ from cc3.statistics.models import Dashboard
 from icare4u_front.community_admin.forms import MiniOperatorForm, \
     CommunityTerminalModelForm, reward_percentage_choices, \
     CommunityOperatorModelForm
+from icare4u_front.profile.managers import annotate_profile_type
 from icare4u_front.profile.models import (
     BusinessProfile, InstitutionProfile, CharityProfile,
     IndividualProfile, UserProfile)
-from icare4u_front.profile.utils import generate_mandate_id
+from icare4u_front.profile.user_search import match_user_profiles
+from icare4u_front.profile.utils import (
+    generate_mandate_id, get_cached_account_balances)
 from icare4u_front.stadlander.models import StadlanderProfile
 
 from .models import (
@@ -99,8 +102,24 @@ class CommunityUsersChangeList(ChangeList):
             kwargs={'pk': profile_pk})
 
     def get_queryset(self, request):
-        return super(
-            CommunityUsersChangeList, self).get_queryset(request).distinct()
+        # Profile types are joined in, so ``url_for_result`` runs no queries.
+        return annotate_profile_type(super(
+            CommunityUsersChangeList, self).get_queryset(request))
+
+    def get_results(self, request):
+        """
+        Looks up the balances of the users of the page concurrently, and
+        keeps each on its profile as ``page_balance`` for
+        ``current_balance2``.
+        """
+        super(CommunityUsersChangeList, self).get_results(request)
+
+        if 'current_balance2' in self.list_display:
+            balances = get_cached_account_balances(
+                [result.user.username for result in self.result_list],
+                getattr(settings, 'COMMUNITY_ADMIN_BALANCE_WORKERS', 8))
+            for result in self.result_list:
+                result.page_balance = balances.get(result.user.username)
 
 
 class CommunityAdminSite(admin.AdminSite):
@@ -170,6 +189,8 @@ class CommunityUserAdmin(CommunityAdminStadlanderAdminMixin, admin.ModelAdmin):
         'current_balance2',
         'wants_newsletter2',
     )
+    # Searched through the ``UserSearchDocument``s, see
+    # ``get_search_results``.
     search_fields = (
         'first_name',
         'last_name',
@@ -189,6 +210,8 @@ class CommunityUserAdmin(CommunityAdminStadlanderAdminMixin, admin.ModelAdmin):
     )
     list_filter = ('community', 'cyclos_group', 'wants_newsletter',
                    'user__is_active', 'gender')
+    # Relations of the ``list_display`` methods, loaded with the page.
+    list_select_related = ('user', 'community', 'cyclos_group')
     filter_horizontal = ('categories',)
 
     individual_profile_on_create_url_name = \
@@ -239,7 +262,11 @@ class CommunityUserAdmin(CommunityAdminStadlanderAdminMixin, admin.ModelAdmin):
     is_active_lookup.boolean = True
 
     def current_balance2(self, obj):
-        current_balance = obj.current_balance
+        # Looked up for the page by ``CommunityUsersChangeList.get_results``.
+        if hasattr(obj, 'page_balance'):
+            current_balance = obj.page_balance
+        else:
+            current_balance = obj.current_balance
         try:
             return mark_safe("<div style='text-align:right'>" +
                              str(floatformat(current_balance, 0)) +
@@ -253,6 +280,13 @@ class CommunityUserAdmin(CommunityAdminStadlanderAdminMixin, admin.ModelAdmin):
     wants_newsletter2.short_description = _(u"Wants Newsletter?")
     wants_newsletter2.boolean = True
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Searches the full-text indexed search documents of the profiles
+        instead of joining all the ``search_fields``.
+        """
+        return match_user_profiles(queryset, search_term), False
+
     def get_actions(self, request):
         # #3503 Disable delete and deactivate
         actions = super(CommunityUserAdmin, self).get_actions(request)
@@ -1085,6 +1119,10 @@ class CommunityCardAdmin(CommunityAdminStadlanderAdminMixin, CardAdmin):
 
     ordering = ('-activation_date', 'number__number')
 
+    # Relations of the ``list_display`` methods, loaded with the page.
+    list_select_related = (
+        'number', 'owner__cc3_profile__userprofile__individual_profile')
+
     add_form = CommunityCardForm
     add_form_template = 'community_admin/add_card.html'
     change_list_template = 'community_admin/cards/card/change_list.html'
@@ -1248,6 +1286,9 @@ class CommunityTerminalAdmin(CommunityAdminStadlanderAdminMixin, TerminalAdmin):
         'comments',
     )
 
+    # Relations of the ``list_display`` methods, loaded with the page.
+    list_select_related = ('business__cc3_profile',)
+
     exclude = ('removed_date',)
 
     form = CommunityTerminalModelForm
@@ -1839,6 +1880,8 @@ class CommunityFulfillmentAdmin(admin.ModelAdmin):
                     'options'
                     )
     ordering = ('-status', '-id',)
+    # Relations of the ``list_display`` methods, loaded with the page.
+    list_select_related = ('profile__user', 'profile__userprofile')
     raw_id_fields = ('profile',)
     actions = [admin_action_export_xls]
     search_fields = (
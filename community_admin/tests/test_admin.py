@@ -0,0 +1,101 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from mock import patch
+
+from cc3.cards.models import (
+    CARD_FULLFILLMENT_CHOICE_NEW, Card, Fulfillment, Terminal)
+from cc3.cards.tests.test_factories import CardFactory, TerminalFactory
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+from cc3.cyclos.tests.test_factories import UserFactory
+
+from icare4u_front.profile.models import UserProfile
+from icare4u_front.profile.tests.test_factories import UserProfileFactory
+
+from ..admin import admin_site
+
+# Rows on the measured changelist pages.
+PAGE_ROWS = 5
+
+
+class ChangelistQueryBudgetMixin(object):
+    """
+    Renders the changelist of ``model`` in the community admin with one row
+    and with a page of rows, and asserts both take the same number of
+    queries, at most ``query_budget``. The test cases define ``create_row``
+    to add a row.
+    """
+    model = None
+    query_budget = 15
+
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+        self.admin_user = UserFactory.create(is_staff=True, is_superuser=True)
+
+    def changelist_queries(self):
+        request = RequestFactory().get('/')
+        request.user = self.admin_user
+
+        with CaptureQueriesContext(connection) as context:
+            admin_site._registry[self.model].changelist_view(request).render()
+        return len(context)
+
+    def test_query_budget(self):
+        self.create_row()
+        one_row = self.changelist_queries()
+
+        for _ in range(PAGE_ROWS - 1):
+            self.create_row()
+        page = self.changelist_queries()
+
+        self.assertEqual(page, one_row)
+        self.assertLessEqual(page, self.query_budget)
+
+
+class CommunityUserAdminTestCase(ChangelistQueryBudgetMixin, TestCase):
+    model = UserProfile
+
+    def create_row(self):
+        UserProfileFactory.create()
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    @patch('icare4u_front.profile.utils.get_account_balances')
+    def test_page_balances(self, mock):
+        """
+        Tests the balances of a page are looked up once, without the cache.
+        """
+        for _ in range(PAGE_ROWS):
+            self.create_row()
+        mock.side_effect = lambda usernames, workers: dict(
+            (username, 10) for username in usernames)
+
+        self.changelist_queries()
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual(len(mock.call_args[0][0]), PAGE_ROWS)
+
+
+class CommunityCardAdminTestCase(ChangelistQueryBudgetMixin, TestCase):
+    model = Card
+
+    def create_row(self):
+        CardFactory.create(owner=UserProfileFactory.create().user)
+
+
+class CommunityTerminalAdminTestCase(ChangelistQueryBudgetMixin, TestCase):
+    model = Terminal
+
+    def create_row(self):
+        TerminalFactory.create(business=UserProfileFactory.create().user)
+
+
+class CommunityFulfillmentAdminTestCase(ChangelistQueryBudgetMixin, TestCase):
+    model = Fulfillment
+
+    def create_row(self):
+        Fulfillment.objects.create(
+            profile=UserProfileFactory.create(),
+            status=CARD_FULLFILLMENT_CHOICE_NEW)
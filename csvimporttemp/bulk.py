@@ -0,0 +1,143 @@
+"""
+Bulk import of the Stadlander ``Huurcontract`` and ``Positoos`` files.
+
+Saving the rows one by one checks the ``StadlanderProfile`` of every row and
+links the duplicates row by row (see ``can_save`` and ``handle_duplicates``).
+Here the known ``rel_number``s are loaded once, the rows of unknown tenants
+are dropped in memory, the others are inserted with chunked ``bulk_create``
+and the duplicates are linked afterwards, per group of rows.
+"""
+import datetime
+import logging
+from collections import defaultdict
+
+from django.db.models import Case, IntegerField, When, Value
+from django.db.transaction import atomic
+
+from .models import Huurcontract, Positoos
+
+LOG = logging.getLogger(__name__)
+
+# Rows inserted, and parent links updated, per query.
+CHUNK_SIZE = 1000
+
+# Fields of the rows which are duplicates of each other, by model.
+DUPLICATE_FIELDS = {
+    Huurcontract: ('persoonsnummer', 'contractnummer'),
+    Positoos: ('persoonsnummer',),
+}
+
+
+def known_rel_numbers():
+    """
+    Returns the set of the ``rel_number``s of the Stadlander profiles.
+    """
+    from ..stadlander.models import StadlanderProfile
+
+    return set(
+        StadlanderProfile.objects.values_list('rel_number', flat=True))
+
+
+def rel_number(persoonsnummer):
+    try:
+        return int(persoonsnummer)
+    except (TypeError, ValueError):
+        return None
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for start in xrange(0, len(items), size):
+        yield items[start:start + size]
+
+
+def huurcontract_parents(rows):
+    """
+    Returns the parent of every ``Huurcontract`` of a group: the one with the
+    latest ``ingangsdatum`` (the last inserted of those) is the parent of the
+    others.
+
+    :param rows: ``(pk, ingangsdatum)`` tuples.
+    :return: Dictionary of the parent pk (``None`` for the parent itself) by
+    pk.
+    """
+    parent = max(rows, key=lambda row: (row[1] or datetime.date.min, row[0]))
+    return dict(
+        (pk, None if pk == parent[0] else parent[0]) for pk, _ in rows)
+
+
+def positoos_parents(rows):
+    """
+    Returns the parent of every ``Positoos`` of a group: the first inserted
+    is the parent of the others.
+
+    :param rows: ``(pk,)`` tuples.
+    """
+    parent = min(row[0] for row in rows)
+    return dict((pk, None if pk == parent else parent) for pk, in rows)
+
+
+def link_duplicates(model, persoonsnummers):
+    """
+    Sets the ``parent`` of the rows of ``model`` for the given
+    ``persoonsnummers``, as ``handle_duplicates`` does row by row.
+
+    :return: The number of rows whose parent changed.
+    """
+    fields = DUPLICATE_FIELDS[model]
+    if model is Huurcontract:
+        get_parents, extra_fields = huurcontract_parents, ('ingangsdatum',)
+    else:
+        get_parents, extra_fields = positoos_parents, ()
+
+    groups = defaultdict(list)
+    current = {}
+    for persoonsnummers_chunk in chunks(sorted(persoonsnummers)):
+        for values in model.objects.filter(
+                persoonsnummer__in=persoonsnummers_chunk).values_list(
+                'pk', 'parent_id', *(fields + extra_fields)):
+            pk, parent_id = values[:2]
+            current[pk] = parent_id
+            groups[values[2:2 + len(fields)]].append(
+                (pk,) + values[2 + len(fields):])
+
+    changes = {}
+    for rows in groups.itervalues():
+        for pk, parent_id in get_parents(rows).iteritems():
+            if current[pk] != parent_id:
+                changes[pk] = parent_id
+
+    for pks in chunks(sorted(changes)):
+        model.objects.filter(pk__in=pks).update(parent=Case(
+            *[When(pk=pk, then=Value(changes[pk])) for pk in pks],
+            output_field=IntegerField()))
+
+    return len(changes)
+
+
+def bulk_import(model, instances):
+    """
+    Inserts the unsaved ``instances`` of ``Huurcontract`` or ``Positoos``
+    whose ``persoonsnummer`` is the ``rel_number`` of a Stadlander profile,
+    and links them to their duplicates.
+
+    :return: Tuple of the number of rows inserted and dropped.
+    """
+    rel_numbers = known_rel_numbers()
+
+    valid = []
+    dropped = 0
+    for instance in instances:
+        if rel_number(instance.persoonsnummer) in rel_numbers:
+            valid.append(instance)
+        else:
+            dropped += 1
+
+    with atomic():
+        for instances_chunk in chunks(valid):
+            model.objects.bulk_create(instances_chunk)
+        linked = link_duplicates(
+            model, set(instance.persoonsnummer for instance in valid))
+
+    LOG.info(u'Imported {0} {1} rows, dropped {2}, linked {3}'.format(
+        len(valid), model.__name__, dropped, linked))
+    return len(valid), dropped
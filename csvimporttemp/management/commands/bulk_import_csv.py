@@ -0,0 +1,59 @@
+import csv
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from ...bulk import bulk_import
+
+LOG = logging.getLogger(__name__)
+
+
+def read_instances(model, path, delimiter):
+    """
+    Yields an unsaved ``model`` instance for every row of the CSV file
+    ``path``, whose header row names the fields of the model. Rows with
+    invalid values are logged and skipped.
+    """
+    with open(path, 'rb') as csv_file:
+        reader = csv.reader(csv_file, delimiter=delimiter)
+        fields = [model._meta.get_field(name.strip())
+                  for name in next(reader)]
+
+        for line, row in enumerate(reader, 2):
+            values = {}
+            try:
+                for field, value in zip(fields, row):
+                    value = value.decode('utf-8').strip()
+                    if value == u'' and field.null:
+                        value = None
+                    values[field.attname] = field.to_python(value)
+            except ValidationError, e:
+                LOG.error(u'{0} line {1}: {2}'.format(path, line, e))
+                continue
+            yield model(**values)
+
+
+class Command(BaseCommand):
+    help = 'Bulk import a CSV file of Huurcontract or Positoos rows, ' \
+           'whose header row names the model fields'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='csvimporttemp.Huurcontract or '
+                                          'csvimporttemp.Positoos')
+        parser.add_argument('path')
+        parser.add_argument('--delimiter', default=';')
+
+    def handle(self, *args, **options):
+        if options['model'] not in settings.UPLOAD_MODELS:
+            raise CommandError(
+                u'{0} is not one of {1}'.format(
+                    options['model'], ', '.join(settings.UPLOAD_MODELS)))
+        model = apps.get_model(options['model'])
+
+        imported, dropped = bulk_import(model, read_instances(
+            model, options['path'], options['delimiter']))
+        LOG.info(u'Imported {0}: {1} rows, {2} without Stadlander '
+                 u'profile'.format(options['path'], imported, dropped))
@@ -3,7 +3,7 @@ import datetime
 import logging
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models
 
 LOG = logging.getLogger(__name__)
 
@@ -22,6 +22,48 @@ def can_save(instance):
     return False
 
 
+class HuurcontractQuerySet(models.QuerySet):
+
+    # Fields of the latest child contract read by the ``old_*`` properties.
+    LATEST_CHILD_FIELDS = (
+        'einddatum', 'huurprijs', 'datum_eind_afrekening',
+        'bedrag_eind_afrekening')
+
+    def with_latest_child(self):
+        """
+        Annotates the contracts with the ``LATEST_CHILD_FIELDS`` of their
+        child with the latest ``einddatum``, as ``latest_child_<field>``, in
+        the same query. Of children ending on the same date, the last one
+        created is the latest.
+        """
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        select = {}
+        for field in self.LATEST_CHILD_FIELDS:
+            column = qn(self.model._meta.get_field(field).column)
+            select['latest_child_{0}'.format(field)] = (
+                'SELECT child.{column} FROM {table} child '
+                'WHERE child.{parent} = {table}.{pk} '
+                'ORDER BY child.{einddatum} DESC, child.{pk} DESC '
+                'LIMIT 1'.format(
+                    column=column, table=table,
+                    parent=qn(self.model._meta.get_field('parent').column),
+                    pk=qn(self.model._meta.pk.column),
+                    einddatum=qn(
+                        self.model._meta.get_field('einddatum').column)))
+        return self.extra(select=select)
+
+
+class HuurcontractManager(models.Manager.from_queryset(HuurcontractQuerySet)):
+    """
+    Manager annotating every contract with its latest child values, see
+    ``HuurcontractQuerySet.with_latest_child``.
+    """
+    def get_queryset(self):
+        return super(
+            HuurcontractManager, self).get_queryset().with_latest_child()
+
+
 class Huurcontract(models.Model):
     contractnummer = models.CharField(max_length=20)
     vestigingnummer = models.IntegerField()
@@ -39,6 +81,8 @@ class Huurcontract(models.Model):
     parent = models.ForeignKey(
         'self', null=True, blank=True, related_name='children')
 
+    objects = HuurcontractManager()
+
     def __unicode__(self):
         return u"Huurcontract: persoonsnummer {0}".format(self.persoonsnummer)
 
@@ -47,59 +91,52 @@ class Huurcontract(models.Model):
         return datetime.date(
             self.ingangsdatum.year, self.ingangsdatum.month, 1)
 
-    # Is there a lambda (?) way of doing this?
-    @property
-    def old_einddatum(self):
-        try:
-            old_huurcontract = self.children.all().order_by('-einddatum')[0]
-            return_value = old_huurcontract.einddatum
-        except IndexError:  # Huurcontract.DoesNotExist:
+    def get_latest_child_value(self, field):
+        """
+        Returns the value of ``field`` of the child contract with the latest
+        ``einddatum``, or ``None`` if there is no child. Of children ending on
+        the same date, the last one created is the latest.
+
+        Reads the ``latest_child_<field>`` annotation of
+        ``HuurcontractQuerySet.with_latest_child`` when present. Otherwise
+        the child is fetched once and kept on the instance.
+        """
+        annotation = 'latest_child_{0}'.format(field)
+        if hasattr(self, annotation):
+            return getattr(self, annotation)
+
+        if not hasattr(self, '_latest_child'):
+            self._latest_child = self.children.all().order_by(
+                '-einddatum', '-pk').first()
+        if self._latest_child is None:
             return None
+        return getattr(self._latest_child, field)
 
-        return return_value
+    @property
+    def old_einddatum(self):
+        return self.get_latest_child_value('einddatum')
 
     @property
     def old_huurprijs(self):
-        try:
-            old_huurcontract = self.children.all().order_by('-einddatum')[0]
-            return_value = old_huurcontract.huurprijs
-        except IndexError:  # Huurcontract.DoesNotExist:
-            return None
-
-        return return_value
+        return self.get_latest_child_value('huurprijs')
 
     @property
     def old_datum_eind_afrekening(self):
-        try:
-            old_huurcontract = self.children.all().order_by('-einddatum')[0]
-            return_value = old_huurcontract.datum_eind_afrekening
-        except IndexError:  # Huurcontract.DoesNotExist:
-            return None
-
-        return return_value
+        return self.get_latest_child_value('datum_eind_afrekening')
 
     @property
     def old_bedrag_eind_afrekening(self):
-        try:
-            old_huurcontract = self.children.all().order_by('-einddatum')[0]
-            return_value = old_huurcontract.bedrag_eind_afrekening
-        except IndexError:  # Huurcontract.DoesNotExist:
-            return None
-
-        return return_value
+        return self.get_latest_child_value('bedrag_eind_afrekening')
 
     @property
     def huurprijs_delta(self):
         # Calculate difference between parent and child[0] huurprijs (rent)
-
-        # get children - use most recent one
-        try:
-            old_huurcontract = self.children.all().order_by('-einddatum')[0]
-            delta = self.huurprijs - old_huurcontract.huurprijs
-        except IndexError:  # Huurcontract.DoesNotExist:
+        # use most recent child
+        old_huurprijs = self.old_huurprijs
+        if old_huurprijs is None:
             return None
 
-        return delta
+        return self.huurprijs - old_huurprijs
 
     def handle_duplicates(self, existing_instances):
         # assumes > 0 count of existing_instances
@@ -0,0 +1,59 @@
+import datetime
+
+from django.test import TestCase
+
+from .test_factories import HuurcontractFactory, StadlanderProfileFactory
+
+from ..bulk import bulk_import
+from ..models import Huurcontract, Positoos
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        StadlanderProfileFactory.create(rel_number='12345')
+        self.existing = HuurcontractFactory.create(
+            contractnummer='C1', persoonsnummer='12345',
+            ingangsdatum=datetime.date(2014, 5, 1))
+
+    def test_huurcontract(self):
+        """
+        Test rows without Stadlander profile are dropped, and the contract
+        with the latest ingangsdatum becomes the parent of its duplicates.
+        """
+        imported, dropped = bulk_import(Huurcontract, [
+            Huurcontract(contractnummer='C1', persoonsnummer='12345',
+                         vestigingnummer=1,
+                         ingangsdatum=datetime.date(2014, 6, 1)),
+            Huurcontract(contractnummer='C2', persoonsnummer='12345',
+                         vestigingnummer=1,
+                         ingangsdatum=datetime.date(2014, 4, 1)),
+            Huurcontract(contractnummer='C1', persoonsnummer='22222',
+                         vestigingnummer=1,
+                         ingangsdatum=datetime.date(2014, 6, 1)),
+        ])
+        self.assertEqual((imported, dropped), (2, 1))
+
+        parent = Huurcontract.objects.get(
+            contractnummer='C1', ingangsdatum=datetime.date(2014, 6, 1))
+        self.assertIsNone(parent.parent)
+        self.assertEqual(
+            Huurcontract.objects.get(pk=self.existing.pk).parent, parent)
+        self.assertIsNone(
+            Huurcontract.objects.get(contractnummer='C2').parent)
+        self.assertFalse(
+            Huurcontract.objects.filter(persoonsnummer='22222').exists())
+
+    def test_positoos(self):
+        """
+        Test the first Positoos row of a tenant is the parent of the others.
+        """
+        bulk_import(Positoos, [
+            Positoos(vestigingnummer=1, persoonsnummer='12345',
+                     pasnummer='1'),
+            Positoos(vestigingnummer=1, persoonsnummer='12345',
+                     pasnummer='2'),
+        ])
+
+        first = Positoos.objects.get(pasnummer='1')
+        self.assertIsNone(first.parent)
+        self.assertEqual(Positoos.objects.get(pasnummer='2').parent, first)
@@ -170,3 +170,60 @@ class CsvImportTempTests(TestCase):
         StadlanderProfile with the rel_number.
         """
         self.assertNotEqual(self.positoos_1.pk, None)
+
+    def test_default_with_latest_child(self):
+        huurcontract = Huurcontract.objects.get(pk=self.huurcontract_1.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(huurcontract.old_huurprijs, self.old_huurprijs)
+
+    def test_latest_child_tie(self):
+        """
+        Test the last created of the children ending on the same date is the
+        latest, with or without the annotations.
+        """
+        HuurcontractFactory.create(
+            huurprijs=450, ingangsdatum=datetime.date(2014, 4, 1),
+            einddatum=self.old_einddatum, persoonsnummer='12345',
+            parent=self.huurcontract_1)
+
+        self.assertEqual(
+            Huurcontract.objects.get(
+                pk=self.huurcontract_1.pk).old_huurprijs, 450)
+        self.assertEqual(
+            Huurcontract._base_manager.get(
+                pk=self.huurcontract_1.pk).old_huurprijs, 450)
+
+    def test_with_latest_child(self):
+        """
+        Test the values of the child contract are annotated, and read by the
+        properties without further queries.
+        """
+        with self.assertNumQueries(1):
+            huurcontracts = dict(
+                (huurcontract.pk, huurcontract) for huurcontract in
+                Huurcontract.objects.with_latest_child())
+            huurcontract_1 = huurcontracts[self.huurcontract_1.pk]
+            huurcontract_2 = huurcontracts[self.huurcontract_2.pk]
+
+            self.assertEqual(
+                huurcontract_1.old_einddatum, self.old_einddatum)
+            self.assertEqual(
+                huurcontract_1.old_datum_eind_afrekening,
+                self.old_datum_eind_afrekening)
+            self.assertEqual(
+                huurcontract_1.old_bedrag_eind_afrekening,
+                self.old_bedrag_eind_afrekening)
+            self.assertEqual(
+                huurcontract_1.huurprijs_delta, self.huurprijs_delta)
+            self.assertEqual(huurcontract_2.old_huurprijs, None)
+            self.assertEqual(huurcontract_2.huurprijs_delta, None)
+
+    def test_latest_child_fetched_once(self):
+        huurcontract = Huurcontract._base_manager.get(
+            pk=self.huurcontract_1.pk)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(huurcontract.old_huurprijs, self.old_huurprijs)
+            self.assertEqual(
+                huurcontract.huurprijs_delta, self.huurprijs_delta)
@@ -9,110 +9,63 @@ CUSTOM_SQL = {
     # USERS_BY_TYPE, for tabulatedData
     ##################################
 
-    'USERS_BY_TYPE': """
-SELECT 'Spaarders' AS 'Type gebruiker'
-      , SUM((CASE WHEN pind.profile_id IS NOT NULL THEN 1 ELSE 0 END)) AS 'Totaal nummer'
-      , SUM((CASE WHEN pind.profile_id IS NOT NULL AND puser_user.is_active=1 THEN 1 ELSE 0 END)) AS 'Actief gebruikers'
-
-FROM profile_userprofile AS puser
-        LEFT JOIN cyclos_cc3profile AS cc3p
-                ON cc3p.`id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN auth_user AS puser_user
-                ON puser_user.`id`=cc3p.`user_id`
-        LEFT JOIN profile_individualprofile AS pind
-                ON pind.`profile_id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN cyclos_cc3community AS community
-                ON cc3p.`community_id`=community.`id`
-WHERE {{community_filter}} True
-
-UNION ALL
-
-SELECT
-        'Winkeliers' AS 'Type gebruiker'
-      , SUM((CASE WHEN pbus.profile_id IS NOT NULL THEN 1 ELSE 0 END)) AS 'Totaal nummer'
-      , SUM((CASE WHEN pbus.profile_id IS NOT NULL AND puser_user.is_active=1 THEN 1 ELSE 0 END)) AS 'Actief gebruikers'
-
-FROM profile_userprofile AS puser
-        LEFT JOIN cyclos_cc3profile AS cc3p
-                ON cc3p.`id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN auth_user AS puser_user
-                ON puser_user.`id`=cc3p.`user_id`
-        LEFT JOIN profile_businessprofile AS pbus
-                ON pbus.`profile_id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN cyclos_cc3community AS community
-                ON cc3p.`community_id`=community.`id`
-WHERE {{community_filter}} True
-
-UNION ALL
+    # Reads the profile counts kept per community and profile type (see
+    # icare4u_front.profile.type_counts) instead of scanning the profiles.
 
-SELECT
-        'Spaardoelen' AS 'Type gebruiker'
-      , SUM((CASE WHEN pcha.profile_id IS NOT NULL THEN 1 ELSE 0 END)) AS 'Totaal nummer'
-      , SUM((CASE WHEN pcha.profile_id IS NOT NULL AND puser_user.is_active=1 THEN 1 ELSE 0 END)) AS 'Actief gebruikers'
-
-FROM profile_userprofile AS puser
-        LEFT JOIN cyclos_cc3profile AS cc3p
-                ON cc3p.`id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN auth_user AS puser_user
-                ON puser_user.`id`=cc3p.`user_id`
-        LEFT JOIN profile_charityprofile AS pcha
-                ON pcha.`profile_id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN cyclos_cc3community AS community
-                ON cc3p.`community_id`=community.`id`
-WHERE {{community_filter}} True
+    'USERS_BY_TYPE': """
+SELECT types.`label` AS 'Type gebruiker'
+      , COALESCE(SUM(counts.`total`), 0) AS 'Totaal nummer'
+      , COALESCE(SUM(counts.`active`), 0) AS 'Actief gebruikers'
 
-UNION ALL
+FROM
+    (SELECT 1 AS 'position', 'individual' AS 'profile_type', 'Spaarders' AS 'label'
+    UNION ALL SELECT 2, 'business', 'Winkeliers'
+    UNION ALL SELECT 3, 'charity', 'Spaardoelen'
+    UNION ALL SELECT 4, 'institution', 'Instellingen'
+    ) types
+
+    LEFT JOIN
+    (SELECT ptc.`profile_type`, ptc.`total`, ptc.`active`
+    FROM profile_profiletypecount AS ptc
+            LEFT JOIN cyclos_cc3community AS community
+                    ON ptc.`community_id`=community.`id`
+    WHERE {{community_filter}} True
+    ) counts
+            ON counts.`profile_type`=types.`profile_type`
 
-SELECT
-        'Instellingen' AS 'Type gebruiker'
-      , SUM((CASE WHEN pins.profile_id IS NOT NULL THEN 1 ELSE 0 END)) AS 'Totaal nummer'
-      , SUM((CASE WHEN pins.profile_id IS NOT NULL AND puser_user.is_active=1 THEN 1 ELSE 0 END)) AS 'Actief gebruikers'
-
-FROM profile_userprofile AS puser
-        LEFT JOIN cyclos_cc3profile AS cc3p
-                ON cc3p.`id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN auth_user AS puser_user
-                ON puser_user.`id`=cc3p.`user_id`
-        LEFT JOIN profile_institutionprofile AS pins
-                ON pins.`profile_id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN cyclos_cc3community AS community
-                ON cc3p.`community_id`=community.`id`
-WHERE {{community_filter}} True
+GROUP BY types.`position`, types.`label`
+ORDER BY types.`position`
 """,
     #######################################################
     # TOTAL_INDIVIDUAL_USERS_BY_MONTH, for discreteBarChart
     #######################################################
     # NB this doesn't do the differences (shown in wireframe) -- need to be handled in model
+    # Running totals are prefix sums over the monthly rollup (see
+    # icare4u_front.profile.user_growth), a few hundred rows at most.
 
     # NEED to use DATE(CONCAT(YEAR( date_joined), '-', MONTH(date_joined), '-01')) AS 'x' for date - and then format in python (through 'extra')
     # this is to take advantage of Python internationalisation
 
     'TOTAL_INDIVIDUAL_USERS_BY_MONTH': """
-SELECT a.mth as 'x', SUM(b.mtotal) as 'y1' FROM (SELECT EXTRACT(YEAR_MONTH FROM date_joined) AS 'mth'
-FROM auth_user AS puser_user
-	LEFT JOIN cyclos_cc3profile AS cc3p
-		ON cc3p.`user_id`=puser_user.`id`
-	LEFT JOIN profile_userprofile AS puser
-		ON puser.`cc3profile_ptr_id`=cc3p.`id`
-	LEFT JOIN profile_individualprofile AS pind
-		ON pind.`profile_id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN cyclos_cc3community AS community
-                ON cc3p.`community_id`=community.`id`
-WHERE {{community_filter}} pind.`id` IS NOT NULL AND puser_user.`is_active`=1
-GROUP BY EXTRACT(YEAR_MONTH FROM date_joined)) a, (SELECT EXTRACT(YEAR_MONTH FROM date_joined) AS 'mth', COUNT(*) AS 'mtotal'
-FROM auth_user AS puser_user
-	LEFT JOIN cyclos_cc3profile AS cc3p
-		ON cc3p.`user_id`=puser_user.`id`
-	LEFT JOIN profile_userprofile AS puser
-		ON puser.`cc3profile_ptr_id`=cc3p.`id`
-	LEFT JOIN profile_individualprofile AS pind
-		ON pind.`profile_id`=puser.`cc3profile_ptr_id`
-        LEFT JOIN cyclos_cc3community AS community
-                ON cc3p.`community_id`=community.`id`
-WHERE {{community_filter}} pind.`id` IS NOT NULL AND puser_user.`is_active`=1
-GROUP BY EXTRACT(YEAR_MONTH FROM date_joined)) b
-WHERE b.mth <= a.mth
-GROUP BY a.mth
+SELECT a.`month` AS 'x', SUM(b.`active`) AS 'y1'
+FROM
+    (SELECT DISTINCT ur.`month`
+    FROM profile_monthlyuserrollup AS ur
+            LEFT JOIN cyclos_cc3community AS community
+                    ON ur.`community_id`=community.`id`
+    WHERE {{community_filter}} ur.`profile_type`='individual' AND ur.`active`>0
+    ) a,
+
+    (SELECT ur.`month`, SUM(ur.`active`) AS 'active'
+    FROM profile_monthlyuserrollup AS ur
+            LEFT JOIN cyclos_cc3community AS community
+                    ON ur.`community_id`=community.`id`
+    WHERE {{community_filter}} ur.`profile_type`='individual' AND ur.`active`>0
+    GROUP BY ur.`month`
+    ) b
+
+WHERE b.`month` <= a.`month`
+GROUP BY a.`month`
 """,
 
 
@@ -121,31 +74,21 @@ GROUP BY a.mth
 ###############################################
 
 'TOTAL_OTHER_USERS_BY_MONTH': """
-SELECT q1.`x`, q2.`name`, count(q2.`id`) as 'y1', NULL as 'y2', NULL as 'y3'
+SELECT q1.`x`, 'Winkeliers' AS 'name', SUM(q2.`active`) as 'y1', NULL as 'y2', NULL as 'y3'
 
 FROM
-    (SELECT EXTRACT(YEAR_MONTH FROM date_joined) AS 'x'
-
-    FROM auth_user AS puser_user
-    WHERE  puser_user.`is_active`=1
-    GROUP BY EXTRACT(YEAR_MONTH FROM date_joined)
+    (SELECT DISTINCT ur.`month` AS 'x'
+    FROM profile_monthlyuserrollup AS ur
+    WHERE ur.`active`>0
     ) q1,
 
-    (SELECT puser_user.id, EXTRACT(YEAR_MONTH FROM date_joined) AS 'dj', 'Winkeliers' AS 'name'
-
-    FROM auth_user AS puser_user
-            LEFT JOIN cyclos_cc3profile AS cc3p
-                    ON cc3p.`user_id`=puser_user.`id`
-            LEFT JOIN profile_userprofile AS puser
-                    ON puser.`cc3profile_ptr_id`=cc3p.`id`
-            LEFT JOIN profile_businessprofile AS pind
-                    ON pind.`profile_id`=puser.`cc3profile_ptr_id`
-            LEFT JOIN cyclos_cc3community AS community
-                    ON cc3p.`community_id`=community.`id`
-    WHERE  pind.`id` IS NOT NULL AND puser_user.`is_active`=1
+    (SELECT ur.`month`, SUM(ur.`active`) AS 'active'
+    FROM profile_monthlyuserrollup AS ur
+    WHERE ur.`profile_type`='business' AND ur.`active`>0
+    GROUP BY ur.`month`
     ) q2
 
-WHERE q2.`dj` <= q1.`x`
+WHERE q2.`month` <= q1.`x`
 
 GROUP BY q1.`x`
 
@@ -153,31 +96,21 @@ GROUP BY q1.`x`
 UNION ALL
 
 
-SELECT q1.`x`, q2.`name`, NULL as 'y1', count(q2.`id`) as 'y2', NULL as 'y3'
+SELECT q1.`x`, 'Instellingen' AS 'name', NULL as 'y1', SUM(q2.`active`) as 'y2', NULL as 'y3'
 
 FROM
-    (SELECT EXTRACT(YEAR_MONTH FROM date_joined) AS 'x'
-
-    FROM auth_user AS puser_user
-    WHERE  puser_user.`is_active`=1
-    GROUP BY EXTRACT(YEAR_MONTH FROM date_joined)
+    (SELECT DISTINCT ur.`month` AS 'x'
+    FROM profile_monthlyuserrollup AS ur
+    WHERE ur.`active`>0
     ) q1,
 
-    (SELECT puser_user.id, EXTRACT(YEAR_MONTH FROM date_joined) AS 'dj', 'Instellingen' AS 'name'
-
-    FROM auth_user AS puser_user
-            LEFT JOIN cyclos_cc3profile AS cc3p
-                    ON cc3p.`user_id`=puser_user.`id`
-            LEFT JOIN profile_userprofile AS puser
-                    ON puser.`cc3profile_ptr_id`=cc3p.`id`
-            LEFT JOIN profile_institutionprofile AS pind
-                    ON pind.`profile_id`=puser.`cc3profile_ptr_id`
-            LEFT JOIN cyclos_cc3community AS community
-                    ON cc3p.`community_id`=community.`id`
-    WHERE  pind.`id` IS NOT NULL AND puser_user.`is_active`=1
+    (SELECT ur.`month`, SUM(ur.`active`) AS 'active'
+    FROM profile_monthlyuserrollup AS ur
+    WHERE ur.`profile_type`='institution' AND ur.`active`>0
+    GROUP BY ur.`month`
     ) q2
 
-WHERE q2.`dj` <= q1.`x`
+WHERE q2.`month` <= q1.`x`
 
 GROUP BY q1.`x`
 
@@ -185,31 +118,21 @@ GROUP BY q1.`x`
 UNION ALL
 
 
-SELECT q1.`x`, q2.`name`, NULL as 'y1', NULL as 'y2', count(q2.`id`) as 'y3'
+SELECT q1.`x`, 'Spaardoelen' AS 'name', NULL as 'y1', NULL as 'y2', SUM(q2.`active`) as 'y3'
 
 FROM
-    (SELECT EXTRACT(YEAR_MONTH FROM date_joined) AS 'x'
-
-    FROM auth_user AS puser_user
-    WHERE  puser_user.`is_active`=1
-    GROUP BY EXTRACT(YEAR_MONTH FROM date_joined)
+    (SELECT DISTINCT ur.`month` AS 'x'
+    FROM profile_monthlyuserrollup AS ur
+    WHERE ur.`active`>0
     ) q1,
 
-    (SELECT puser_user.id, EXTRACT(YEAR_MONTH FROM date_joined) AS 'dj', 'Spaardoelen' AS 'name'
-
-    FROM auth_user AS puser_user
-            LEFT JOIN cyclos_cc3profile AS cc3p
-                    ON cc3p.`user_id`=puser_user.`id`
-            LEFT JOIN profile_userprofile AS puser
-                    ON puser.`cc3profile_ptr_id`=cc3p.`id`
-            LEFT JOIN profile_charityprofile AS pind
-                    ON pind.`profile_id`=puser.`cc3profile_ptr_id`
-            LEFT JOIN cyclos_cc3community AS community
-                    ON cc3p.`community_id`=community.`id`
-    WHERE  pind.`id` IS NOT NULL AND puser_user.`is_active`=1
+    (SELECT ur.`month`, SUM(ur.`active`) AS 'active'
+    FROM profile_monthlyuserrollup AS ur
+    WHERE ur.`profile_type`='charity' AND ur.`active`>0
+    GROUP BY ur.`month`
     ) q2
 
-WHERE q2.`dj` <= q1.`x`
+WHERE q2.`month` <= q1.`x`
 
 GROUP BY q1.`x`
 """,
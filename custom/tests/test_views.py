@@ -12,6 +12,7 @@ from django.core.urlresolvers import reverse
 from django.test import TestCase
 from django.test.utils import override_settings
 
+from cc3.cards.tests.test_factories import CardFactory, CardNumberFactory
 from cc3.cyclos.common import Transaction
 
 from cc3.core.utils.test_backend import DummyCyclosBackend
@@ -431,3 +432,48 @@ class CustomContactNameAutoTestCase(TestCase):
         # Only return 2 of the 3 created profiles (one is who makes the
         # request).
         self.assertEqual(len(data), 1)
+
+    def test_no_matches(self):
+        """
+        Tests that no payees are returned when no name matches.
+        """
+        self.client.login(
+            username=self.profile_3.user.username, password='testing')
+
+        response = self.client.get(reverse(
+            'contact_name_auto',
+            kwargs={'community': self.community.pk}
+        ), {'contact_name': "Zzzzz", },
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), [])
+
+    def test_card_number_search(self):
+        """
+        Tests that numeric searches return the payees with a matching active
+        card.
+        """
+        CardFactory.create(
+            owner=self.profile_1.user, status='A',
+            number=CardNumberFactory.create(number='77771234'))
+        CardFactory.create(
+            owner=self.profile_2.user, status='B',
+            number=CardNumberFactory.create(number='77775678'))
+
+        self.client.login(
+            username=self.profile_3.user.username, password='testing')
+
+        response = self.client.get(reverse(
+            'contact_name_auto',
+            kwargs={'community': self.community.pk}
+        ), {'contact_name': "7777", },
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        self.assertEqual(response.status_code, 200)
+
+        data = json.loads(response.content)
+
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['pk'], self.profile_1.pk)
+        self.assertIn('77771234', data[0]['value'])
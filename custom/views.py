@@ -7,6 +7,7 @@ from string import digits
 from rest_framework.request import Request as RESTRequest
 
 from django.conf import settings
+from django.db.models import Q
 from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 from django.utils.translation import ugettext_lazy as _
@@ -21,6 +22,8 @@ from .forms import (
     ICare4uBusinessMapFilterForm, ICare4uCampaignFilterForm)
 from ..profile.models import (
     IndividualProfile, CharityProfile, UserProfile)
+from ..profile.payee_search import (
+    match_card_numbers, match_payees, oldest_card_numbers, rank_payees)
 
 LOG = logging.getLogger(__name__)
 
@@ -113,30 +116,19 @@ class ICare4uCampaignCreateView(CampaignCreateView):
         return initial
 
 
-def get_payees(request, ordered_user_pks=None):
+def filter_payees(request, profiles):
+    """
+    Filters a ``UserProfile`` queryset down to the active profiles the
+    request user can pay. The eligibility is part of the query, so it is
+    joined in the database.
+    """
     # Troeven payments are generally to Individuals ... so now samen doen
-    if ordered_user_pks:
-        payees = list(IndividualProfile.objects.filter(
-            profile__user__is_active=True,
-            profile__pk__in=ordered_user_pks
-        ).values_list('profile__pk', flat=True))
-        # ... but Individuals may also pay Good Causes
-        if request.user.get_profile().is_individual_profile():
-            payees.extend(list(CharityProfile.objects.filter(
-                profile__user__is_active=True,
-                profile__pk__in=ordered_user_pks
-            ).values_list('profile__pk', flat=True)))
-    else:
-        payees = list(IndividualProfile.objects.filter(
-            profile__user__is_active=True
-        ).values_list('profile__pk', flat=True))
-        # ... but Individuals may also pay Good Causes
-        if request.user.get_profile().is_individual_profile():
-            payees.extend(list(CharityProfile.objects.filter(
-                profile__user__is_active=True
-            ).values_list('profile__pk', flat=True)))
+    payees = Q(individual_profile__isnull=False)
+    # ... but Individuals may also pay Good Causes
+    if request.user.get_profile().is_individual_profile():
+        payees |= Q(charity_profile__isnull=False)
 
-    return payees
+    return profiles.filter(payees, user__is_active=True)
 
 
 # AJAX info views
@@ -183,39 +175,12 @@ def contact_name_auto(request, community=None):
         contact_name_filter = contact_name_filter[:contact_name_filter.find(
             '(') - 1]
 
-    # get candidate profile ids via raw SQL
-    from django.db import connection
-    cursor = connection.cursor()
-    sql_string = """
-        SELECT
-            p.id FROM
-                cyclos_cc3profile p JOIN
-
-                profile_userprofile up ON
-                    p.id = up.`cc3profile_ptr_id`
-        WHERE
-
-            TRIM(
-                CONCAT(p.first_name, ' ',tussenvoegsel,(
-                    CASE tussenvoegsel WHEN '' THEN '' ELSE ' ' END
-                ),p.last_name)) LIKE %s
-            OR p.business_name like %s
-
-        ORDER BY
-            p.last_name, TRIM(
-                CONCAT(p.first_name, ' ', IFNULL(tussenvoegsel,'')));
-    """
-
-    cursor.execute(sql_string, [u"%{0}%".format(contact_name_filter),
-                                u"%{0}%".format(contact_name_filter)])
-    ordered_user_pks = [x[0] for x in cursor.fetchall()]
-
-    payees = get_payees(request, ordered_user_pks)
-
     # NB UserProfile objects inherits from CC3Profile viewable, but excludes
     # good causes
-    profiles = UserProfile.objects.filter(pk__in=payees)
-    profiles = profiles.exclude(user=request.user).distinct()
+    profiles = match_payees(
+        filter_payees(request, UserProfile.objects.all()),
+        contact_name_filter)
+    profiles = profiles.exclude(user=request.user)
     request_user = User.objects.get(pk=request.user.id)
     profile = request_user.get_profile()
     if community:
@@ -232,16 +197,11 @@ def contact_name_auto(request, community=None):
 
         profiles = profiles.filter(community=community)
 
-    profile_names = list(profiles.distinct().values_list(
-        'pk',
-        'first_name',
-        'tussenvoegsel',
-        'last_name',
-        'user__email',
-        'user__pk',
-        'business_name'
-    ))
-    user_pk_list = [profile_name_data[5] for profile_name_data in profile_names]
+    profiles = list(rank_payees(
+        profiles, contact_name_filter,
+        limit=getattr(settings, 'CONTACT_AUTO_MAX_RESULTS', 20)
+    ).select_related('user'))
+    user_pk_list = [payee.user_id for payee in profiles]
 
     # get user card data - order in reverse so dictionary conversion gets oldest
     card_data = Card.objects.filter(
@@ -250,28 +210,29 @@ def contact_name_auto(request, community=None):
     ).values_list('owner__pk', 'number__number').order_by('-creation_date')
     card_number_dict = dict((a[0], a[1]) for a in card_data)
 
+    # best matches first
     data = []
-    for (profile_pk, first_name, tussenvoegsel, last_name,
-            email, user_pk, business_name) in profile_names:
-        if business_name:
-            appendage = u'{0} ({1})'.format(business_name, email)
+    for payee in profiles:
+        email = payee.user.email
+        if payee.business_name:
+            appendage = u'{0} ({1})'.format(payee.business_name, email)
         else:
-            card_number = card_number_dict.get(user_pk, None)
+            card_number = card_number_dict.get(payee.user_id, None)
             if card_number:
                 bracketed_details = u"{0}, {1}".format(email, card_number)
             else:
                 bracketed_details = email
 
-            if tussenvoegsel.strip() != '':
+            if payee.tussenvoegsel.strip() != '':
                 appendage = u'{0} {1} {2} ({3})'.format(
-                    first_name, tussenvoegsel, last_name, bracketed_details)
+                    payee.first_name, payee.tussenvoegsel, payee.last_name,
+                    bracketed_details)
             else:
                 appendage = u'{0} {1} ({2})'.format(
-                    first_name, last_name, bracketed_details)
+                    payee.first_name, payee.last_name, bracketed_details)
 
-        data.append({'pk': profile_pk, 'value': appendage})
+        data.append({'pk': payee.pk, 'value': appendage})
 
-    data.sort()
     json_data = json.dumps(data)
 
     return HttpResponse(json_data, content_type='application/json')
@@ -302,25 +263,8 @@ def card_name_auto(request, community=None):
             contact_name_filter != contact_name_filter_check):
         return HttpResponse('{}', content_type='application/json')
 
-    payees = get_payees(request)
-
-    profiles = UserProfile.objects.filter(pk__in=payees)
-    user_pk_list = profiles.distinct().values('user_id')
-
-    # get user card data - order in reverse so dictionary conversion gets oldest
-    card_data = Card.objects.filter(
-        owner__pk__in=user_pk_list,
-        status='A',
-        number__number__icontains=contact_name_filter
-    ).values_list('owner__pk', 'number__number').order_by('-creation_date')
-    card_number_dict = dict((a[0], a[1]) for a in card_data)
-
-    # refresh the user_pk_list after the card filter
-    user_pk_list = [a[0] for a in card_data]
-
-    profiles = profiles.filter(user_id__in=user_pk_list)
-    profiles = profiles.exclude(user=request.user).distinct().order_by(
-        'first_name', 'last_name')
+    profiles = filter_payees(
+        request, UserProfile.objects.exclude(user=request.user))
     request_user = User.objects.get(pk=request.user.id)
     profile = request_user.get_profile()
     if community:
@@ -337,33 +281,39 @@ def card_name_auto(request, community=None):
 
         profiles = profiles.filter(community=community)
 
-    profile_names = list(profiles.distinct().values_list(
+    # profiles with an active card number starting with the term, from the
+    # indexed payee card numbers, each with its oldest matching card
+    profile_names = list(match_card_numbers(
+        profiles, contact_name_filter).values_list(
         'pk',
         'first_name',
         'tussenvoegsel',
         'last_name',
         'user__email',
-        'user__pk'
-    ))
+        'user_id'
+    ).order_by(
+        'first_name', 'last_name', 'pk'
+    )[:getattr(settings, 'CONTACT_AUTO_MAX_RESULTS', 20)])
+    card_number_dict = oldest_card_numbers(
+        [e[5] for e in profile_names], contact_name_filter)
 
     data = []
-    for e in profile_names:
-        card_number = card_number_dict.get(e[5], None)
+    for (profile_pk, first_name, tussenvoegsel, last_name,
+            email, user_id) in profile_names:
+        card_number = card_number_dict.get(user_id)
         if card_number:
-            bracketed_details = u"{0}, {1}".format(e[4], card_number)
+            bracketed_details = u"{0}, {1}".format(email, card_number)
         else:
-            bracketed_details = e[4]
-
-        if e[2].strip() != '':
+            bracketed_details = email
+        if tussenvoegsel.strip() != '':
             appendage = u'{0} {1} {2} ({3})'.format(
-                e[1], e[2], e[3], bracketed_details)
+                first_name, tussenvoegsel, last_name, bracketed_details)
         else:
             appendage = u'{0} {1} ({2})'.format(
-                e[1], e[3], bracketed_details)
+                first_name, last_name, bracketed_details)
 
-        data.append({'pk': e[0], 'value': appendage})
+        data.append({'pk': profile_pk, 'value': appendage})
 
-    data.sort()
     json_data = json.dumps(data)
 
     return HttpResponse(json_data, content_type='application/json')
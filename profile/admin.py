@@ -7,7 +7,7 @@ from cc3.cyclos.admin import CC3ProfileAdmin
 
 from .models import (
     BusinessProfile, InstitutionProfile, CharityProfile, UserProfile,
-    IndividualProfile, SEPAXMLFile)
+    IndividualProfile, SEPAXMLFile, BalanceResetCheckpoint)
 
 
 def close_account(modeladmin, request, queryset):
@@ -155,7 +155,18 @@ class SEPAXMLFileAdmin(admin.ModelAdmin):
         return False
 
 
+class BalanceResetCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('period', 'business', 'status', 'started', 'finished')
+    list_filter = ('status', 'period')
+    readonly_fields = ('period', 'business', 'status', 'started', 'finished',
+                       'error')
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(SEPAXMLFile, SEPAXMLFileAdmin)
+admin.site.register(BalanceResetCheckpoint, BalanceResetCheckpointAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
 admin.site.register(IndividualProfile, IndividualProfileAdmin)
 admin.site.register(BusinessProfile, BusinessProfileAdmin)
@@ -0,0 +1,80 @@
+"""
+Renders the invoice PDFs of a month ahead of the downloads, in a pool of
+processes. Each worker loads the logo once, and the PDFs end up in the
+storage of ``profile.invoice_pdf.render_invoice_pdf``, where the downloads
+find them.
+"""
+import logging
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.db import connections
+from django.utils import translation
+
+from cc3.invoices.models import Invoice
+
+from .invoice_pdf import load_logo, render_invoice_pdf
+
+LOG = logging.getLogger(__name__)
+
+
+def _init_worker(language):
+    translation.activate(language)
+    load_logo()
+
+
+def render_invoice(invoice_id):
+    """
+    Renders and stores the PDF of an invoice, if it was not stored yet, and
+    deletes the PDFs of its previous contents.
+
+    :return: Tuple of ``invoice_id`` and whether it succeeded.
+    """
+    try:
+        invoice = Invoice.objects.select_related(
+            'currency', 'to_user__cc3_profile__country').get(pk=invoice_id)
+        render_invoice_pdf(invoice, delete_old=True)
+    except Exception, e:
+        LOG.error(u'Rendering the PDF of invoice {0} failed: {1}'.format(
+            invoice_id, e))
+        return invoice_id, False
+    return invoice_id, True
+
+
+def render_invoice_pdfs(invoice_ids, workers=None):
+    """
+    Renders and stores the PDFs of the given invoices, spread over at most
+    ``workers`` processes (``INVOICE_PDF_WORKERS`` by default).
+
+    :return: The number of invoices rendered or already stored, and the
+    number of failures.
+    """
+    invoice_ids = list(invoice_ids)
+    if workers is None:
+        workers = getattr(settings, 'INVOICE_PDF_WORKERS', 4)
+
+    if workers <= 1 or len(invoice_ids) <= 1:
+        results = [render_invoice(invoice_id) for invoice_id in invoice_ids]
+    else:
+        # The workers must open their own database connections.
+        connections.close_all()
+        pool = Pool(min(workers, len(invoice_ids)), _init_worker,
+                    (translation.get_language(),))
+        try:
+            results = pool.map(render_invoice, invoice_ids, chunksize=10)
+        finally:
+            pool.close()
+            pool.join()
+
+    failed = len([result for result in results if not result[1]])
+    return len(results) - failed, failed
+
+
+def render_month_invoice_pdfs(year, month, workers=None):
+    """
+    Renders and stores the PDFs of the invoices dated in ``month`` of
+    ``year``, see ``render_invoice_pdfs``.
+    """
+    return render_invoice_pdfs(Invoice.objects.filter(
+        inv_date__year=year, inv_date__month=month
+    ).values_list('pk', flat=True), workers)
@@ -5,8 +5,12 @@ https://github.com/simonluijk/django-invoice/blob/master/invoice/pdf.py
 
 BSD licensed.
 """
+import hashlib
+import json
 import logging
 import os
+import tempfile
+from io import BytesIO
 
 from reportlab.pdfgen.canvas import Canvas
 from reportlab.platypus import Table
@@ -15,7 +19,8 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 
 from django.conf import settings
-from django.utils.translation import ugettext as _
+from django.core.files.storage import FileSystemStorage
+from django.utils.translation import get_language, ugettext as _
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +29,20 @@ logo_image = getattr(
     os.path.join(settings.PROJECT_DIR, 'static/img/logo.png'))
 
 
+# Bump when the layout changes, so the stored PDFs are rendered again.
+INVOICE_PDF_VERSION = 1
+
+# Storage of the rendered PDFs, outside ``MEDIA_ROOT`` as they are only
+# served through the invoice download view (``draw_pdf``).
+invoice_storage = FileSystemStorage(location=getattr(
+    settings, 'INVOICE_PDF_ROOT',
+    os.path.join(os.path.dirname(settings.PROJECT_DIR), 'private',
+                 'invoices')))
+
+# Logo reader and size, loaded once per process by ``load_logo``.
+_logo = None
+
+
 def get_image_width_height(path, width=4*cm):
     image = utils.ImageReader(path)
     image_width, image_height = image.getSize()
@@ -32,14 +51,33 @@ def get_image_width_height(path, width=4*cm):
     return width, width * aspect
 
 
+def load_logo(width=4*cm):
+    """
+    Returns the ``ImageReader`` of the logo with its width and height on the
+    invoice, or ``None`` if the logo does not exist. The logo is read once
+    per process.
+    """
+    global _logo
+    if _logo is None:
+        try:
+            image = utils.ImageReader(logo_image)
+            image_width, image_height = image.getSize()
+            _logo = (image, width,
+                     width * image_height / float(image_width))
+        except IOError:
+            # Logo image file does not exist.
+            logger.error(
+                u"The image logo file for generating PDFs doesn't exist.")
+            _logo = False
+    return _logo or None
+
+
 def draw_header(canvas):
     """ Draws the invoice header """
-    try:
-        width, height = get_image_width_height(logo_image)
-        canvas.drawImage(logo_image, 1.0 * cm, -2.5 * cm, width, height)
-    except IOError:
-        # Logo image file does not exist.
-        logger.error(u"The image logo file for generating PDFs doesn't exist.")
+    logo = load_logo()
+    if logo:
+        image, width, height = logo
+        canvas.drawImage(image, 1.0 * cm, -2.5 * cm, width, height)
 
 
 def draw_address(canvas):
@@ -58,9 +96,9 @@ def draw_address(canvas):
     canvas.drawText(textobject)
     canvas.line(1 * cm, -3.0 * cm, 20 * cm, -3.0 * cm)
 
-def draw_footer(canvas, invoice):
+def draw_footer(canvas, positive_total):
     """ Draws the invoice footer """
-    if invoice.get_total() > 0:
+    if positive_total:
         note = (
             _(u'Gelieve dit bedrag binnen 14 dagen over te maken op rekening'),
             _(u'NL15 RABO 0154443476 t.n.v. Stichting Derdengelden Positoos'),
@@ -75,7 +113,68 @@ def draw_footer(canvas, invoice):
     canvas.drawText(textobject)
 
 
-def draw_pdf(buffer, invoice):
+def invoice_content(invoice):
+    """
+    Returns everything ``draw_content`` draws for ``invoice``, in the active
+    language.
+    """
+    currency_symbol = invoice.currency.symbol
+    profile = invoice.to_user.cc3_profile
+
+    # Items
+    data = [
+        [_(u'Description'), _(u'Total')]
+    ]
+
+    for item in invoice.lines.all():
+        data.append([
+            item.description,
+            u"{0:.2f} {1}".format(item.grand_total, currency_symbol),
+        ])
+
+#    data.append([u'', _(u'Sub total:') + u" {0:.2f} {1}".format(
+#        invoice.get_sub_total(), currency_symbol)])
+#    data.append([u'',  _(u'Tax:') + u" {0:.2f} {1}".format(
+#        invoice.get_tax(), currency_symbol)])
+    total = invoice.get_total()
+    data.append([u'',  _(u'Total:') + u" {0:.2f} {1}".format(
+        total, currency_symbol)])
+
+    return {
+        'version': INVOICE_PDF_VERSION,
+        'language': get_language(),
+        'logo': logo_image,
+        'positive_total': total > 0,
+        # Client address
+        'address': [
+            _(u'Afrekening'),
+            u'',
+            profile.business_name,
+            _(u"t.a.v. de Crediteurenadministratie"),
+            profile.address,
+            u"{0} {1}".format(profile.postal_code, profile.city),
+            unicode(profile.country.name),
+        ],
+        # Info
+        'info': [
+            _(u'Invoice no: {0}'.format(invoice.inv_no)),
+            _(u'Invoice Date: {0}'.format(
+                invoice.inv_date.strftime('%d %b %Y'))),
+        ],
+        'items': data,
+    }
+
+
+def content_hash(content):
+    """
+    Returns a hash of the ``invoice_content`` of an invoice, which changes
+    whenever its PDF would.
+    """
+    return hashlib.sha1(json.dumps(
+        content, sort_keys=True, default=unicode)).hexdigest()
+
+
+def draw_content(buffer, content):
     """ Draws the invoice """
     canvas = Canvas(buffer, pagesize=A4)
     canvas.translate(0, 29.7 * cm)
@@ -86,55 +185,27 @@ def draw_pdf(buffer, invoice):
     canvas.restoreState()
 
     canvas.saveState()
-    draw_footer(canvas, invoice)
+    draw_footer(canvas, content['positive_total'])
     canvas.restoreState()
 
     canvas.saveState()
     draw_address(canvas)
     canvas.restoreState()
 
-    currency_symbol = invoice.currency.symbol
-
     # Client address
-    profile = invoice.to_user.cc3_profile
     textobject = canvas.beginText(1.5 * cm, -4.5 * cm)
-
-    textobject.textLine(_(u'Afrekening'))
-    textobject.textLine('')
-
-    textobject.textLine(profile.business_name)
-    textobject.textLine(_(u"t.a.v. de Crediteurenadministratie"))
-    textobject.textLine(profile.address)
-    textobject.textLine(u"{0} {1}".format(profile.postal_code, profile.city))
-    textobject.textLine(unicode(profile.country.name))
+    for line in content['address']:
+        textobject.textLine(line)
     canvas.drawText(textobject)
 
     # Info
     textobject = canvas.beginText(1.5 * cm, -8.75 * cm)
-    textobject.textLine(_(u'Invoice no: {0}'.format(invoice.inv_no)))
-    textobject.textLine(_(u'Invoice Date: {0}'.format(
-        invoice.inv_date.strftime('%d %b %Y'))))
+    for line in content['info']:
+        textobject.textLine(line)
     canvas.drawText(textobject)
 
     # Items
-    data = [
-        [_(u'Description'), _(u'Total')]
-    ]
-
-    for item in invoice.lines.all():
-        data.append([
-            item.description,
-            u"{0:.2f} {1}".format(item.grand_total, currency_symbol),
-        ])
-
-#    data.append([u'', _(u'Sub total:') + u" {0:.2f} {1}".format(
-#        invoice.get_sub_total(), currency_symbol)])
-#    data.append([u'',  _(u'Tax:') + u" {0:.2f} {1}".format(
-#        invoice.get_tax(), currency_symbol)])
-    data.append([u'',  _(u'Total:') + u" {0:.2f} {1}".format(
-        invoice.get_total(), currency_symbol)])
-
-    table = Table(data, colWidths=[14.5 * cm, 4 * cm])
+    table = Table(content['items'], colWidths=[14.5 * cm, 4 * cm])
     table.setStyle([
         ('FONT', (0, 0), (-1, -1), 'Helvetica'),
         ('FONTSIZE', (0, 0), (-1, -1), 10),
@@ -149,3 +220,80 @@ def draw_pdf(buffer, invoice):
 
     canvas.showPage()
     canvas.save()
+
+
+def invoice_pdf_path(invoice_id, digest):
+    return u'{0}/{1}.pdf'.format(invoice_id, digest)
+
+
+def store_invoice_pdf(path, pdf):
+    """
+    Stores ``pdf`` at ``path`` in ``invoice_storage``. It is written to a
+    temporary file which is then renamed, so the PDF is never read while
+    only part of it has been written.
+    """
+    full_path = invoice_storage.path(path)
+    directory = os.path.dirname(full_path)
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+
+    handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(pdf)
+        os.rename(temp_path, full_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def delete_old_invoice_pdfs(invoice_id, digest):
+    """
+    Deletes the stored PDFs of an invoice other than the one of the content
+    with hash ``digest``.
+    """
+    directory = u'{0}'.format(invoice_id)
+    current = os.path.basename(invoice_pdf_path(invoice_id, digest))
+    try:
+        names = invoice_storage.listdir(directory)[1]
+    except (IOError, OSError):
+        return
+    for name in names:
+        if name.endswith('.pdf') and name != current:
+            invoice_storage.delete(u'{0}/{1}'.format(directory, name))
+
+
+def render_invoice_pdf(invoice, delete_old=False):
+    """
+    Returns the PDF of ``invoice``, from ``invoice_storage`` if it was
+    rendered before with the same content. Otherwise it is rendered, and
+    stored under the invoice ID and the hash of its content.
+
+    :param delete_old: Whether to delete the PDFs of previous contents. The
+    batch rendering does, downloads leave them to it.
+    """
+    content = invoice_content(invoice)
+    digest = content_hash(content)
+    path = invoice_pdf_path(invoice.pk, digest)
+
+    try:
+        with invoice_storage.open(path) as pdf_file:
+            pdf = pdf_file.read()
+    except (IOError, OSError):
+        buffer = BytesIO()
+        draw_content(buffer, content)
+        pdf = buffer.getvalue()
+        store_invoice_pdf(path, pdf)
+
+    if delete_old:
+        delete_old_invoice_pdfs(invoice.pk, digest)
+
+    return pdf
+
+
+def draw_pdf(buffer, invoice):
+    """ Draws the invoice, see ``render_invoice_pdf`` """
+    buffer.write(render_invoice_pdf(invoice))
@@ -1,6 +1,7 @@
 import logging
+from tempfile import TemporaryFile
 
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.core.management.base import BaseCommand, CommandError
 
 from ...sepa_export import SEPAExporter, export_sepa_to_xml
@@ -39,39 +40,29 @@ class Command(BaseCommand):
         exporter = SEPAExporter(date_from, date_to)
 
         # Build the XML documents.
-        try:
-            credit_file_xml = export_sepa_to_xml(exporter, 'credit')
-            LOG.info(u'Auto create SEPA xml files: credit file created')
-            credit_file_name = "{0}_{1}.xml".format(
-                date_from.isoformat(), 'credit')
-            sepa_xml_file = SEPAXMLFile(
-                file_type='credit',
-                file_date=date_from,
-                generated_date=d,
-            )
-            sepa_xml_file.file.save(
-                credit_file_name, ContentFile(credit_file_xml))
-            sepa_xml_file.save()
-            LOG.info(u'Auto create SEPA xml files: credit file saved')
-        except ValueError as e:
-            error = unicode(e)
-
-        try:
-            debit_file_xml = export_sepa_to_xml(exporter, 'debit')
-            LOG.info(u'Auto create SEPA xml files: debit file created')
-            debit_file_name = "{0}_{1}.xml".format(
-                date_from.isoformat(), 'debit')
-            sepa_xml_file = SEPAXMLFile(
-                file_type='debit',
-                file_date=date_from,
-                generated_date=d,
-            )
-            sepa_xml_file.file.save(
-                debit_file_name, ContentFile(debit_file_xml))
-            sepa_xml_file.save()
-            LOG.info(u'Auto create SEPA xml files: debit file saved')
-        except ValueError as e:
-            error = unicode(e)
+        for file_type in ('credit', 'debit'):
+            try:
+                self.save_sepa_xml_file(exporter, file_type, date_from, d)
+            except ValueError as e:
+                error = unicode(e)
 
         if error:
             raise CommandError(error)
+
+    def save_sepa_xml_file(self, exporter, file_type, date_from, generated):
+        # Stream the document to disk rather than building it in memory.
+        with TemporaryFile() as file_xml:
+            export_sepa_to_xml(exporter, file_type, out=file_xml)
+            LOG.info(u'Auto create SEPA xml files: {0} file created'.format(
+                file_type))
+            file_name = "{0}_{1}.xml".format(date_from.isoformat(), file_type)
+            sepa_xml_file = SEPAXMLFile(
+                file_type=file_type,
+                file_date=date_from,
+                generated_date=generated,
+            )
+            file_xml.seek(0)
+            sepa_xml_file.file.save(file_name, File(file_xml))
+        sepa_xml_file.save()
+        LOG.info(u'Auto create SEPA xml files: {0} file saved'.format(
+            file_type))
@@ -0,0 +1,15 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...payee_search import rebuild_payee_card_numbers
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the card number index of the payee autocomplete'
+
+    def handle(self, *args, **options):
+        count = rebuild_payee_card_numbers()
+        LOG.info(u'Rebuilt payee card numbers: {0} users'.format(count))
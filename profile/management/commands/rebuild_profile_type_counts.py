@@ -0,0 +1,15 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...type_counts import rebuild_profile_type_counts
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recount the profiles by type of the statistics dashboards'
+
+    def handle(self, *args, **options):
+        count = rebuild_profile_type_counts()
+        LOG.info(u'Rebuilt profile type counts: {0} rows'.format(count))
@@ -0,0 +1,15 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...user_search import rebuild_user_search_documents
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents of the community admin user search'
+
+    def handle(self, *args, **options):
+        count = rebuild_user_search_documents()
+        LOG.info(u'Rebuilt user search documents: {0} profiles'.format(count))
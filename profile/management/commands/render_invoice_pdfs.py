@@ -0,0 +1,33 @@
+import logging
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...invoice_batch import render_month_invoice_pdfs
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Render and store the invoice PDFs of a month (YYYY-MM, the ' \
+           'current month by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', nargs='?')
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                year, month = [int(part) for part in
+                               options['month'].split('-')]
+            except ValueError:
+                raise CommandError(u'Month must be like YYYY-MM')
+        else:
+            today = date.today()
+            year, month = today.year, today.month
+
+        rendered, failed = render_month_invoice_pdfs(
+            year, month, options['workers'])
+        LOG.info(u'Invoice PDFs {0}-{1:02d}: {2} rendered, {3} failed'.format(
+            year, month, rendered, failed))
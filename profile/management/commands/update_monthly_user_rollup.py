@@ -0,0 +1,15 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...user_growth import rebuild_monthly_user_rollup
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly user rollup of the statistics dashboards'
+
+    def handle(self, *args, **options):
+        count = rebuild_monthly_user_rollup()
+        LOG.info(u'Rebuilt monthly user rollup: {0} rows'.format(count))
@@ -1,5 +1,37 @@
+from django.db import models
+
 from cc3.cyclos.managers import ViewableProfileManager
 
+# Profile types of a ``UserProfile``, with the reverse relation to the model
+# of each type, in the order ``UserProfile.get_profile_type`` checks them.
+PROFILE_TYPE_RELATIONS = (
+    ('individual', 'individual_profile'),
+    ('business', 'business_profile'),
+    ('institution', 'institution_profile'),
+    ('charity', 'charity_profile'),
+)
+
+# Reverse relations loaded together to resolve the profile type of a
+# ``UserProfile`` in one query.
+PROFILE_TYPE_SELECT_RELATED = tuple(
+    relation for _type, relation in PROFILE_TYPE_RELATIONS) + (
+    'stadlanderprofile',)
+
+
+def annotate_profile_type(queryset):
+    """
+    Annotates each ``UserProfile`` of the queryset with its ``profile_type``
+    ('individual', 'business', 'institution', 'charity' or ``None``), and
+    joins the profile type objects, so ``get_profile_type`` and the
+    ``is_*_profile`` checks of the resulting profiles run no queries.
+    """
+    return queryset.select_related(*PROFILE_TYPE_SELECT_RELATED).annotate(
+        profile_type=models.Case(
+            *[models.When(then=models.Value(profile_type), **{
+                '{0}__isnull'.format(relation): False})
+              for profile_type, relation in PROFILE_TYPE_RELATIONS],
+            output_field=models.CharField()))
+
 
 class UserProfileManager(ViewableProfileManager):
 
@@ -7,6 +39,9 @@ class UserProfileManager(ViewableProfileManager):
         queryset = super(UserProfileManager, self).get_queryset()
         return queryset.filter(charity_profile__isnull=False)
 
+    def with_profile_type(self):
+        return annotate_profile_type(self.get_queryset())
+
     # def for_user(self, user):
     #     if user.groups.filter(name="Stadlander admins").count():
     #         from cc3.cyclos.groups import CyclosGroupSet
@@ -13,10 +13,15 @@ from cc3.rewards.models import (UserCause, DefaultGoodCause)
 from icare4u_front.stadlander.models import StadlanderProfile
 from .models import IndividualProfile
 
-from .utils import get_tandc_page_url, is_default_email
+from .utils import (
+    get_profile_gates_version, get_tandc_page_url, is_default_email)
 
 LOG = logging.getLogger('icare4u_front.profile.middleware')
 
+# Session key holding the gates version at which the user passed all the
+# ``ProfileMiddleware`` gates.
+GATES_PASSED_SESSION_KEY = 'profile_gates_passed'
+
 
 class ProfileMiddleware(object):
     avoidable_views = [
@@ -122,20 +127,35 @@ class ProfileMiddleware(object):
                     return HttpResponseRedirect(
                         reverse('terms_and_conditions_agreement'))
 
+    def _gates_passed(self, request):
+        """
+        Tells if the user passed all the gates at the current version of its
+        gate decisions, without touching the database.
+        """
+        if request.session.get('first_login'):
+            return False
+
+        return request.session.get(GATES_PASSED_SESSION_KEY) == \
+            get_profile_gates_version(request.user.pk)
+
     def process_view(self, request, view_func, view_args, view_kwargs):
         response = None
 
         if view_func.func_name not in self.avoidable_views:
             if request.user.is_authenticated() and not \
                     request.user.is_superuser:
+                if request.is_ajax() or self._gates_passed(request):
+                    return response
+
+                # Read before checking, so changes made meanwhile are not
+                # recorded as passed.
+                gates_version = get_profile_gates_version(request.user.pk)
+
                 try:
                     profile = request.user.cc3_profile.userprofile
                 except ObjectDoesNotExist:
                     return
 
-                if request.is_ajax():
-                    return response
-
                 try:
                     IndividualProfile.objects.get(profile=profile)
                     tandc_url = get_tandc_page_url()
@@ -150,6 +170,9 @@ class ProfileMiddleware(object):
                     if not response and request.get_full_path() != tandc_url:
                         response = self._redirect_to_good_causes_view(request)
 
+                    passed = not response and \
+                        request.get_full_path() != tandc_url
+
                 except IndividualProfile.DoesNotExist:
                     try:
                         StadlanderProfile.objects.get(profile=profile)
@@ -157,8 +180,13 @@ class ProfileMiddleware(object):
                         response = self._redirect_to_good_causes_view(request)
                         if not response:
                             response = self._redirect_to_terms_view(
-                                request, profile)
+                                request, profile, get_tandc_page_url())
                     except StadlanderProfile.DoesNotExist:
                         pass
 
+                    passed = not response
+
+                if passed:
+                    request.session[GATES_PASSED_SESSION_KEY] = gates_version
+
         return response
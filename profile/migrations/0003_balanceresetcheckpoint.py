@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profile', '0002_auto_20160616_1053'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceResetCheckpoint',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('period', models.DateField(help_text='First day of the SEPA export period.')),
+                ('status', models.CharField(default=b'started', max_length=10, choices=[(b'started', 'Started'), (b'done', 'Done'), (b'failed', 'Failed')])),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(null=True, blank=True)),
+                ('error', models.TextField(default=b'', blank=True)),
+                ('business', models.ForeignKey(related_name='balance_reset_checkpoints', to='profile.BusinessProfile')),
+            ],
+            options={
+                'ordering': ('period', 'business'),
+                'verbose_name': 'balance reset checkpoint',
+                'verbose_name_plural': 'balance reset checkpoints',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='balanceresetcheckpoint',
+            unique_together=set([('period', 'business')]),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from icare4u_front.profile.payee_search import profile_name_tokens
+
+
+def create_payee_search_tokens(apps, schema_editor):
+    UserProfile = apps.get_model('profile', 'UserProfile')
+    PayeeSearchToken = apps.get_model('profile', 'PayeeSearchToken')
+
+    tokens = []
+    for profile in UserProfile.objects.all().iterator():
+        tokens.extend(
+            PayeeSearchToken(profile_id=profile.pk, token=token)
+            for token in profile_name_tokens(profile))
+        if len(tokens) >= 1000:
+            PayeeSearchToken.objects.bulk_create(tokens)
+            tokens = []
+    PayeeSearchToken.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profile', '0003_balanceresetcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayeeSearchToken',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('token', models.CharField(max_length=100)),
+                ('profile', models.ForeignKey(related_name='payee_search_tokens', to='profile.UserProfile')),
+            ],
+            options={
+                'verbose_name': 'payee search token',
+                'verbose_name_plural': 'payee search tokens',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='payeesearchtoken',
+            unique_together=set([('profile', 'token')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='payeesearchtoken',
+            index_together=set([('token', 'profile')]),
+        ),
+        migrations.RunPython(
+            create_payee_search_tokens, migrations.RunPython.noop),
+    ]
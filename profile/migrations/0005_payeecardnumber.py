@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+from icare4u_front.profile.payee_search import active_card_numbers
+
+
+def create_payee_card_numbers(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    PayeeCardNumber = apps.get_model('profile', 'PayeeCardNumber')
+    PayeeCardNumber.objects.bulk_create([
+        PayeeCardNumber(card_id=card_id, owner_id=owner_id, number=number,
+                        created=created)
+        for card_id, owner_id, number, created
+        in active_card_numbers(Card.objects.all())],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cards', '__first__'),
+        ('profile', '0004_payeesearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayeeCardNumber',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('card_id', models.PositiveIntegerField(unique=True)),
+                ('number', models.CharField(max_length=255, db_index=True)),
+                ('created', models.DateTimeField()),
+                ('owner', models.ForeignKey(related_name='payee_card_numbers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'payee card number',
+                'verbose_name_plural': 'payee card numbers',
+            },
+        ),
+        migrations.RunPython(
+            create_payee_card_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from icare4u_front.profile.user_growth import count_monthly_users
+
+
+def create_monthly_user_rollup(apps, schema_editor):
+    MonthlyUserRollup = apps.get_model('profile', 'MonthlyUserRollup')
+    MonthlyUserRollup.objects.bulk_create([
+        MonthlyUserRollup(
+            community_id=community_id, profile_type=profile_type,
+            month=month, joined=joined, active=active)
+        for (community_id, profile_type, month), (joined, active)
+        in count_monthly_users().iteritems()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profile', '0005_payeecardnumber'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyUserRollup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('community_id', models.PositiveIntegerField(default=0)),
+                ('profile_type', models.CharField(default=b'', max_length=12, blank=True)),
+                ('month', models.PositiveIntegerField(help_text='Year and month joined, as YYYYMM.')),
+                ('joined', models.PositiveIntegerField(default=0)),
+                ('active', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('month', 'community_id', 'profile_type'),
+                'verbose_name': 'monthly user rollup',
+                'verbose_name_plural': 'monthly user rollups',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyuserrollup',
+            unique_together=set([('community_id', 'profile_type', 'month')]),
+        ),
+        migrations.RunPython(
+            create_monthly_user_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from icare4u_front.profile.type_counts import count_profile_types
+
+
+def create_profile_type_counts(apps, schema_editor):
+    UserProfile = apps.get_model('profile', 'UserProfile')
+    ProfileTypeCount = apps.get_model('profile', 'ProfileTypeCount')
+    ProfileTypeCount.objects.bulk_create([
+        ProfileTypeCount(
+            community_id=community_id, profile_type=profile_type,
+            total=total, active=active)
+        for (community_id, profile_type), (total, active)
+        in count_profile_types(UserProfile.objects.all()).iteritems()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profile', '0006_monthlyuserrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileTypeCount',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('community_id', models.PositiveIntegerField(default=0)),
+                ('profile_type', models.CharField(max_length=12)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('active', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('community_id', 'profile_type'),
+                'verbose_name': 'profile type count',
+                'verbose_name_plural': 'profile type counts',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='profiletypecount',
+            unique_together=set([('community_id', 'profile_type')]),
+        ),
+        migrations.RunPython(
+            create_profile_type_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def create_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX profile_usersearchdocument_document_ft '
+            'ON profile_usersearchdocument (document)')
+
+
+# The documents of the existing profiles are built from several apps
+# (cards, terminals, Stadlander profiles), so they are not backfilled here.
+# Run ``manage.py rebuild_user_search_documents`` after migrating.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profile', '0007_profiletypecount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchDocument',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('document', models.TextField()),
+                ('profile', models.OneToOneField(related_name='search_document', to='profile.UserProfile')),
+            ],
+            options={
+                'verbose_name': 'user search document',
+                'verbose_name_plural': 'user search documents',
+            },
+        ),
+        migrations.RunPython(
+            create_fulltext_index, migrations.RunPython.noop),
+    ]
@@ -2,23 +2,26 @@
 import datetime
 from decimal import Decimal
 import logging
+import threading
 
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
-from django.db import models, IntegrityError
-from django.db.models.signals import post_save
+from django.db import connection, models, IntegrityError
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
+from django.db.transaction import atomic
 from django.dispatch import receiver
 from django.utils.translation import ugettext as _
 from django.utils import translation
-from django.template.defaultfilters import slugify
 
 from localflavor.generic.models import IBANField
 from registration.signals import user_activated
 from icare4u_front.loyaltylab.utils import notify_ll_of_new_user
 
 from cc3.cards.models import CARD_REGISTRATION_CHOICE_SEND, CardRegistration, \
-    Fulfillment
+    Fulfillment, Card, CardNumber, Terminal
 from cc3.cards.utils import mail_card_admins
 from cc3.core.utils import UploadToSecure  # get_upload_to
 from cc3.cyclos import backends
@@ -35,7 +38,16 @@ from cc3.rewards.models import (
 from cc3.rewards.transactions import cause_reward
 from cc3.rules.utils import last_month_first_of_month
 
-from .managers import UserProfileManager
+from .managers import (
+    PROFILE_TYPE_RELATIONS, PROFILE_TYPE_SELECT_RELATED, UserProfileManager)
+from .payee_search import (
+    TOKEN_MAX_LENGTH, update_payee_card_number, update_payee_search_tokens)
+from .transaction_summary import TransactionSummary
+from .type_counts import update_profile_type_counts
+from .user_growth import update_monthly_user_rollup, user_rows
+from .user_search import (
+    update_user_search_document, update_user_search_documents)
+from .utils import clear_profile_gates, generate_slug
 from .validators import swift_bic_validator
 
 LOG = logging.getLogger(__name__)
@@ -50,6 +62,16 @@ SEPA_XML_FILE_TYPES = (
     ('D', _('Debit')),
 )
 
+BALANCE_RESET_STARTED = 'started'
+BALANCE_RESET_DONE = 'done'
+BALANCE_RESET_FAILED = 'failed'
+
+BALANCE_RESET_STATUSES = (
+    (BALANCE_RESET_STARTED, _('Started')),
+    (BALANCE_RESET_DONE, _('Done')),
+    (BALANCE_RESET_FAILED, _('Failed')),
+)
+
 USER_TYPES = (
     'individual',
     'business',
@@ -64,6 +86,143 @@ ID_TYPES = (
     ('V', _('vreemdelingendocument'))
 )
 
+# Process-local cache of the reference rows every automatic invoice points
+# to, see ``get_invoice_references``.
+_INVOICE_REFERENCES = {}
+_INVOICE_REFERENCES_LOCK = threading.Lock()
+
+
+def get_invoice_references():
+    """
+    Returns the EUR ``Currency``, the ``CC3_BANK_USER`` sender ``User`` and
+    the "Pending" ``PaymentStatus`` used in automatic invoices, creating them
+    if they don't exist.
+
+    They are only looked up once per process (and bank user). The cache is
+    cleared when any of these objects is saved or deleted, or by calling
+    ``clear_invoice_references``.
+    """
+    username = getattr(settings, "CC3_BANK_USER", "Positoos Reserve")
+
+    with _INVOICE_REFERENCES_LOCK:
+        if username not in _INVOICE_REFERENCES:
+            currency, created = Currency.objects.get_or_create(
+                code='EUR',
+                defaults={
+                    'name': 'Euro',
+                    'symbol': '€'
+                    }
+                )
+            sender, created = User.objects.get_or_create(username=username)
+            to_be_paid_status, created = PaymentStatus.objects.get_or_create(
+                description="Pending", is_active=True, is_paid=False)
+            _INVOICE_REFERENCES[username] = (
+                currency, sender, to_be_paid_status)
+
+        return _INVOICE_REFERENCES[username]
+
+
+def clear_invoice_references(**kwargs):
+    """
+    Empties the ``get_invoice_references`` cache. Can be used as a signal
+    receiver, which only empties it when the saved or deleted ``instance``
+    is one of the cached rows.
+    """
+    instance = kwargs.get('instance')
+    with _INVOICE_REFERENCES_LOCK:
+        if instance is None or any(
+                type(reference) is type(instance) and
+                reference.pk == instance.pk
+                for references in _INVOICE_REFERENCES.values()
+                for reference in references):
+            _INVOICE_REFERENCES.clear()
+
+
+def get_reset_transfer_descriptions():
+    """
+    Returns the descriptions of the Cyclos transfers made by
+    ``BusinessProfile.reset_balance``, which mark a balance reset in the
+    transactions history.
+    """
+    return [
+        getattr(settings, 'SEPA_EXPORT_DEBIT_TRANSFER_DESCRIPTION',
+                "Bijschrijving na automatisch incasso"),
+        getattr(settings, 'SEPA_EXPORT_CREDIT_TRANSFER_DESCRIPTION',
+                "Afschrijving na automatisch incasso"),
+    ]
+
+
+def build_invoice(to_user, amount, references):
+    """
+    Returns an unsaved automatic ``Invoice`` from the bank user to
+    ``to_user`` for a total of ``amount`` euros (positive for debit
+    invoices, negative for credit ones).
+    """
+    currency, sender, to_be_paid_status = references
+    today = datetime.date.today()
+    nr_days_due = getattr(
+        settings, "SEPA_EXPORT_CREDIT_INVOICE_DAYS_DUE", 15)
+
+    invoice_type = "debit" if amount > 0 else "credit"
+
+    return Invoice(
+        from_user=sender, to_user=to_user,
+        inv_date=today,
+        due_date=today + datetime.timedelta(days=nr_days_due),
+        currency=currency, payment_status=to_be_paid_status,
+        invoice_type=invoice_type,
+        automatic_invoice=True,
+        admin_comment=u"Automatic invoice of type {0}".format(
+            invoice_type))
+
+
+def create_invoices(invoices, batch_size=500):
+    """
+    Creates automatic invoices in bulk.
+
+    :param invoices: List of ``(profile, amount, description)`` tuples, with
+    the same meaning as ``BusinessProfile.create_invoice`` arguments for the
+    ``profile`` user.
+    :param batch_size: Maximum number of rows per INSERT.
+    :return: The list of created ``Invoice``s, in the same order.
+
+    The invoice lines need the primary keys of their invoices, so the
+    invoices are only inserted with ``bulk_create`` when the database
+    returns them. Otherwise (e.g. on MySQL) each invoice is saved on its own,
+    and only the lines are inserted in bulk.
+
+    NB no ``post_save`` signals are sent for the created invoice lines, nor
+    for the invoices inserted in bulk.
+    """
+    vat_rate = 0  # 1570, no VAT/BTW should be added for now.
+    invoices = list(invoices)
+    references = get_invoice_references()
+
+    with atomic():
+        new_invoices = [
+            build_invoice(profile.user, amount, references)
+            for profile, amount, description in invoices]
+
+        if getattr(connection.features,
+                   'can_return_ids_from_bulk_insert', False):
+            new_invoices = Invoice.objects.bulk_create(
+                new_invoices, batch_size=batch_size)
+        else:
+            for invoice in new_invoices:
+                invoice.save()
+
+        InvoiceLine.objects.bulk_create([
+            InvoiceLine(
+                invoice=invoice, description=description,
+                quantity=1, amount=amount, tax_rate=vat_rate)
+            for invoice, (profile, amount, description) in zip(
+                new_invoices, invoices)], batch_size=batch_size)
+
+    LOG.info(u"Created {0} automatic invoices from reserve".format(
+        len(new_invoices)))
+
+    return new_invoices
+
 
 class UserProfile(CC3Profile):
     terms_and_conditions = models.BooleanField(
@@ -110,34 +269,75 @@ class UserProfile(CC3Profile):
         verbose_name = _(u'User profile')
         verbose_name_plural = _(u'User profiles')
 
+    # Profile type objects by relation name, see ``get_profile_types``.
+    _profile_types = None
+
+    def save(self, *args, **kwargs):
+        self.clear_profile_types()
+        super(UserProfile, self).save(*args, **kwargs)
+
+    def get_profile_types(self):
+        """
+        Returns a dictionary with the related ``IndividualProfile``,
+        ``BusinessProfile``, ``InstitutionProfile``, ``CharityProfile`` and
+        ``StadlanderProfile`` of this user profile, by relation name, or
+        ``None`` for the ones it does not have.
+
+        All of them are loaded in one query, or none if the profile comes from
+        ``annotate_profile_type``, and kept on the instance until it is saved
+        or ``clear_profile_types`` is called.
+        """
+        if self._profile_types is None:
+            self._profile_types = self._load_profile_types()
+        return self._profile_types
+
+    def clear_profile_types(self):
+        """
+        Forgets the profile type objects, including the related object caches
+        ``_load_profile_types`` set, so they are read again.
+        """
+        self._profile_types = None
+        for relation in PROFILE_TYPE_SELECT_RELATED:
+            self.__dict__.pop(
+                self._meta.get_field(relation).get_cache_name(), None)
+
+    def _load_profile_types(self):
+        if not self.pk:
+            return dict.fromkeys(PROFILE_TYPE_SELECT_RELATED)
+
+        cache_names = dict(
+            (relation, self._meta.get_field(relation).get_cache_name())
+            for relation in PROFILE_TYPE_SELECT_RELATED)
+        if all(hasattr(self, cache_name)
+               for cache_name in cache_names.values()):
+            source = self
+        else:
+            source = UserProfile.all_objects.select_related(
+                *PROFILE_TYPE_SELECT_RELATED).get(pk=self.pk)
+
+        profile_types = {}
+        for relation, cache_name in cache_names.items():
+            try:
+                profile_types[relation] = getattr(source, relation)
+            except ObjectDoesNotExist:
+                profile_types[relation] = None
+            # Keeps ``self.business_profile`` etc. from querying again.
+            setattr(self, cache_name, profile_types[relation])
+
+        return profile_types
+
     # check whether profile is individual or business
     def is_individual_profile(self):
-        try:
-            IndividualProfile.objects.get(profile=self)
-            return True
-        except IndividualProfile.DoesNotExist:
-            return False
+        return self.get_profile_types()['individual_profile'] is not None
 
     def is_business_profile(self):
-        try:
-            BusinessProfile.objects.get(profile=self)
-            return True
-        except BusinessProfile.DoesNotExist:
-            return False
+        return self.get_profile_types()['business_profile'] is not None
 
     def is_institution_profile(self):
-        try:
-            InstitutionProfile.objects.get(profile=self)
-            return True
-        except InstitutionProfile.DoesNotExist:
-            return False
+        return self.get_profile_types()['institution_profile'] is not None
 
     def is_charity_profile(self):
-        try:
-            CharityProfile.objects.get(profile=self)
-            return True
-        except CharityProfile.DoesNotExist:
-            return False
+        return self.get_profile_types()['charity_profile'] is not None
 
     def get_profile_type(self, include_profile=False):
         """
@@ -152,31 +352,20 @@ class UserProfile(CC3Profile):
         When the user profile is not one of these ones,
         return None or (None, None)
         """
-        for model, profile_type in ((IndividualProfile, 'individual'),
-                                    (BusinessProfile, 'business'),
-                                    (InstitutionProfile, 'institution'),
-                                    (CharityProfile, 'charity')):
-            try:
-                profile = model.objects.get(profile=self)
+        profile_types = self.get_profile_types()
+        for profile_type, relation in PROFILE_TYPE_RELATIONS:
+            profile = profile_types[relation]
+            if profile is not None:
                 if include_profile:
                     return profile_type, profile
                 else:
                     return profile_type
-            except:
-                pass
 
         return (None, None) if include_profile else None
 
     def is_stadlander_sso_user(self):
-        from ..stadlander.models import StadlanderProfile
-        try:
-            # stadlander SSO users can always order a card
-            StadlanderProfile.objects.get(profile=self)
-            return True
-        except StadlanderProfile.DoesNotExist:
-            pass
-
-        return False
+        # stadlander SSO users can always order a card
+        return self.get_profile_types()['stadlanderprofile'] is not None
 
     def can_order_card(self):
         if self.is_stadlander_sso_user():
@@ -220,14 +409,22 @@ class UserProfile(CC3Profile):
     def get_address_with_street_num(self):
         return u"{0} {1}".format(self.address, self.num_street)
 
-    def create_new_stadlander_profile(self, rel_number):
-        """Create SL profile and make reward payment"""
+    def create_new_stadlander_profile(self, rel_number, reward=True):
+        """
+        Create SL profile and make reward payment, unless ``reward`` is
+        False, for callers which pay the reward once the profile is committed.
+        """
         from ..stadlander.models import StadlanderProfile
         sl = StadlanderProfile.objects.create(
             rel_number=rel_number,
             profile=self,
             )
         LOG.info("Created StadlanderProfile {0}".format(sl))
+        if reward:
+            self.pay_stadlander_reward()
+
+    def pay_stadlander_reward(self):
+        """Reward payment of a new SL profile"""
         # reward with X punten - ticket #1513
         # MUST ONLY HAPPEN when the profile is created for the first time.
         amount = settings.STADLANDER_SSO_REWARD_AMOUNT
@@ -316,16 +513,7 @@ class IndividualProfile(models.Model):
 
     def update_slug(self, override=False):
         if (not self.profile.slug or override):
-            slug = slugify(self.profile.name)
-            slug_count = 0
-            test_slug = slug
-
-            while UserProfile.objects.filter(slug=test_slug):
-                slug_count += 1
-                test_slug = u"{0}{1}".format(
-                    slug, slug_count)
-
-            self.profile.slug = test_slug
+            self.profile.slug = generate_slug(self.profile.name)
             self.profile.save()
 
     def set_good_cause(self):
@@ -428,41 +616,14 @@ class BusinessProfile(models.Model):
         """
         Create a euro invoice from Positoos BV (marked unpaid) for this
         business.
+
+        See ``create_invoices`` to create many invoices at once.
         """
         vat_rate = 0  # 1570, no VAT/BTW should be added for now.
 
-        today = datetime.date.today()
-
-        currency, created = Currency.objects.get_or_create(
-            code='EUR',
-            defaults={
-                'name': 'Euro',
-                'symbol': '€'
-                }
-            )
-        nr_days_due = getattr(
-            settings, "SEPA_EXPORT_CREDIT_INVOICE_DAYS_DUE", 15)
-        sender, created = User.objects.get_or_create(
-            username=getattr(settings,
-                             "CC3_BANK_USER", "Positoos Reserve"))
-        to_be_paid_status, created = PaymentStatus.objects.get_or_create(
-            description="Pending", is_active=True, is_paid=False)
-        if amount > 0:
-            is_debit = True
-        else:
-            is_debit = False
-
-        invoice_type = "debit" if is_debit else "credit"
-
-        invoice = Invoice.objects.create(
-            from_user=sender, to_user=self.profile.user,
-            inv_date=today,
-            due_date=today + datetime.timedelta(days=nr_days_due),
-            currency=currency, payment_status=to_be_paid_status,
-            invoice_type=invoice_type,
-            automatic_invoice=True,
-            admin_comment=u"Automatic invoice of type {0}".format(
-                invoice_type))
+        invoice = build_invoice(
+            self.profile.user, amount, get_invoice_references())
+        invoice.save()
 
         InvoiceLine.objects.create(
             invoice=invoice, description=invoice_description,
@@ -470,7 +631,8 @@ class BusinessProfile(models.Model):
         LOG.info(
             u"Created {2} invoice from reserve to user {0}, total amount "
             u"invoice: {1}".format(
-                self.profile.user, invoice.get_total_display(), invoice_type))
+                self.profile.user, invoice.get_total_display(),
+                invoice.invoice_type))
 
     def invoice_description(self, from_date, to_date, transactions,
                             reset_transfer_descriptions=[]):
@@ -483,22 +645,20 @@ class BusinessProfile(models.Model):
         not yet been able to determine the transaction type id (it isn't
         returned in the Transaction object).
         """
-        spent = 0
+        summary = TransactionSummary(
+            from_date, reset_transfer_descriptions).extend(transactions)
+        return self.summary_invoice_description(summary, to_date)
+
+    def summary_invoice_description(self, summary, to_date):
+        """
+        Gives the description to be used for the invoice, from a
+        ``TransactionSummary`` of the period ending on ``to_date``.
+        """
+        from_date = summary.from_date
+        spent = summary.spent
         spent_eur = 0
-        received = 0
+        received = summary.received
         received_eur = 0
-        for transaction in transactions:
-            if transaction.description in reset_transfer_descriptions:
-                # Reset-transaction found
-                spent = 0
-                received = 0
-                from_date = transaction.created.date()
-                continue
-
-            if transaction.amount > 0:
-                received += transaction.amount
-            else:
-                spent += transaction.amount
 
         div_by = Decimal("100.00")
 
@@ -542,13 +702,20 @@ class BusinessProfile(models.Model):
             total_eur=format(
                 total_eur if is_debit else total_eur * Decimal("-1.0"), '.2f'))
 
-    def reset_balance(self):
+    def reset_balance(self, summary=None, balance=None):
         """
         Resets the current user Positoos balance to zero.
 
         Taking into account the ``accountStatus.balance`` of the user, it makes
         a payment from or to the system for a similar amount, turning the
         balance equal to zero.
+
+        :param summary: ``TransactionSummary`` of the business transactions
+        since the first day of last month, used for the invoice text. If not
+        given, the transactions are downloaded from Cyclos.
+        :param balance: The ``accountStatus.balance`` of the user, when it was
+        already looked up (e.g. by the SEPA export). If not given, it is read
+        from Cyclos.
         """
         # Getting settings - defaulting to Positoos values if settings missing.
         debit_transfer_type_id = getattr(
@@ -568,12 +735,17 @@ class BusinessProfile(models.Model):
         div_by = Decimal("100.00")
 
         try:
-            balance = backends.get_account_status(
-                self.profile.user.username).accountStatus.balance
-
-            transactions = backends.transactions(
-                username=self.profile.user.username,
-                from_date=from_date, to_date=to_date)
+            if balance is None:
+                balance = backends.get_account_status(
+                    self.profile.user.username).accountStatus.balance
+
+            if summary is None:
+                summary = TransactionSummary(
+                    from_date, [debit_transfer_description,
+                                credit_transfer_description]).extend(
+                    backends.transactions(
+                        username=self.profile.user.username,
+                        from_date=from_date, to_date=to_date))
 
         except MemberNotFoundException:
             LOG.error(u'Member not found (in Cyclos): {0}'.format(
@@ -586,10 +758,8 @@ class BusinessProfile(models.Model):
                      u"balance is already 0")
             return True
 
-        invoice_description = self.invoice_description(
-            from_date, to_date, transactions,
-            reset_transfer_descriptions=[
-                debit_transfer_description, credit_transfer_description])
+        invoice_description = self.summary_invoice_description(
+            summary, to_date)
 
         try:
             if balance > 0:
@@ -774,18 +944,9 @@ class InstitutionProfile(models.Model):
                 # Create euro invoice from Positoos BV (marked unpaid).
                 today = datetime.date.today()
 
-                currency, created = Currency.objects.get_or_create(
-                    code='EUR',
-                    defaults={
-                        'name': 'Euro',
-                        'symbol': '€'
-                    }
-                )
+                currency, sender, pending = get_invoice_references()
                 nr_days_due = getattr(
                     settings, "SEPA_EXPORT_CREDIT_INVOICE_DAYS_DUE", 15)
-                sender, created = User.objects.get_or_create(
-                    username=getattr(settings,
-                                     "CC3_BANK_USER", "Positoos Reserve"))
                 to_be_paid_status = PaymentStatus.objects.filter(
                     is_active=True, is_paid=False)
                 if not to_be_paid_status:
@@ -917,6 +1078,144 @@ class SEPAXMLFile(models.Model):
         return self.file.name
 
 
+class BalanceResetCheckpoint(models.Model):
+    """
+    Progress of the monthly balance reset of one business, so that an
+    interrupted SEPA export run can be resumed without resetting the same
+    business twice.
+    """
+    period = models.DateField(
+        help_text=_('First day of the SEPA export period.'))
+    business = models.ForeignKey(
+        BusinessProfile, related_name='balance_reset_checkpoints')
+    status = models.CharField(
+        max_length=10, choices=BALANCE_RESET_STATUSES,
+        default=BALANCE_RESET_STARTED)
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(default='', blank=True)
+
+    class Meta:
+        ordering = ('period', 'business')
+        unique_together = ('period', 'business')
+        verbose_name = _('balance reset checkpoint')
+        verbose_name_plural = _('balance reset checkpoints')
+
+    def __unicode__(self):
+        return u'{0} {1}: {2}'.format(
+            self.period, self.business, self.get_status_display())
+
+
+class PayeeSearchToken(models.Model):
+    """
+    Normalised token of one of the names of a ``UserProfile``, used to search
+    payees by name. See ``profile.payee_search``.
+    """
+    profile = models.ForeignKey(
+        UserProfile, related_name='payee_search_tokens')
+    token = models.CharField(max_length=TOKEN_MAX_LENGTH)
+
+    class Meta:
+        unique_together = ('profile', 'token')
+        index_together = (('token', 'profile'),)
+        verbose_name = _('payee search token')
+        verbose_name_plural = _('payee search tokens')
+
+    def __unicode__(self):
+        return u'{0}: {1}'.format(self.profile_id, self.token)
+
+
+class PayeeCardNumber(models.Model):
+    """
+    Number of an active card, indexed for the card number autocomplete. See
+    ``profile.payee_search``.
+    """
+    # Primary key of the ``Card``, whose row is removed with the card by the
+    # signals below.
+    card_id = models.PositiveIntegerField(unique=True)
+    owner = models.ForeignKey(User, related_name='payee_card_numbers')
+    number = models.CharField(max_length=255, db_index=True)
+    # ``creation_date`` of the card, the oldest card of a payee is shown.
+    created = models.DateTimeField()
+
+    class Meta:
+        verbose_name = _('payee card number')
+        verbose_name_plural = _('payee card numbers')
+
+    def __unicode__(self):
+        return u'{0}: {1}'.format(self.owner_id, self.number)
+
+
+class UserSearchDocument(models.Model):
+    """
+    Normalised text of the searchable fields of a ``UserProfile``, full-text
+    indexed for the community admin user search. See
+    ``profile.user_search``.
+    """
+    profile = models.OneToOneField(
+        UserProfile, related_name='search_document')
+    document = models.TextField()
+
+    class Meta:
+        verbose_name = _('user search document')
+        verbose_name_plural = _('user search documents')
+
+    def __unicode__(self):
+        return u'{0}: {1}'.format(self.profile_id, self.document)
+
+
+class MonthlyUserRollup(models.Model):
+    """
+    Number of users who joined in a month, per community and profile type,
+    rolled up for the statistics dashboards. See ``profile.user_growth``.
+    """
+    # Primary key of the ``CC3Community``, or 0 for the users without a
+    # community (see ``ProfileTypeCount.community_id``).
+    community_id = models.PositiveIntegerField(default=0)
+    # 'individual', 'business', 'institution', 'charity' or '' for users
+    # without a profile type.
+    profile_type = models.CharField(max_length=12, blank=True, default='')
+    month = models.PositiveIntegerField(
+        help_text=_('Year and month joined, as YYYYMM.'))
+    joined = models.PositiveIntegerField(default=0)
+    active = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ('month', 'community_id', 'profile_type')
+        unique_together = ('community_id', 'profile_type', 'month')
+        verbose_name = _('monthly user rollup')
+        verbose_name_plural = _('monthly user rollups')
+
+    def __unicode__(self):
+        return u'{0} {1} {2}: {3}/{4}'.format(
+            self.month, self.community_id, self.profile_type, self.active,
+            self.joined)
+
+
+class ProfileTypeCount(models.Model):
+    """
+    Number of profiles, and of active ones, of a profile type in a community,
+    kept for the statistics dashboards. See ``profile.type_counts``.
+    """
+    # Primary key of the ``CC3Community``, or 0 for the profiles without a
+    # community. Not a nullable foreign key, as MySQL does not enforce
+    # ``unique_together`` on rows with a NULL.
+    community_id = models.PositiveIntegerField(default=0)
+    profile_type = models.CharField(max_length=12)
+    total = models.PositiveIntegerField(default=0)
+    active = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ('community_id', 'profile_type')
+        unique_together = ('community_id', 'profile_type')
+        verbose_name = _('profile type count')
+        verbose_name_plural = _('profile type counts')
+
+    def __unicode__(self):
+        return u'{0} {1}: {2}/{3}'.format(
+            self.community_id, self.profile_type, self.active, self.total)
+
+
 @receiver(post_save, sender=IndividualProfile,
           dispatch_uid='icare4u_individual_profile_save')
 def link_individual_account(sender, instance, created, **kwargs):
@@ -1039,6 +1338,290 @@ def create_business_cause_settings(sender, instance, created, **kwargs):
                 u'{1}'.format(instance, e))
 
 
+def clear_user_profile_types(sender, instance, **kwargs):
+    """
+    Clears the cached profile types of the ``UserProfile`` of a profile type
+    object that was saved or deleted, when it is loaded.
+    """
+    profile = getattr(
+        instance, instance._meta.get_field('profile').get_cache_name(), None)
+    if profile is not None:
+        profile.clear_profile_types()
+
+
+for _model in (IndividualProfile, BusinessProfile, InstitutionProfile,
+               CharityProfile):
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            clear_user_profile_types, sender=_model,
+            dispatch_uid='icare4u_clear_user_profile_types_{0}'.format(
+                _model.__name__))
+
+
+def clear_user_profile_gates(sender, instance, **kwargs):
+    """
+    Clears the cached ``ProfileMiddleware`` gate decisions of the user a
+    saved or deleted ``User``, ``UserProfile``, ``UserCause``,
+    ``IndividualProfile`` or ``StadlanderProfile`` belongs to.
+    """
+    if isinstance(instance, User):
+        # Logging in only updates ``last_login``.
+        if kwargs.get('update_fields') == frozenset(['last_login']):
+            return
+        user_id = instance.pk
+    elif isinstance(instance, UserProfile):
+        user_id = instance.user_id
+    elif isinstance(instance, UserCause):
+        user_id = instance.consumer_id
+    else:
+        user_id = UserProfile.all_objects.filter(
+            pk=instance.profile_id).values_list('user_id', flat=True).first()
+
+    if user_id:
+        clear_profile_gates(user_id)
+
+
+post_save.connect(
+    clear_user_profile_gates, sender=User,
+    dispatch_uid='icare4u_clear_user_profile_gates_User')
+post_save.connect(
+    clear_user_profile_gates, sender=UserProfile,
+    dispatch_uid='icare4u_clear_user_profile_gates_UserProfile')
+for _model in (UserCause, IndividualProfile):
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            clear_user_profile_gates, sender=_model,
+            dispatch_uid='icare4u_clear_user_profile_gates_{0}'.format(
+                _model.__name__))
+
+
+@receiver(post_save, sender=UserProfile,
+          dispatch_uid='icare4u_user_profile_payee_search_tokens')
+def update_user_profile_payee_search_tokens(sender, instance, **kwargs):
+    """
+    Keeps the payee search tokens of a ``UserProfile`` in line with its
+    names.
+    """
+    update_payee_search_tokens(instance)
+
+
+@receiver(post_save, sender=CC3Profile,
+          dispatch_uid='icare4u_cc3_profile_payee_search_tokens')
+def update_cc3_profile_payee_search_tokens(sender, instance, created,
+                                           **kwargs):
+    """
+    Keeps the payee search tokens in line with the names of a ``CC3Profile``
+    saved on its own, when it is the base of a ``UserProfile``.
+    """
+    if not created:
+        profile = UserProfile.all_objects.filter(pk=instance.pk).first()
+        if profile:
+            update_payee_search_tokens(profile)
+
+
+def update_card_payee_card_number(sender, instance, **kwargs):
+    """
+    Keeps the ``PayeeCardNumber`` of a saved or deleted card in line with
+    it.
+    """
+    update_payee_card_number(instance, deleted='created' not in kwargs)
+
+
+@receiver(post_save, sender=CardNumber,
+          dispatch_uid='icare4u_card_number_payee_card_numbers')
+def update_card_number_payee_card_numbers(sender, instance, created,
+                                          **kwargs):
+    """
+    Keeps the ``PayeeCardNumber``s in line with a changed card number.
+    """
+    if not created:
+        for card in Card.objects.filter(number=instance):
+            update_payee_card_number(card)
+
+
+for _signal in (post_save, post_delete):
+    _signal.connect(
+        update_card_payee_card_number, sender=Card,
+        dispatch_uid='icare4u_card_payee_card_number')
+
+
+# Field of the ``Card``s, ``Terminal``s and ``StadlanderProfile``s pointing
+# to the user or profile whose search document has them.
+SEARCH_DOCUMENT_OWNER_FIELDS = {
+    'Card': 'owner',
+    'Terminal': 'business',
+    'StadlanderProfile': 'profile',
+}
+
+
+def snapshot_search_document_owner(sender, instance, **kwargs):
+    """
+    Remembers the user or profile a ``Card``, ``Terminal`` or
+    ``StadlanderProfile`` about to be saved belongs to, so the search
+    document of the previous one is updated too when it is moved.
+    """
+    field = SEARCH_DOCUMENT_OWNER_FIELDS[sender.__name__]
+    update_fields = kwargs.get('update_fields')
+    if instance.pk is None or (
+            update_fields is not None and field not in update_fields):
+        return
+
+    instance._search_document_owner_id = sender._base_manager.filter(
+        pk=instance.pk).values_list(
+        '{0}_id'.format(field), flat=True).first()
+
+
+# Fields of the ``User`` which are part of the search documents.
+USER_SEARCH_DOCUMENT_FIELDS = ('first_name', 'last_name', 'email')
+
+
+def snapshot_user_search_fields(sender, instance, **kwargs):
+    """
+    Remembers the searchable fields of a ``User`` about to be saved, so its
+    search documents are only rebuilt when one of them changes.
+    """
+    update_fields = kwargs.get('update_fields')
+    if instance.pk is None or (
+            update_fields is not None and
+            not set(update_fields) & set(USER_SEARCH_DOCUMENT_FIELDS)):
+        return
+
+    instance._search_document_fields = sender._base_manager.filter(
+        pk=instance.pk).values_list(*USER_SEARCH_DOCUMENT_FIELDS).first()
+
+
+def update_user_profile_search_document(sender, instance, **kwargs):
+    """
+    Keeps the search documents in line with a saved or deleted ``User``,
+    ``CC3Profile``, ``UserProfile``, ``Card``, ``CardNumber``, ``Terminal``
+    or ``StadlanderProfile``.
+    """
+    # Deletions can be part of deleting the profile, which must not get a
+    # new document then.
+    create = 'created' in kwargs
+    # The user or profile a moved ``Card``, ``Terminal`` or
+    # ``StadlanderProfile`` belonged to.
+    previous_id = instance.__dict__.pop('_search_document_owner_id', None)
+
+    if isinstance(instance, User):
+        previous_fields = instance.__dict__.pop(
+            '_search_document_fields', None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & set(
+                USER_SEARCH_DOCUMENT_FIELDS):
+            # E.g. logging in, which only updates ``last_login``.
+            return
+        if create and not kwargs['created'] and previous_fields == tuple(
+                getattr(instance, field)
+                for field in USER_SEARCH_DOCUMENT_FIELDS):
+            return
+        update_user_search_documents(instance.pk, create)
+    elif isinstance(instance, UserProfile):
+        update_user_search_document(instance.pk, create)
+    elif isinstance(instance, CC3Profile):
+        # A ``CC3Profile`` saved on its own may be the base of a
+        # ``UserProfile``.
+        if not kwargs.get('created'):
+            update_user_search_document(instance.pk, create)
+    elif isinstance(instance, Card):
+        for owner_id in set([instance.owner_id, previous_id]):
+            if owner_id:
+                update_user_search_documents(owner_id, create)
+    elif isinstance(instance, CardNumber):
+        if not kwargs.get('created'):
+            for owner_id in set(Card.objects.filter(
+                    number=instance).values_list('owner_id', flat=True)):
+                if owner_id:
+                    update_user_search_documents(owner_id, create)
+    elif isinstance(instance, Terminal):
+        for business_id in set([instance.business_id, previous_id]):
+            if business_id:
+                update_user_search_documents(business_id, create)
+    else:
+        for profile_id in set([instance.profile_id, previous_id]):
+            if profile_id:
+                update_user_search_document(profile_id, create)
+
+
+for _model in (User, CC3Profile, UserProfile, Card, CardNumber, Terminal):
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            update_user_profile_search_document, sender=_model,
+            dispatch_uid='icare4u_user_search_document_{0}'.format(
+                _model.__name__))
+for _model in (Card, Terminal):
+    pre_save.connect(
+        snapshot_search_document_owner, sender=_model,
+        dispatch_uid='icare4u_search_document_owner_{0}'.format(
+            _model.__name__))
+pre_save.connect(
+    snapshot_user_search_fields, sender=User,
+    dispatch_uid='icare4u_user_search_fields')
+
+
+def counted_user_ids(instance):
+    """
+    Returns the ids of the users a ``User``, ``CC3Profile``, ``UserProfile``
+    or profile type object counts for in the statistics.
+    """
+    if isinstance(instance, User):
+        return [instance.pk] if instance.pk else []
+    if isinstance(instance, CC3Profile):
+        return [instance.user_id] if instance.user_id else []
+    return list(UserProfile.all_objects.filter(
+        pk=instance.profile_id).values_list('user_id', flat=True))
+
+
+def snapshot_counted_users(sender, instance, **kwargs):
+    """
+    Remembers the ``user_rows`` of the users an object about to be saved or
+    deleted counts for, see ``update_user_counts``.
+    """
+    # Logging in only updates ``last_login``.
+    if isinstance(instance, User) and \
+            kwargs.get('update_fields') == frozenset(['last_login']):
+        return
+    instance._counted_user_rows = user_rows(counted_user_ids(instance))
+
+
+def update_user_counts(sender, instance, **kwargs):
+    """
+    Updates the monthly user rollup and the profile type counts with the
+    changes a saved or deleted object made to the users it counts for.
+    """
+    before = instance.__dict__.pop('_counted_user_rows', None)
+    if before is None:
+        return
+
+    after = user_rows(set(before) | set(counted_user_ids(instance)))
+    update_monthly_user_rollup(before, after)
+    update_profile_type_counts(before, after)
+
+
+for _model in (User, CC3Profile, UserProfile, IndividualProfile,
+               BusinessProfile, InstitutionProfile, CharityProfile):
+    for _signal in (pre_save, pre_delete):
+        _signal.connect(
+            snapshot_counted_users, sender=_model,
+            dispatch_uid='icare4u_snapshot_counted_users_{0}'.format(
+                _model.__name__))
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            update_user_counts, sender=_model,
+            dispatch_uid='icare4u_update_user_counts_{0}'.format(
+                _model.__name__))
+
+
+# Saving or deleting any of the cached invoice reference rows invalidates
+# the cache.
+for _model in (Currency, PaymentStatus, User):
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            clear_invoice_references, sender=_model,
+            dispatch_uid='icare4u_clear_invoice_references_{0}'.format(
+                _model.__name__))
+
+
 def activate_set_default_good_cause(sender, user, request, **kwargs):
     LOG.info("activate_set_default_good_cause triggered {0}, {1}".format(
         sender, user
@@ -0,0 +1,196 @@
+"""
+Payee search by name and card number.
+
+The names of every ``UserProfile`` (first name, tussenvoegsel, last name and
+business name) are split in normalised tokens, stored in ``PayeeSearchToken``
+and kept in sync by post_save signals. A search term matches the profiles
+having a token starting with each of its words, which is an indexed prefix
+lookup instead of a ``LIKE '%term%'`` scan over all the profiles.
+
+In the same way, the number of every active card is kept in
+``PayeeCardNumber``, so card numbers are searched by indexed prefix too. A
+payee is listed once, with its oldest matching card.
+"""
+import re
+import string
+import unicodedata
+
+from django.db import models
+from django.db.transaction import atomic
+
+from cc3.cards.models import Card
+
+tokenize_regex = re.compile(
+    r'[%s\s]+' % re.escape(string.punctuation), re.UNICODE)
+
+# Length of the ``PayeeSearchToken.token`` column.
+TOKEN_MAX_LENGTH = 100
+
+
+def normalize_name(name):
+    """
+    Lower cases ``name`` and strips the accents off its letters.
+    """
+    name = unicodedata.normalize(u'NFKD', u'{0}'.format(name or u''))
+    return u''.join(
+        char for char in name if not unicodedata.combining(char)).lower()
+
+
+def name_tokens(*names):
+    """
+    Returns the set of normalised tokens of the given names.
+    """
+    tokens = set()
+    for name in names:
+        tokens.update(
+            token[:TOKEN_MAX_LENGTH]
+            for token in tokenize_regex.split(normalize_name(name)) if token)
+    return tokens
+
+
+def profile_name_tokens(profile):
+    return name_tokens(
+        profile.first_name, profile.tussenvoegsel, profile.last_name,
+        profile.business_name)
+
+
+def update_payee_search_tokens(profile):
+    """
+    Brings the search tokens of a ``UserProfile`` in line with its current
+    names.
+    """
+    from .models import PayeeSearchToken
+
+    tokens = profile_name_tokens(profile)
+    existing = set(PayeeSearchToken.objects.filter(
+        profile_id=profile.pk).values_list('token', flat=True))
+    if tokens == existing:
+        return
+
+    PayeeSearchToken.objects.filter(
+        profile_id=profile.pk, token__in=existing - tokens).delete()
+    PayeeSearchToken.objects.bulk_create([
+        PayeeSearchToken(profile_id=profile.pk, token=token)
+        for token in tokens - existing])
+
+
+def match_payees(queryset, term):
+    """
+    Filters a ``UserProfile`` queryset down to the profiles with a name token
+    starting with each word of ``term``.
+    """
+    words = name_tokens(term)
+    if not words:
+        return queryset.none()
+
+    from .models import PayeeSearchToken
+
+    # The tokens and the words are both lower case already, so the query
+    # needs no case folding.
+    for word in sorted(words):
+        queryset = queryset.filter(pk__in=PayeeSearchToken.objects.filter(
+            token__startswith=word).values('profile_id'))
+    return queryset
+
+
+def rank_payees(queryset, term, limit=None):
+    """
+    Orders a ``UserProfile`` queryset by how well the profiles match
+    ``term``: profiles whose business, first or last name start with the
+    whole term come first, the rest are ordered by last and first name.
+
+    :param limit: Maximum number of profiles returned.
+    """
+    term = term.strip()
+    queryset = queryset.annotate(search_rank=models.Case(
+        models.When(business_name__istartswith=term, then=models.Value(0)),
+        models.When(first_name__istartswith=term, then=models.Value(0)),
+        models.When(last_name__istartswith=term, then=models.Value(1)),
+        default=models.Value(2),
+        output_field=models.IntegerField(),
+    )).order_by('search_rank', 'last_name', 'first_name', 'pk')
+
+    if limit:
+        queryset = queryset[:limit]
+    return queryset
+
+
+def search_payees(queryset, term, limit=None):
+    """
+    Returns the profiles of a ``UserProfile`` queryset matching ``term``,
+    best matches first. See ``match_payees`` and ``rank_payees``.
+    """
+    return rank_payees(match_payees(queryset, term), term, limit)
+
+
+def update_payee_card_number(card, deleted=False):
+    """
+    Stores the number of a card in its ``PayeeCardNumber`` while the card is
+    active and has an owner, and removes it otherwise.
+    """
+    from .models import PayeeCardNumber
+
+    if deleted or card.status != 'A' or not card.owner_id:
+        PayeeCardNumber.objects.filter(card_id=card.pk).delete()
+    else:
+        PayeeCardNumber.objects.update_or_create(
+            card_id=card.pk, defaults={
+                'owner_id': card.owner_id,
+                'number': card.number.number,
+                'created': card.creation_date})
+
+
+def active_card_numbers(cards):
+    """
+    Returns an iterator over the ``(card pk, owner pk, number, creation
+    date)`` of the active cards of a ``Card`` queryset which have an owner.
+    """
+    return cards.filter(
+        status='A', owner__isnull=False
+    ).values_list(
+        'pk', 'owner_id', 'number__number', 'creation_date').iterator()
+
+
+def rebuild_payee_card_numbers():
+    """
+    Rebuilds the whole ``PayeeCardNumber`` table from the active cards.
+
+    :return: The number of active cards.
+    """
+    from .models import PayeeCardNumber
+
+    card_numbers = [
+        PayeeCardNumber(card_id=card_id, owner_id=owner_id, number=number,
+                        created=created)
+        for card_id, owner_id, number, created
+        in active_card_numbers(Card.objects.all())]
+
+    with atomic():
+        PayeeCardNumber.objects.all().delete()
+        PayeeCardNumber.objects.bulk_create(card_numbers, batch_size=1000)
+
+    return len(card_numbers)
+
+
+def match_card_numbers(queryset, prefix):
+    """
+    Filters a ``UserProfile`` queryset down to the profiles with an active
+    card number starting with ``prefix``.
+    """
+    from .models import PayeeCardNumber
+
+    return queryset.filter(user_id__in=PayeeCardNumber.objects.filter(
+        number__startswith=prefix.strip()).values('owner_id'))
+
+
+def oldest_card_numbers(user_ids, prefix):
+    """
+    Returns the number of the oldest active card starting with ``prefix`` of
+    each of the given users, by user id.
+    """
+    from .models import PayeeCardNumber
+
+    # Oldest last, so it is the one kept in the dictionary.
+    return dict(PayeeCardNumber.objects.filter(
+        owner_id__in=user_ids, number__startswith=prefix.strip()
+    ).order_by('-created', '-card_id').values_list('owner_id', 'number'))
@@ -11,6 +11,7 @@ the values are actually added into the XML document are commented as
 """
 
 import logging
+import time
 import uuid
 from datetime import datetime
 from decimal import Decimal, getcontext
@@ -21,12 +22,12 @@ from sepa import sepa19, sepa34
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
-from cc3.cyclos import backends
-from cc3.cyclos.services import MemberNotFoundException
-
+from balance_reset import BalanceResetEngine
 import sepa_export_credit
 import sepa_export_debit
+from sepa_export_writer import SEPAXMLWriter
 from ..models import BusinessProfile
+from ..utils import get_account_balances
 
 LOG = logging.getLogger(__name__)
 
@@ -38,21 +39,27 @@ DEBTOR_FIELDS = COMMON_FIELDS + ['ULTIMATE_DEBTOR']
 getcontext().prec = 11
 
 
-def export_sepa_to_xml(exporter, export_type):
+def export_sepa_to_xml(exporter, export_type, out=None):
     """
     Given a SEPAExporter and an export type, return the
     SEPA XML output.
+
+    If a file-like object ``out`` is given, the XML document is streamed into
+    it instead, and ``out`` is returned.
     """
-    xml_doc = StringIO()
+    xml_doc = StringIO() if out is None else out
 
     if export_type == 'debit':
-        xml_doc.write(exporter.build_direct_debit_xml())
+        exporter.write_direct_debit_xml(xml_doc)
     else:
-        xml_doc.write(exporter.build_direct_credit_xml())
+        exporter.write_direct_credit_xml(xml_doc)
 
     # Reconcile businesses balances before exiting.
     exporter.reset_businesses_balances()
 
+    if out is not None:
+        return out
+
     # Return the XML document as XML.
     data = xml_doc.getvalue()
     return data
@@ -123,6 +130,17 @@ class SEPAExporter(object):
         self.total_debit_transactions_rcur = 0
         self.total_credit_transactions = 0
 
+        # Seconds spent in each phase of ``_classify_balances``.
+        self.timings = {}
+
+        # ``TransactionSummary``s of the month by business primary key, filled
+        # in by ``reset_businesses_balances``.
+        self.transaction_summaries = {}
+
+        # Cyclos balances read by ``_classify_balances`` by business primary
+        # key, reused by ``reset_businesses_balances``.
+        self.account_balances = {}
+
         # Fill in all the data.
         self._classify_balances()
 
@@ -132,27 +150,41 @@ class SEPAExporter(object):
         ``BusinessProfiles``, retrieves the balance for each business and
         classifies as currently debtors or creditors.
 
+        Balances are loaded up front in one batch (see
+        ``get_account_balances``), and the ``latest_payment_date`` of all the
+        debtors is written with a single ``UPDATE`` at the end. The time spent
+        in each phase is kept in ``self.timings`` and logged.
+
         This method is called during the class instantiation.
         """
+        started = time.time()
+
         # only process businesses with account holder, IBAN, BIC, Mandate and
         # signature date filled in
-        businesses_to_classify = self.businesses.exclude(
+        businesses_to_classify = list(self.businesses.exclude(
             iban__isnull=True).exclude(
             bic_code__isnull=True).exclude(mandate_id__isnull=True).exclude(
             signature_date__isnull=True).exclude(iban='').exclude(
-            bic_code='').exclude(account_holder='')
+            bic_code='').exclude(account_holder='').select_related(
+            'profile__user'))
+        self.timings['select'] = time.time() - started
+
+        started = time.time()
+        balances = get_account_balances(
+            [business.profile.user.username
+             for business in businesses_to_classify],
+            workers=getattr(settings, 'SEPA_EXPORT_BALANCE_WORKERS', 8))
+        self.timings['balances'] = time.time() - started
+
+        started = time.time()
+        euros = getattr(settings, 'CC3_CURRENCY_CONVERSION', 100)
+        debtors = []
 
         for business in businesses_to_classify:
             # ignore in case of exceptions
-            available_balance = None
-
-            try:
-                available_balance = backends.get_account_status(
-                    business.profile.user.username
-                ).accountStatus.balance
-            except MemberNotFoundException:
-                LOG.error(u'Member not found (in Cyclos): {0}'.format(
-                    business.profile.user.username))
+            available_balance = balances.get(business.profile.user.username)
+            if available_balance is not None:
+                self.account_balances[business.pk] = available_balance
 
             # Store the business and its balance in the correspondent group.
 
@@ -161,7 +193,6 @@ class SEPAExporter(object):
                 continue
 
             # Cast `available_balance` to `int` and deduct the amount of euros.
-            euros = getattr(settings, 'CC3_CURRENCY_CONVERSION', 100)
             balance = Decimal(available_balance/euros).quantize(
                 Decimal(10) ** -2)
 
@@ -179,12 +210,27 @@ class SEPAExporter(object):
                 self.total_debit_transactions += balance
 
                 business.latest_payment_date = self.date_to
-                business.save()
+                debtors.append(business.pk)
                 # trigger balancing cyclos payment and invoice generation
                 # could be via a signal, but i couldn't think of any reasons
                 # for the overhead
                 # update business balance to zero, and create invoice
                 # business.sepa_export_credit_balance(balance)
+        self.timings['classify'] = time.time() - started
+
+        started = time.time()
+        if debtors:
+            BusinessProfile.objects.filter(pk__in=debtors).update(
+                latest_payment_date=self.date_to)
+        self.timings['update'] = time.time() - started
+
+        LOG.info(
+            u'SEPA balances classified for {0} businesses ({1} debtors): '
+            u'{2}'.format(
+                len(businesses_to_classify), len(debtors),
+                u', '.join(u'{0} {1:.2f}s'.format(phase, self.timings[phase])
+                           for phase in ('select', 'balances', 'classify',
+                                         'update'))))
 
     def _sepa_header(self, checksum, operations, initiating_business=None):
         """
@@ -262,6 +308,18 @@ class SEPAExporter(object):
 
         :return str(xml): The complete XML document, as a string object.
         """
+        xml_doc = StringIO()
+        self.write_direct_debit_xml(xml_doc)
+        return xml_doc.getvalue()
+
+    def write_direct_debit_xml(self, out):
+        """
+        Writes a SEPA XML ISO 20022 - pain.008.001.02 document to the
+        file-like object ``out``, one payment information block <PmtInf> and
+        one transaction info block <DrctDbtTxInf> at a time.
+
+        :param out: File-like object the XML document is written to.
+        """
         xml = sepa19.DirectDebitInitDocument()
         direct_debit = sepa19.DirectDebitInitMessage()
 
@@ -271,59 +329,37 @@ class SEPAExporter(object):
             len(self.debit_transactions['FRST']) + len(
                 self.debit_transactions['RCUR']))
 
-        # List container for all the payment info blocks <PmtInf>'s.
-        global_payments_info = []
-
-        # Generate all the 'FRST' sequence type payments.
-        for debtor in self.debit_transactions['FRST'].keys():
-            # 1) Create a FRST payment info block (without the transaction
-            # info block on it).
-            frst_payment_info = self._debit_payments_info(
-                'FRST', debtor=debtor)
-            # 2) Build the transaction info block <DrctDbtTxInf>.
-            transaction_info = [self._debit_transaction_info(debtor)]
-            # 3) Insert the transaction info block into the FRST payment info.
-            frst_payment_info.feed({
-                'direct_debit_operation_info': transaction_info
-            })
-            # 4) Append the payment info to the general list of payments in
-            # the XML.
-            global_payments_info += [frst_payment_info]
-
-        # Now generate the 'RCUR' sequence type payments.
-        # 1) Create the RCUR payments info block.
-        rcur_payments_info = self._debit_payments_info('RCUR')
-        rcur_transactions_info = []
-
-        # 2) Build the transactions info block with all the payments included
-        # <DrctDbtTxInf>.
-        for debtor in self.debit_transactions['RCUR'].keys():
-            rcur_transactions_info += [self._debit_transaction_info(debtor)]
-
-        # 3) Insert the transactions info block into the RCUR payments info.
-        # (Only if we had any).
-        if rcur_transactions_info:
-            rcur_payments_info.feed({
-                'direct_debit_operation_info': rcur_transactions_info
-            })
-            # 4) Append the payments info to the general list of payments in
-            # the XML.
-            global_payments_info += [rcur_payments_info]
-
-        data = {
+        # The payment info blocks <PmtInf>'s are streamed after the header.
+        direct_debit.feed({
             'sepa_header': header,
-            'payment_information': global_payments_info
-        }
-
-        direct_debit.feed(data)
+            'payment_information': []
+        })
         xml.feed({
             'customer_direct_debit': direct_debit
         })
 
-        xml.pretty_print = True
-        xml.build_tree()
+        writer = SEPAXMLWriter(out)
+        writer.start_document(xml)
 
-        return str(xml)
+        # Generate all the 'FRST' sequence type payments.
+        for debtor in self.debit_transactions['FRST'].keys():
+            # 1) Write a FRST payment info block (without the transaction
+            # info block on it).
+            writer.start_payment_info(
+                self._debit_payments_info('FRST', debtor=debtor))
+            # 2) Write the transaction info block <DrctDbtTxInf> into it.
+            writer.write_transaction(self._debit_transaction_info(debtor))
+            writer.end_payment_info()
+
+        # Now generate the 'RCUR' sequence type payments, with all the
+        # payments included in one payment info block. (Only if we had any).
+        if self.debit_transactions['RCUR']:
+            writer.start_payment_info(self._debit_payments_info('RCUR'))
+            for debtor in self.debit_transactions['RCUR'].keys():
+                writer.write_transaction(self._debit_transaction_info(debtor))
+            writer.end_payment_info()
+
+        writer.end_document()
 
     ##########################
     # SEPA CREDIT PAYMENTS ###
@@ -333,35 +369,42 @@ class SEPAExporter(object):
         Builds a SEPA XML ISO 20022 - pain.001.001.03 document.
         :return str(xml): The complete XML document, as a string object.
         """
+        xml_doc = StringIO()
+        self.write_direct_credit_xml(xml_doc)
+        return xml_doc.getvalue()
+
+    def write_direct_credit_xml(self, out):
+        """
+        Writes a SEPA XML ISO 20022 - pain.001.001.03 document to the
+        file-like object ``out``, one transaction info block <CdtTrfTxInf> at
+        a time.
+
+        :param out: File-like object the XML document is written to.
+        """
         xml = sepa34.CustomerCreditTransferDocument()
         credit_ = sepa34.CustomerCreditTransfer()
 
         header = self._sepa_header(
             self.total_credit_transactions, len(self.credit_transactions))
-        payments_info = self._credit_payments_info()
-
-        transactions_info = []
-        for creditor in self.credit_transactions.keys():
-            transactions_info += [self._credit_transaction_info(creditor)]
-
-        payments_info.feed({
-            'credit_transfer_info': transactions_info
-        })
 
-        data = {
+        # The payment info block <PmtInf> is streamed after the header.
+        credit_.feed({
             'sepa_header': header,
-            'payment_information': payments_info
-        }
-
-        credit_.feed(data)
+            'payment_information': []
+        })
         xml.feed({
             'customer_credit_transfer': credit_
         })
 
-        xml.pretty_print = True
-        xml.build_tree()
+        writer = SEPAXMLWriter(out)
+        writer.start_document(xml)
+
+        writer.start_payment_info(self._credit_payments_info())
+        for creditor in self.credit_transactions.keys():
+            writer.write_transaction(self._credit_transaction_info(creditor))
+        writer.end_payment_info()
 
-        return str(xml)
+        writer.end_document()
 
     def _credit_transaction_info(self, creditor):
         amount = self.credit_transactions.get(creditor)
@@ -391,6 +434,19 @@ class SEPAExporter(object):
         WARNING: This must be ran *after* a successful SEPA export. Otherwise,
         the balances will be lost and a SEPA export operation cannot be tried
         again!
+
+        The resets run concurrently on ``SEPA_EXPORT_RESET_WORKERS`` threads
+        and are checkpointed per export period, so running this again after a
+        crash only resets the businesses which were not reset yet. The
+        transactions of the month are downloaded once per business, and kept
+        in ``self.transaction_summaries``. The balances read while classifying
+        are reused, so Cyclos is not asked for them again.
+
+        :return summary: The ``BalanceResetEngine.run`` summary.
         """
-        for business in self.businesses:
-            business.reset_balance()
+        engine = BalanceResetEngine(
+            self.businesses, self.date_from,
+            workers=getattr(settings, 'SEPA_EXPORT_RESET_WORKERS', 4),
+            summaries=self.transaction_summaries,
+            balances=self.account_balances)
+        return engine.run()
@@ -0,0 +1,124 @@
+"""
+Resumable engine for the monthly reset of the business balances, ran after a
+successful SEPA export.
+
+Each business reset is recorded in a ``BalanceResetCheckpoint`` for the
+export period. If a run is interrupted, running it again for the same period
+skips every business already reset.
+"""
+import datetime
+import logging
+import time
+
+from django.utils.timezone import now
+
+from cc3.rules.utils import last_month_first_of_month
+
+from ..models import (
+    BalanceResetCheckpoint, BALANCE_RESET_STARTED, BALANCE_RESET_DONE,
+    BALANCE_RESET_FAILED, get_reset_transfer_descriptions)
+from ..transaction_summary import summarize_transactions
+from ..utils import thread_pool_map
+
+LOG = logging.getLogger(__name__)
+
+
+class BalanceResetEngine(object):
+    def __init__(self, businesses, period, workers=1, summaries=None,
+                 balances=None):
+        """
+        :param businesses: Queryset of the ``BusinessProfile``s to reset.
+        :param period: Date identifying the export run, usually the first day
+        of the exported month.
+        :param workers: Maximum number of businesses reset at the same time.
+        :param summaries: Dictionary of ``TransactionSummary``s by business
+        primary key. The summaries missing for the businesses to reset are
+        downloaded in one batch and added to it.
+        :param balances: Dictionary of the Cyclos balances by business primary
+        key, as read by the SEPA export. The businesses missing from it have
+        their balance read by ``reset_balance``.
+        """
+        self.businesses = businesses
+        self.period = period
+        self.workers = workers
+        self.summaries = {} if summaries is None else summaries
+        self.balances = dict(balances or {})
+
+    def run(self):
+        """
+        Resets the balance of every business not reset yet in this period.
+
+        :return summary: Dictionary with the number of businesses in
+        ``total``, ``skipped`` (already reset by a previous run), ``done`` and
+        ``failed``, plus the run time in ``seconds``.
+        """
+        started = time.time()
+
+        checkpoints = dict(BalanceResetCheckpoint.objects.filter(
+            period=self.period).values_list('business_id', 'status'))
+        businesses = list(self.businesses.select_related('profile__user'))
+        pending = [business for business in businesses
+                   if checkpoints.get(business.pk) != BALANCE_RESET_DONE]
+
+        for business in pending:
+            if checkpoints.get(business.pk) == BALANCE_RESET_STARTED:
+                # The previous run died during this reset. Its Cyclos balance
+                # is read again, so no payment is made twice, but the
+                # invoice and email may be missing.
+                self.balances.pop(business.pk, None)
+                LOG.warning(u'Balance reset for {0} was interrupted in a '
+                            u'previous run, retrying'.format(business.pk))
+
+        self.summaries.update(summarize_transactions(
+            [business for business in pending
+             if business.pk not in self.summaries],
+            last_month_first_of_month(), datetime.date.today(),
+            get_reset_transfer_descriptions(), workers=self.workers))
+
+        results = thread_pool_map(self.reset_business, pending, self.workers)
+
+        summary = {
+            'total': len(businesses),
+            'skipped': len(businesses) - len(pending),
+            'done': results.count(BALANCE_RESET_DONE),
+            'failed': results.count(BALANCE_RESET_FAILED),
+            'seconds': time.time() - started,
+        }
+        LOG.info(u'Balance reset for period {0}: {1[total]} businesses, '
+                 u'{1[skipped]} skipped, {1[done]} done, {1[failed]} failed '
+                 u'in {1[seconds]:.2f}s'.format(self.period, summary))
+
+        return summary
+
+    def reset_business(self, business):
+        """
+        Performs ``BusinessProfile.reset_balance`` for ``business``, recording
+        its progress in the period checkpoint.
+
+        :return status: The final checkpoint status.
+        """
+        checkpoint, created = BalanceResetCheckpoint.objects.get_or_create(
+            period=self.period, business=business)
+        if not created:
+            checkpoint.status = BALANCE_RESET_STARTED
+            checkpoint.finished = None
+            checkpoint.error = ''
+            checkpoint.save()
+
+        try:
+            if business.reset_balance(
+                    summary=self.summaries.get(business.pk),
+                    balance=self.balances.get(business.pk)):
+                checkpoint.status = BALANCE_RESET_DONE
+            else:
+                checkpoint.status = BALANCE_RESET_FAILED
+                checkpoint.error = u'Balance reset failed, see the log.'
+        except Exception, e:
+            LOG.exception(u'Balance reset for {0} failed'.format(business.pk))
+            checkpoint.status = BALANCE_RESET_FAILED
+            checkpoint.error = u'{0}'.format(e)
+
+        checkpoint.finished = now()
+        checkpoint.save()
+
+        return checkpoint.status
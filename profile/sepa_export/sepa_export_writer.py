@@ -0,0 +1,96 @@
+from lxml import etree
+
+# Depth of the <PmtInf> blocks and of their transaction blocks
+# (<DrctDbtTxInf>, <CdtTrfTxInf>) inside the <Document> root.
+PAYMENT_INFO_DEPTH = 2
+TRANSACTION_DEPTH = 3
+
+
+def serialize_fragment(model, depth, encoding='UTF-8'):
+    """
+    Serializes a SEPA XmlModel block as it would appear, pretty printed, at
+    the given ``depth`` of a complete document.
+
+    The block is wrapped in ``depth`` dummy elements so lxml indents it
+    exactly as it does when it serializes the whole tree, and the wrapper
+    lines are stripped off again.
+    """
+    model.build_tree()
+
+    wrapper = parent = etree.Element('wrapper')
+    for _ in range(depth - 1):
+        parent = etree.SubElement(parent, 'wrapper')
+    parent.append(model.doc_root)
+
+    lines = etree.tostring(
+        wrapper, pretty_print=True, encoding=encoding).splitlines(True)
+    return ''.join(lines[depth:-depth])
+
+
+def split_closing_lines(xml, count):
+    """
+    Splits a pretty printed XML string before its last ``count`` lines, which
+    are the closing tags of the innermost open blocks.
+    """
+    lines = xml.splitlines(True)
+    return ''.join(lines[:-count]), ''.join(lines[-count:])
+
+
+class SEPAXMLWriter(object):
+    """
+    Writes a SEPA XML document to a file-like object one block at a time, so
+    only the block being written is kept in memory.
+
+    The output is the same as building the whole document with the SEPA
+    library and serializing it with ``pretty_print``. Usage::
+
+        writer = SEPAXMLWriter(out)
+        writer.start_document(document)  # Document with <GrpHdr> only.
+        writer.start_payment_info(payments_info)  # <PmtInf> without txs.
+        writer.write_transaction(transaction_info)
+        ...
+        writer.end_payment_info()
+        writer.end_document()
+    """
+    def __init__(self, out):
+        self.out = out
+        self.encoding = 'UTF-8'
+        self._document_closing = None
+        self._payment_info_closing = None
+
+    def start_document(self, document):
+        """
+        Writes the XML declaration, the <Document> and message opening tags
+        and the <GrpHdr> block of the given document model.
+        """
+        self.encoding = document.xml_enc
+        document.pretty_print = True
+        document.build_tree()
+
+        # Closing tags of the message element and of <Document>.
+        opening, self._document_closing = split_closing_lines(str(document), 2)
+        self.out.write(opening)
+
+    def start_payment_info(self, payments_info):
+        """
+        Writes a <PmtInf> block, leaving it open for its transactions.
+        """
+        opening, self._payment_info_closing = split_closing_lines(
+            serialize_fragment(
+                payments_info, PAYMENT_INFO_DEPTH, self.encoding), 1)
+        self.out.write(opening)
+
+    def write_transaction(self, transaction_info):
+        """
+        Writes a transaction block into the currently open <PmtInf>.
+        """
+        self.out.write(serialize_fragment(
+            transaction_info, TRANSACTION_DEPTH, self.encoding))
+
+    def end_payment_info(self):
+        self.out.write(self._payment_info_closing)
+        self._payment_info_closing = None
+
+    def end_document(self):
+        self.out.write(self._document_closing)
+        self._document_closing = None
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+
+from mock import Mock, patch
+
+from ..invoice_pdf import (
+    INVOICE_PDF_VERSION, content_hash, invoice_pdf_path, render_invoice_pdf)
+
+
+class RenderInvoicePdfTestCase(TestCase):
+    """
+    Test case for the stored invoice PDFs of ``render_invoice_pdf``.
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.storage = FileSystemStorage(location=self.root)
+        self.patcher = patch(
+            'icare4u_front.profile.invoice_pdf.invoice_storage', self.storage)
+        self.patcher.start()
+
+        self.invoice = Mock(pk=7)
+        self.content = {
+            'version': INVOICE_PDF_VERSION,
+            'language': 'nl',
+            'logo': '',
+            'positive_total': True,
+            'address': [u'Afrekening', u'', u'Bedrijf'],
+            'info': [u'Invoice no: 1'],
+            'items': [[u'Description', u'Total'], [u'', u'Total: 1.00 P']],
+        }
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.root)
+
+    def test_content_hash(self):
+        changed = dict(self.content, info=[u'Invoice no: 2'])
+
+        self.assertEqual(content_hash(self.content),
+                         content_hash(dict(self.content)))
+        self.assertNotEqual(content_hash(self.content), content_hash(changed))
+
+    def test_render_invoice_pdf(self):
+        """
+        Tests the PDF is rendered once per content, and the PDF of the
+        previous content is only removed when asked.
+        """
+        with patch('icare4u_front.profile.invoice_pdf.invoice_content',
+                   return_value=self.content), \
+                patch('icare4u_front.profile.invoice_pdf.draw_content',
+                      wraps=lambda buffer, content: buffer.write('%PDF')) \
+                as draw_content:
+            self.assertEqual(render_invoice_pdf(self.invoice), '%PDF')
+            self.assertEqual(render_invoice_pdf(self.invoice), '%PDF')
+        self.assertEqual(draw_content.call_count, 1)
+
+        path = invoice_pdf_path(7, content_hash(self.content))
+        self.assertTrue(self.storage.exists(path))
+        self.assertEqual(
+            self.storage.listdir('7'), ([], [os.path.basename(path)]))
+
+        changed = dict(self.content, info=[u'Invoice no: 2'])
+        changed_path = invoice_pdf_path(7, content_hash(changed))
+        with patch('icare4u_front.profile.invoice_pdf.invoice_content',
+                   return_value=changed):
+            render_invoice_pdf(self.invoice)
+            self.assertTrue(self.storage.exists(path))
+
+            render_invoice_pdf(self.invoice, delete_old=True)
+        self.assertFalse(self.storage.exists(path))
+        self.assertTrue(self.storage.exists(changed_path))
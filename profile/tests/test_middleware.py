@@ -0,0 +1,77 @@
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+from cc3.cyclos.models import User
+from cc3.rewards.models import UserCause
+from cc3.rewards.tests.test_factories import UserCauseFactory
+
+from ..middleware import GATES_PASSED_SESSION_KEY, ProfileMiddleware
+from ..utils import clear_profile_gates
+from .test_factories import IndividualProfileFactory, UserProfileFactory
+
+
+def some_view(request):
+    pass
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+})
+class ProfileMiddlewareTestCase(TestCase):
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.profile = UserProfileFactory.create(terms_and_conditions=True)
+        self.user = self.profile.user
+        IndividualProfileFactory.create(profile=self.profile)
+        UserCauseFactory.create(consumer=self.user)
+        clear_profile_gates(self.user.pk)
+
+        self.middleware = ProfileMiddleware()
+        self.session = {}
+
+    def process_view(self, user=None):
+        request = RequestFactory().get('/')
+        request.user = user or User.objects.get(pk=self.user.pk)
+        request.session = self.session
+        return self.middleware.process_view(request, some_view, (), {})
+
+    def test_gates_passed_no_queries(self):
+        """
+        Tests the gates are not checked again once the user passed them.
+        """
+        self.assertIsNone(self.process_view())
+        self.assertIn(GATES_PASSED_SESSION_KEY, self.session)
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.process_view(user))
+
+    def test_gates_checked_on_terms_change(self):
+        """
+        Tests the terms gate is checked again when the profile is saved.
+        """
+        self.assertIsNone(self.process_view())
+
+        self.profile.terms_and_conditions = False
+        self.profile.save()
+
+        response = self.process_view()
+        self.assertEqual(response.status_code, 302)
+
+    def test_gates_checked_on_user_cause_change(self):
+        """
+        Tests the good cause gate is checked again when the ``UserCause`` of
+        the user is removed.
+        """
+        self.assertIsNone(self.process_view())
+
+        UserCause.objects.filter(consumer=self.user).delete()
+
+        response = self.process_view()
+        self.assertEqual(response.status_code, 302)
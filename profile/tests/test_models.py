@@ -21,14 +21,21 @@ from cc3.invoices.tests.test_factories import PaymentStatusFactory
 from cc3.mail.models import MAIL_TYPE_MONTHLY_INVOICE, MailMessage
 from cc3.rewards.models import BusinessCauseSettings
 
-from ..models import BusinessProfile, link_business_account
+from ..managers import annotate_profile_type
+from ..models import (
+    BusinessProfile, UserProfile, clear_invoice_references, create_invoices,
+    get_invoice_references, link_business_account)
 from ..utils import SignalContextManager
-from .test_factories import BusinessProfileFactory, CharityProfileFactory
+from .test_factories import (
+    BusinessProfileFactory, CharityProfileFactory, IndividualProfileFactory,
+    UserProfileFactory)
 
 
 class BusinessProfileTestCase(TestCase):
     def setUp(self):
         set_backend(DummyCyclosBackend())
+        # Cached rows from previous tests were rolled back.
+        clear_invoice_references()
 
         self.good_cause = CharityProfileFactory.create()
         self.business = BusinessProfileFactory.create()
@@ -37,6 +44,9 @@ class BusinessProfileTestCase(TestCase):
             type=MAIL_TYPE_MONTHLY_INVOICE,
             subject="Monthly invoice")
 
+    def tearDown(self):
+        clear_invoice_references()
+
     def test_business_cause_settings_created(self):
         """
         Tests that a ``BusinessCauseSettings`` object is created for every new
@@ -336,3 +346,148 @@ class BusinessProfileTestCase(TestCase):
             description=ANY,
             amount=Decimal('-1.500'),
             tax_rate=0)
+
+
+class InvoiceReferencesTestCase(TestCase):
+    def setUp(self):
+        clear_invoice_references()
+
+        self.business_1 = BusinessProfileFactory.create()
+        self.business_2 = BusinessProfileFactory.create()
+
+    def tearDown(self):
+        clear_invoice_references()
+
+    def test_get_invoice_references_cached(self):
+        """
+        Tests the invoice reference rows are only looked up once.
+        """
+        currency, sender, status = get_invoice_references()
+
+        self.assertEqual(currency.code, 'EUR')
+        self.assertEqual(sender.username, 'Positoos Reserve')
+        self.assertEqual(status.description, 'Pending')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_invoice_references(), (currency, sender, status))
+
+    def test_create_invoice_cached_references(self):
+        """
+        Tests ``create_invoice`` only inserts the invoice and its line once
+        the reference rows are cached.
+        """
+        get_invoice_references()
+
+        with self.assertNumQueries(2):
+            self.business_1.create_invoice(Decimal('-1.50'), 'Credit')
+
+    def test_create_invoices(self):
+        """
+        Tests creating invoices in bulk.
+        """
+        invoices = create_invoices([
+            (self.business_1.profile, Decimal('-1.50'), 'Credit 1'),
+            (self.business_2.profile, Decimal('2.00'), 'Debit 2'),
+            (self.business_1.profile, Decimal('3.00'), 'Debit 1'),
+        ])
+
+        self.assertEqual(Invoice.objects.count(), 3)
+        self.assertTrue(all(invoice.pk for invoice in invoices))
+        self.assertEqual(
+            [invoice.to_user for invoice in invoices],
+            [self.business_1.profile.user, self.business_2.profile.user,
+             self.business_1.profile.user])
+        self.assertEqual(
+            [invoice.invoice_type for invoice in invoices],
+            ['credit', 'debit', 'debit'])
+
+        lines = InvoiceLine.objects.filter(
+            invoice__in=invoices).order_by('invoice')
+        self.assertEqual(
+            [(line.invoice, line.description, line.amount)
+             for line in lines],
+            [(invoices[0], 'Credit 1', Decimal('-1.50')),
+             (invoices[1], 'Debit 2', Decimal('2.00')),
+             (invoices[2], 'Debit 1', Decimal('3.00'))])
+        self.assertEqual(
+            sorted(Invoice.objects.values_list('admin_comment', flat=True)),
+            [u'Automatic invoice of type credit',
+             u'Automatic invoice of type debit',
+             u'Automatic invoice of type debit'])
+
+    def test_invoice_references_saved(self):
+        """
+        Tests the cache is cleared when a cached reference row is saved.
+        """
+        currency, sender, status = get_invoice_references()
+        status.description = 'Pending'
+        status.save()
+
+        with self.assertNumQueries(3):
+            get_invoice_references()
+
+
+class ProfileTypeTestCase(TestCase):
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.business = BusinessProfileFactory.create()
+        self.individual = IndividualProfileFactory.create()
+
+    def test_get_profile_type_one_query(self):
+        """
+        Tests all the profile type checks share one query.
+        """
+        profile = UserProfile.objects.get(pk=self.business.profile.pk)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(profile.get_profile_type(), 'business')
+            self.assertEqual(
+                profile.get_profile_type(include_profile=True),
+                ('business', self.business))
+            self.assertTrue(profile.is_business_profile())
+            self.assertFalse(profile.is_individual_profile())
+            self.assertFalse(profile.is_institution_profile())
+            self.assertFalse(profile.is_charity_profile())
+            self.assertFalse(profile.is_stadlander_sso_user())
+            self.assertEqual(profile.full_name, self.business.business_name)
+
+    def test_get_profile_type_none(self):
+        profile = UserProfileFactory.create()
+
+        self.assertIsNone(profile.get_profile_type())
+        self.assertEqual(
+            profile.get_profile_type(include_profile=True), (None, None))
+
+    def test_profile_types_cleared(self):
+        """
+        Tests the cached profile types are cleared when the profile is saved
+        or gets a profile type.
+        """
+        profile = UserProfileFactory.create()
+        self.assertIsNone(profile.get_profile_type())
+
+        IndividualProfileFactory.create(profile=profile)
+        self.assertEqual(profile.get_profile_type(), 'individual')
+
+        profile.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(profile.get_profile_type(), 'individual')
+
+    def test_annotate_profile_type(self):
+        """
+        Tests profiles from ``annotate_profile_type`` know their type without
+        further queries.
+        """
+        with self.assertNumQueries(1):
+            profiles = dict(
+                (profile.pk, profile) for profile in annotate_profile_type(
+                    UserProfile.all_objects.all()))
+            business = profiles[self.business.profile.pk]
+            individual = profiles[self.individual.profile.pk]
+
+            self.assertEqual(business.profile_type, 'business')
+            self.assertEqual(business.get_profile_type(), 'business')
+            self.assertEqual(individual.profile_type, 'individual')
+            self.assertTrue(individual.is_individual_profile())
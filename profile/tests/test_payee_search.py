@@ -0,0 +1,144 @@
+# encoding: utf-8
+from datetime import datetime
+
+from django.test import TestCase
+
+from cc3.cards.tests.test_factories import CardFactory, CardNumberFactory
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+from cc3.cyclos.models import CC3Profile
+
+from ..models import PayeeCardNumber, PayeeSearchToken, UserProfile
+from ..payee_search import (
+    match_card_numbers, name_tokens, oldest_card_numbers,
+    rebuild_payee_card_numbers, search_payees)
+from .test_factories import UserProfileFactory
+
+
+class PayeeSearchTestCase(TestCase):
+    """
+    Test case for the payee name search index.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.jan = UserProfileFactory.create(
+            first_name=u'Jan', tussenvoegsel=u'de', last_name=u'Vries',
+            business_name=u'')
+        self.janssen = UserProfileFactory.create(
+            first_name=u'Piet', last_name=u'Janssen',
+            business_name=u'')
+        self.jose = UserProfileFactory.create(
+            first_name=u'José', last_name=u'Smith-Black',
+            business_name=u'')
+
+    def search(self, term, limit=None):
+        return list(search_payees(UserProfile.all_objects.all(), term, limit))
+
+    def test_name_tokens(self):
+        self.assertEqual(
+            name_tokens(u'José', u'de', u'Smith-Black', u''),
+            set([u'jose', u'de', u'smith', u'black']))
+
+    def test_tokens_synced(self):
+        """
+        Tests the tokens follow the names of the profile.
+        """
+        self.assertEqual(
+            set(PayeeSearchToken.objects.filter(
+                profile=self.jan).values_list('token', flat=True)),
+            set([u'jan', u'de', u'vries']))
+
+        self.jan.last_name = u'Bakker'
+        self.jan.save()
+        self.assertEqual(self.search(u'vries'), [])
+        self.assertEqual(self.search(u'bakk'), [self.jan])
+
+        cc3_profile = CC3Profile.objects.get(pk=self.jan.pk)
+        cc3_profile.business_name = u'Bakkerij de Molen'
+        cc3_profile.save()
+        self.assertEqual(self.search(u'molen'), [self.jan])
+
+    def test_search(self):
+        """
+        Tests every word must start a name token, accents aside.
+        """
+        self.assertEqual(self.search(u'jan de'), [self.jan])
+        self.assertEqual(self.search(u'JAN De'), [self.jan])
+        self.assertEqual(self.search(u'jose black'), [self.jose])
+        self.assertEqual(self.search(u'mith'), [])
+        self.assertEqual(self.search(u'-'), [])
+
+    def test_search_ranked(self):
+        """
+        Tests profiles whose first name starts with the term come first, and
+        the number of results can be limited.
+        """
+        self.assertEqual(self.search(u'jan'), [self.jan, self.janssen])
+        self.assertEqual(self.search(u'jan', limit=1), [self.jan])
+
+
+class PayeeCardNumberTestCase(TestCase):
+    """
+    Test case for the payee card number index.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.profile = UserProfileFactory.create()
+        self.card_1 = CardFactory.create(
+            owner=self.profile.user, status='A',
+            creation_date=datetime(2016, 1, 1),
+            number=CardNumberFactory.create(number='12340001'))
+        self.card_2 = CardFactory.create(
+            owner=self.profile.user, status='A',
+            creation_date=datetime(2016, 2, 1),
+            number=CardNumberFactory.create(number='56780001'))
+
+    def search(self, prefix):
+        return list(match_card_numbers(UserProfile.all_objects.all(), prefix))
+
+    def test_active_cards(self):
+        """
+        Tests every active card of a user is indexed, and the index follows
+        status changes.
+        """
+        self.assertEqual(self.search('1234'), [self.profile])
+        self.assertEqual(self.search('5678'), [self.profile])
+
+        self.card_1.status = 'B'
+        self.card_1.save()
+        self.assertEqual(self.search('1234'), [])
+        self.assertEqual(self.search('5678'), [self.profile])
+
+        self.card_2.delete()
+        self.assertFalse(PayeeCardNumber.objects.exists())
+
+    def test_oldest_card(self):
+        """
+        Tests a payee with several matching cards is found once, with its
+        oldest matching card.
+        """
+        CardFactory.create(
+            owner=self.profile.user, status='A',
+            creation_date=datetime(2016, 3, 1),
+            number=CardNumberFactory.create(number='12340002'))
+
+        self.assertEqual(self.search('1234'), [self.profile])
+        self.assertEqual(
+            oldest_card_numbers([self.profile.user_id], '1234'),
+            {self.profile.user_id: '12340001'})
+        self.assertEqual(
+            oldest_card_numbers([self.profile.user_id], '56'),
+            {self.profile.user_id: '56780001'})
+
+    def test_rebuild(self):
+        PayeeCardNumber.objects.all().delete()
+
+        CardFactory.create(
+            owner=None, status='A',
+            number=CardNumberFactory.create(number='90000001'))
+
+        self.assertEqual(rebuild_payee_card_numbers(), 2)
+        self.assertEqual(self.search('1234'), [self.profile])
+        self.assertEqual(self.search('5678'), [self.profile])
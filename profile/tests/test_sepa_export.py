@@ -13,23 +13,113 @@ from django.db.models.signals import post_save
 from django.test import TestCase
 from django.test.utils import override_settings
 
+from sepa import sepa19, sepa34
 from xmltest import XMLAssertions
 from mock import MagicMock, patch
 
 from cc3.core.utils.test_backend import DummyCyclosBackend
 from cc3.cyclos.backends import set_backend
 
-from ..models import BusinessProfile, link_business_account
+from ..models import (
+    BusinessProfile, BalanceResetCheckpoint, clear_invoice_references,
+    link_business_account, BALANCE_RESET_DONE, BALANCE_RESET_FAILED,
+    BALANCE_RESET_STARTED)
 from ..sepa_export import SEPAExporter
+from ..sepa_export.balance_reset import BalanceResetEngine
 from ..utils import SignalContextManager
 from .test_factories import BusinessProfileFactory
 
 LOG = logging.getLogger(__name__)
 
 
+def normalize_sepa_header(xml_string):
+    """
+    Blanks out the random message ID and the creation timestamp of a SEPA XML
+    document, so two exports of the same data can be compared.
+    """
+    xml_string = re.sub('<MsgId>[^<]*</MsgId>', '<MsgId/>', xml_string)
+    return re.sub('<CreDtTm>[^<]*</CreDtTm>', '<CreDtTm/>', xml_string)
+
+
+def build_tree_direct_debit_xml(exporter):
+    """
+    Builds the pain.008.001.02 document as one ``sepa19`` object tree, the
+    way ``SEPAExporter`` did before it streamed its output.
+    """
+    xml = sepa19.DirectDebitInitDocument()
+    direct_debit = sepa19.DirectDebitInitMessage()
+    header = exporter._sepa_header(
+        exporter.total_debit_transactions,
+        len(exporter.debit_transactions['FRST']) + len(
+            exporter.debit_transactions['RCUR']))
+
+    global_payments_info = []
+    for debtor in exporter.debit_transactions['FRST'].keys():
+        frst_payment_info = exporter._debit_payments_info(
+            'FRST', debtor=debtor)
+        frst_payment_info.feed({
+            'direct_debit_operation_info': [
+                exporter._debit_transaction_info(debtor)]
+        })
+        global_payments_info += [frst_payment_info]
+
+    if exporter.debit_transactions['RCUR']:
+        rcur_payments_info = exporter._debit_payments_info('RCUR')
+        rcur_payments_info.feed({
+            'direct_debit_operation_info': [
+                exporter._debit_transaction_info(debtor)
+                for debtor in exporter.debit_transactions['RCUR'].keys()]
+        })
+        global_payments_info += [rcur_payments_info]
+
+    direct_debit.feed({
+        'sepa_header': header,
+        'payment_information': global_payments_info
+    })
+    xml.feed({'customer_direct_debit': direct_debit})
+    xml.pretty_print = True
+    xml.build_tree()
+
+    return str(xml)
+
+
+def build_tree_direct_credit_xml(exporter):
+    """
+    Builds the pain.001.001.03 document as one ``sepa34`` object tree, the
+    way ``SEPAExporter`` did before it streamed its output.
+    """
+    xml = sepa34.CustomerCreditTransferDocument()
+    credit_ = sepa34.CustomerCreditTransfer()
+    header = exporter._sepa_header(
+        exporter.total_credit_transactions,
+        len(exporter.credit_transactions))
+
+    payments_info = exporter._credit_payments_info()
+    payments_info.feed({
+        'credit_transfer_info': [
+            exporter._credit_transaction_info(creditor)
+            for creditor in exporter.credit_transactions.keys()]
+    })
+
+    credit_.feed({
+        'sepa_header': header,
+        'payment_information': payments_info
+    })
+    xml.feed({'customer_credit_transfer': credit_})
+    xml.pretty_print = True
+    xml.build_tree()
+
+    return str(xml)
+
+
+# Balances are fetched serially, so the mocked ``get_account_status`` side
+# effects below are consumed in ``BusinessProfile`` order.
+@override_settings(SEPA_EXPORT_BALANCE_WORKERS=1)
 class SEPAExportTestCase(TestCase, XMLAssertions):
     def setUp(self):
         set_backend(DummyCyclosBackend())
+        # Cached rows from previous tests were rolled back.
+        clear_invoice_references()
 
         # Copy the ``SEPA_SETTINGS`` dictionary to use it to override settings.
         self.sepa_settings = deepcopy(settings.SEPA_SETTINGS)
@@ -46,6 +136,9 @@ class SEPAExportTestCase(TestCase, XMLAssertions):
             self.initial = date.today() - timedelta(days=30)
             self.today = date.today()
 
+    def tearDown(self):
+        clear_invoice_references()
+
     def test_init_dates_sanity_check(self):
         """
         Tests the ``__init__`` method sanity check for dates.
@@ -279,6 +372,50 @@ class SEPAExportTestCase(TestCase, XMLAssertions):
             exporter.debit_transactions,
             {'FRST': {self.business_2: Decimal('0.50')}, 'RCUR': {}})
 
+    @override_settings(SEPA_EXPORT_BALANCE_WORKERS=3)
+    @patch('cc3.cyclos.backends.get_account_status')
+    def test_classify_balances_concurrent(self, mock):
+        """
+        Tests the ``_classify_balances`` method fetching the balances from a
+        pool of threads.
+
+        The debtor ``latest_payment_date`` must be stored in database, while
+        creditors are left untouched.
+        """
+        balances = {
+            self.business_1.profile.user.username: Decimal('150.000000'),
+            self.business_2.profile.user.username: Decimal('-50.000000'),
+            self.business_3.profile.user.username: Decimal('200.000000'),
+        }
+
+        def get_account_status(username):
+            account_status = MagicMock()
+            account_status.accountStatus.balance = balances[username]
+            return account_status
+
+        mock.side_effect = get_account_status
+
+        exporter = SEPAExporter(date_from=self.initial, date_to=self.today)
+
+        self.assertDictEqual(
+            exporter.credit_transactions,
+            {
+                self.business_1: Decimal('1.50'),
+                self.business_3: Decimal('2.00'),
+            })
+        self.assertDictEqual(
+            exporter.debit_transactions,
+            {'FRST': {self.business_2: Decimal('0.50')}, 'RCUR': {}})
+        self.assertEqual(mock.call_count, 3)
+
+        self.assertIsNotNone(BusinessProfile.objects.get(
+            pk=self.business_2.pk).latest_payment_date)
+        self.assertIsNone(BusinessProfile.objects.get(
+            pk=self.business_1.pk).latest_payment_date)
+        self.assertItemsEqual(
+            exporter.timings.keys(),
+            ['select', 'balances', 'classify', 'update'])
+
     @patch('cc3.cyclos.backends.get_account_status')
     def test_sepa_header(self, mock):
         """
@@ -749,3 +886,163 @@ class SEPAExportTestCase(TestCase, XMLAssertions):
         self.assertXPathNodeCount(
             xml_string, 3,
             'CstmrDrctDbtInitn/PmtInf/DrctDbtTxInf/RmtInf/Ustrd')
+
+    @patch('cc3.cyclos.backends.get_account_status')
+    def test_sepa_xml_export_debit_streamed(self, mock):
+        """
+        Tests the streamed direct debit XML is the same document the SEPA
+        library builds as one object tree, for both FRST and RCUR payments.
+        """
+        BusinessProfile.objects.filter(pk=self.business_3.pk).update(
+            latest_payment_date=self.initial)
+        account_status_1 = MagicMock()
+        account_status_2 = MagicMock()
+        account_status_3 = MagicMock()
+        account_status_1.accountStatus.balance = Decimal('-200.000000')
+        account_status_2.accountStatus.balance = Decimal('-50.000000')
+        account_status_3.accountStatus.balance = Decimal('-150.000000')
+        mock.side_effect = [
+            account_status_1,
+            account_status_2,
+            account_status_3
+        ]
+
+        exporter = SEPAExporter(date_from=self.initial, date_to=self.today)
+        self.assertEqual(len(exporter.debit_transactions['RCUR']), 1)
+
+        self.assertEqual(
+            normalize_sepa_header(exporter.build_direct_debit_xml()),
+            normalize_sepa_header(build_tree_direct_debit_xml(exporter)))
+
+    @patch('cc3.cyclos.backends.get_account_status')
+    def test_sepa_xml_export_credit_streamed(self, mock):
+        """
+        Tests the streamed credit transfer XML is the same document the SEPA
+        library builds as one object tree.
+        """
+        account_status_1 = MagicMock()
+        account_status_2 = MagicMock()
+        account_status_3 = MagicMock()
+        account_status_1.accountStatus.balance = Decimal('150.000000')
+        account_status_2.accountStatus.balance = Decimal('50.000000')
+        account_status_3.accountStatus.balance = Decimal('200.000000')
+        mock.side_effect = [
+            account_status_1,
+            account_status_2,
+            account_status_3
+        ]
+
+        exporter = SEPAExporter(date_from=self.initial, date_to=self.today)
+
+        self.assertEqual(
+            normalize_sepa_header(exporter.build_direct_credit_xml()),
+            normalize_sepa_header(build_tree_direct_credit_xml(exporter)))
+
+
+class BalanceResetEngineTestCase(TestCase):
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        with SignalContextManager(
+                post_save, receiver=link_business_account,
+                sender=BusinessProfile,
+                dispatch_uid='icare4u_business_profile_save'):
+
+            self.business_1 = BusinessProfileFactory.create()
+            self.business_2 = BusinessProfileFactory.create()
+            self.business_3 = BusinessProfileFactory.create()
+
+        self.period = date.today().replace(day=1)
+
+    @patch.object(BusinessProfile, 'reset_balance')
+    def test_run(self, mock):
+        """
+        Tests every business is reset and checkpointed, and failures are
+        recorded as such.
+        """
+        mock.side_effect = [True, False, ValueError('Cyclos is down')]
+
+        summary = BalanceResetEngine(
+            BusinessProfile.objects.all(), self.period).run()
+
+        self.assertEqual(summary['total'], 3)
+        self.assertEqual(summary['skipped'], 0)
+        self.assertEqual(summary['done'], 1)
+        self.assertEqual(summary['failed'], 2)
+
+        checkpoints = BalanceResetCheckpoint.objects.filter(
+            period=self.period)
+        self.assertEqual(
+            checkpoints.get(business=self.business_1).status,
+            BALANCE_RESET_DONE)
+        self.assertEqual(
+            checkpoints.get(business=self.business_2).status,
+            BALANCE_RESET_FAILED)
+        self.assertEqual(
+            checkpoints.get(business=self.business_3).error,
+            'Cyclos is down')
+
+    @patch.object(BusinessProfile, 'reset_balance')
+    def test_run_resumes(self, mock):
+        """
+        Tests a second run for the same period only resets the businesses
+        which were not reset yet.
+        """
+        mock.side_effect = [True, False, True]
+        BalanceResetEngine(BusinessProfile.objects.all(), self.period).run()
+
+        mock.side_effect = [True]
+        summary = BalanceResetEngine(
+            BusinessProfile.objects.all(), self.period).run()
+
+        self.assertEqual(mock.call_count, 4)
+        self.assertEqual(summary['skipped'], 2)
+        self.assertEqual(summary['done'], 1)
+        self.assertFalse(BalanceResetCheckpoint.objects.exclude(
+            status=BALANCE_RESET_DONE).exists())
+
+    @patch('cc3.cyclos.backends.transactions')
+    @patch.object(BusinessProfile, 'reset_balance')
+    def test_run_summaries(self, mock, mock_transactions):
+        """
+        Tests the transactions of every business are downloaded once, and
+        handed over to ``reset_balance``.
+        """
+        mock.return_value = True
+        mock_transactions.return_value = []
+        summaries = {}
+
+        BalanceResetEngine(
+            BusinessProfile.objects.all(), self.period,
+            summaries=summaries).run()
+
+        self.assertEqual(mock_transactions.call_count, 3)
+        self.assertItemsEqual(
+            summaries.keys(),
+            [self.business_1.pk, self.business_2.pk, self.business_3.pk])
+        mock.assert_called_with(
+            summary=summaries[self.business_3.pk], balance=None)
+
+    @patch('cc3.cyclos.backends.transactions')
+    @patch.object(BusinessProfile, 'reset_balance')
+    def test_run_balances(self, mock, mock_transactions):
+        """
+        Tests the balances already read are handed over to ``reset_balance``,
+        except for a reset interrupted in a previous run.
+        """
+        mock.return_value = True
+        mock_transactions.return_value = []
+        BalanceResetCheckpoint.objects.create(
+            period=self.period, business=self.business_1,
+            status=BALANCE_RESET_STARTED)
+
+        BalanceResetEngine(
+            BusinessProfile.objects.filter(
+                pk__in=[self.business_1.pk, self.business_2.pk]),
+            self.period,
+            balances={self.business_1.pk: 100, self.business_2.pk: -250}
+        ).run()
+
+        self.assertItemsEqual(
+            [kwargs['balance'] for args, kwargs in mock.call_args_list],
+            [None, -250])
@@ -0,0 +1,85 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.test import TestCase
+
+from mock import patch
+
+from cc3.cyclos.common import Transaction
+from cc3.cyclos.services import MemberNotFoundException
+
+from ..transaction_summary import TransactionSummary, summarize_transactions
+from .test_factories import BusinessProfileFactory
+
+
+def transaction(amount, description='test_payment', created=None):
+    return Transaction(
+        sender=None, recipient=None, amount=Decimal(amount),
+        created=created or datetime(2016, 5, 10), description=description,
+        transfer_id=1)
+
+
+class TransactionSummaryTestCase(TestCase):
+    """
+    Test case for the ``TransactionSummary`` aggregator.
+    """
+    def test_totals(self):
+        """
+        Tests spent and received amounts are added up separately.
+        """
+        summary = TransactionSummary(date(2016, 5, 1)).extend([
+            transaction('150'), transaction('-50'), transaction('25'),
+            transaction('-10')])
+
+        self.assertEqual(summary.received, Decimal('175'))
+        self.assertEqual(summary.spent, Decimal('-60'))
+        self.assertEqual(summary.from_date, date(2016, 5, 1))
+        self.assertIsNone(summary.last_reset)
+
+    def test_reset_transfer(self):
+        """
+        Tests totals only count the transactions after the last balance
+        reset.
+        """
+        reset = transaction(
+            '-125', description='Reset', created=datetime(2016, 5, 20))
+        summary = TransactionSummary(
+            date(2016, 5, 1), ['Reset']).extend([
+                transaction('150'), transaction('-25'), reset,
+                transaction('30')])
+
+        self.assertEqual(summary.received, Decimal('30'))
+        self.assertEqual(summary.spent, 0)
+        self.assertEqual(summary.from_date, date(2016, 5, 20))
+        self.assertEqual(summary.last_reset, reset)
+
+
+class SummarizeTransactionsTestCase(TestCase):
+    """
+    Test case for the ``summarize_transactions`` function.
+    """
+    def setUp(self):
+        self.business_1 = BusinessProfileFactory.create()
+        self.business_2 = BusinessProfileFactory.create()
+
+    @patch('cc3.cyclos.backends.transactions')
+    def test_summarize_transactions(self, mock):
+        """
+        Tests one summary is returned per business, and ``None`` for members
+        missing in Cyclos.
+        """
+        mock.side_effect = [
+            [transaction('150'), transaction('-50')],
+            MemberNotFoundException,
+        ]
+
+        summaries = summarize_transactions(
+            [self.business_1, self.business_2], date(2016, 5, 1),
+            date(2016, 6, 1))
+
+        self.assertEqual(summaries[self.business_1.pk].received, 150)
+        self.assertEqual(summaries[self.business_1.pk].spent, -50)
+        self.assertIsNone(summaries[self.business_2.pk])
+        mock.assert_any_call(
+            username=self.business_1.profile.user.username,
+            from_date=date(2016, 5, 1), to_date=date(2016, 6, 1))
@@ -0,0 +1,82 @@
+from django.test import TestCase
+
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+
+from ..models import ProfileTypeCount
+from ..type_counts import (
+    rebuild_profile_type_counts, update_profile_type_counts)
+from .test_factories import (
+    BusinessProfileFactory, IndividualProfileFactory, UserProfileFactory)
+
+
+class ProfileTypeCountTestCase(TestCase):
+    """
+    Test case for the profile counts of the ``USERS_BY_TYPE`` dashboard.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.individual = IndividualProfileFactory.create()
+        self.community = self.individual.profile.community
+        BusinessProfileFactory.create(
+            profile=UserProfileFactory.create(community=self.community))
+
+    def counts(self):
+        return dict(
+            (profile_type, (total, active))
+            for profile_type, total, active
+            in ProfileTypeCount.objects.filter(
+                community_id=self.community.pk).values_list(
+                'profile_type', 'total', 'active'))
+
+    def test_counts_on_create(self):
+        self.assertEqual(
+            self.counts(), {'individual': (1, 1), 'business': (1, 1)})
+
+    def test_counts_on_deactivate(self):
+        """
+        Tests deactivated users are recounted.
+        """
+        user = self.individual.profile.user
+        user.is_active = False
+        user.save()
+
+        self.assertEqual(
+            self.counts(), {'individual': (1, 0), 'business': (1, 1)})
+
+    def test_counts_on_profile_type(self):
+        """
+        Tests profiles are counted when they get or lose a profile type.
+        """
+        individual = IndividualProfileFactory.create(
+            profile=UserProfileFactory.create(community=self.community))
+        self.assertEqual(
+            self.counts(), {'individual': (2, 2), 'business': (1, 1)})
+
+        individual.delete()
+        self.assertEqual(
+            self.counts(), {'individual': (1, 1), 'business': (1, 1)})
+
+    def test_rebuild(self):
+        ProfileTypeCount.objects.all().delete()
+
+        rebuild_profile_type_counts()
+
+        self.assertEqual(
+            self.counts(), {'individual': (1, 1), 'business': (1, 1)})
+
+    def test_counts_without_community(self):
+        """
+        Tests the users without a community share one count row.
+        """
+        update_profile_type_counts(
+            {}, {1: (1, None, 'charity', 201605, True)})
+        update_profile_type_counts(
+            {}, {2: (2, None, 'charity', 201605, False)})
+
+        self.assertEqual(
+            list(ProfileTypeCount.objects.filter(
+                community_id=0, profile_type='charity').values_list(
+                'total', 'active')),
+            [(2, 1)])
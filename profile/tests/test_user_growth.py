@@ -0,0 +1,112 @@
+from datetime import datetime
+
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+
+from ..models import MonthlyUserRollup
+from ..user_growth import rebuild_monthly_user_rollup
+from ..utils import add_to_counts
+from .test_factories import (
+    BusinessProfileFactory, IndividualProfileFactory, UserProfileFactory)
+
+
+class MonthlyUserRollupTestCase(TestCase):
+    """
+    Test case for the monthly user growth rollup.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+    def totals(self, profile_type):
+        """
+        Returns the joined and active counts by month of a profile type, over
+        all the communities.
+        """
+        totals = {}
+        for month, joined, active in MonthlyUserRollup.objects.filter(
+                profile_type=profile_type).values_list(
+                'month', 'joined', 'active'):
+            total = totals.setdefault(month, [0, 0])
+            total[0] += joined
+            total[1] += active
+        # Rows left at zero by the signals are not counted.
+        return dict(
+            (month, total) for month, total in totals.iteritems() if any(total))
+
+    def create_individual(self, date_joined, is_active=True):
+        individual = IndividualProfileFactory.create()
+        user = individual.profile.user
+        user.date_joined = date_joined
+        user.is_active = is_active
+        user.save()
+        return individual
+
+    def test_rebuild(self):
+        """
+        Tests users are counted by community, profile type and month joined.
+        """
+        may = datetime(2016, 5, 10, tzinfo=utc)
+        june = datetime(2016, 6, 1, tzinfo=utc)
+        individual = self.create_individual(may)
+        self.create_individual(may, is_active=False)
+        self.create_individual(june)
+        business = BusinessProfileFactory.create()
+        business.profile.user.date_joined = june
+        business.profile.user.save()
+
+        rebuild_monthly_user_rollup()
+
+        self.assertEqual(
+            self.totals('individual'), {201605: [2, 1], 201606: [1, 1]})
+        self.assertEqual(self.totals('business'), {201606: [1, 1]})
+        self.assertTrue(MonthlyUserRollup.objects.filter(
+            community_id=individual.profile.community_id,
+            profile_type='individual', month=201605).exists())
+
+    def test_rebuild_replaces_rows(self):
+        self.create_individual(datetime(2016, 5, 10, tzinfo=utc))
+
+        rebuild_monthly_user_rollup()
+        rebuild_monthly_user_rollup()
+
+        self.assertEqual(self.totals('individual'), {201605: [1, 1]})
+
+    def test_signals(self):
+        """
+        Tests the rollup follows users joining, getting a profile type and
+        being deactivated, without a rebuild.
+        """
+        may = datetime(2016, 5, 10, tzinfo=utc)
+        profile = UserProfileFactory.create()
+        profile.user.date_joined = may
+        profile.user.save()
+        self.assertEqual(self.totals(''), {201605: [1, 1]})
+
+        IndividualProfileFactory.create(profile=profile)
+        self.assertEqual(self.totals(''), {})
+        self.assertEqual(self.totals('individual'), {201605: [1, 1]})
+
+        profile.user.is_active = False
+        profile.user.save()
+        self.assertEqual(self.totals('individual'), {201605: [1, 0]})
+
+        rollup = self.totals('individual')
+        rebuild_monthly_user_rollup()
+        self.assertEqual(self.totals('individual'), rollup)
+
+    def test_add_to_counts_drift(self):
+        """
+        Tests a counter which would drop below zero is set to zero, while the
+        other counters of the row are still updated.
+        """
+        MonthlyUserRollup.objects.create(
+            profile_type='individual', month=201605, joined=0, active=2)
+        lookup = (('community_id', 0), ('profile_type', 'individual'),
+                  ('month', 201605))
+
+        add_to_counts(MonthlyUserRollup, {lookup: {'joined': -1, 'active': 1}})
+
+        self.assertEqual(self.totals('individual'), {201605: [0, 3]})
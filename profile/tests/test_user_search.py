@@ -0,0 +1,147 @@
+# encoding: utf-8
+from django.test import TestCase, TransactionTestCase
+
+from cc3.cards.tests.test_factories import (
+    CardFactory, CardNumberFactory, TerminalFactory)
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+
+from icare4u_front.stadlander.models import StadlanderProfile
+
+from ..models import UserProfile, UserSearchDocument
+from ..user_search import match_user_profiles, rebuild_user_search_documents
+from .test_factories import UserProfileFactory
+
+
+class UserSearchDocumentTestCase(TestCase):
+    """
+    Test case for the search documents kept in sync by signals.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.profile = UserProfileFactory.create(
+            first_name=u'José', last_name=u'Janssen', business_name=u'',
+            postal_code=u'1234 AB', phone_number=u'06-12345678')
+
+    def document(self):
+        return UserSearchDocument.objects.get(profile=self.profile).document
+
+    def test_profile(self):
+        document = self.document().split()
+
+        self.assertIn(u'jose', document)
+        self.assertIn(u'janssen', document)
+        self.assertIn(u'1234ab', document)
+        self.assertIn(u'0612345678', document)
+
+    def test_related(self):
+        CardFactory.create(
+            owner=self.profile.user,
+            number=CardNumberFactory.create(number='12340001'))
+        TerminalFactory.create(
+            business=self.profile.user, name=u'Kassa')
+        stadlander_profile = StadlanderProfile.objects.create(
+            profile=self.profile, rel_number=4567)
+
+        document = self.document().split()
+        self.assertIn(u'12340001', document)
+        self.assertIn(u'kassa', document)
+        self.assertIn(u'4567', document)
+
+        stadlander_profile.delete()
+        self.assertNotIn(u'4567', self.document().split())
+
+    def test_reassigned(self):
+        """
+        Tests the documents of both the previous and the new owner are
+        updated when a card, terminal or Stadlander profile is moved.
+        """
+        other = UserProfileFactory.create()
+        card = CardFactory.create(
+            owner=self.profile.user,
+            number=CardNumberFactory.create(number='12340001'))
+        terminal = TerminalFactory.create(
+            business=self.profile.user, name=u'Kassa')
+        stadlander_profile = StadlanderProfile.objects.create(
+            profile=self.profile, rel_number=4567)
+
+        card.owner = other.user
+        card.save()
+        terminal.business = other.user
+        terminal.save()
+        stadlander_profile.profile = other
+        stadlander_profile.save()
+
+        document = self.document().split()
+        self.assertNotIn(u'12340001', document)
+        self.assertNotIn(u'kassa', document)
+        self.assertNotIn(u'4567', document)
+
+        other_document = UserSearchDocument.objects.get(
+            profile=other).document.split()
+        self.assertIn(u'12340001', other_document)
+        self.assertIn(u'kassa', other_document)
+        self.assertIn(u'4567', other_document)
+
+    def test_user_email(self):
+        self.profile.user.email = u'nieuw@voorbeeld.nl'
+        self.profile.user.save()
+
+        self.assertIn(u'voorbeeld', self.document().split())
+
+    def test_user_unchanged(self):
+        """
+        Tests saving a user without changing its searchable fields does not
+        rebuild its documents.
+        """
+        UserSearchDocument.objects.filter(profile=self.profile).update(
+            document=u'stale')
+
+        self.profile.user.is_active = False
+        self.profile.user.save()
+        self.assertEqual(self.document(), u'stale')
+
+        self.profile.user.last_name = u'Jansen'
+        self.profile.user.save()
+        self.assertNotEqual(self.document(), u'stale')
+
+    def test_delete_profile(self):
+        CardFactory.create(owner=self.profile.user)
+        StadlanderProfile.objects.create(
+            profile=self.profile, rel_number=4567)
+
+        self.profile.user.delete()
+
+        self.assertFalse(UserSearchDocument.objects.exists())
+
+    def test_rebuild(self):
+        document = self.document()
+        UserSearchDocument.objects.all().delete()
+
+        self.assertEqual(rebuild_user_search_documents(), 1)
+        self.assertEqual(self.document(), document)
+
+
+class MatchUserProfilesTestCase(TransactionTestCase):
+    """
+    Test case for the user search. Full-text indexes only see committed
+    documents, hence the ``TransactionTestCase``.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.jan = UserProfileFactory.create(
+            first_name=u'Jan', last_name=u'de Vries', business_name=u'')
+        self.piet = UserProfileFactory.create(
+            first_name=u'Piet', last_name=u'Janssen', business_name=u'',
+            postal_code=u'1234 AB')
+
+    def search(self, term):
+        return set(match_user_profiles(UserProfile.all_objects.all(), term))
+
+    def test_match_user_profiles(self):
+        self.assertEqual(self.search(u'jan'), set([self.jan, self.piet]))
+        self.assertEqual(self.search(u'Jan de'), set([self.jan]))
+        self.assertEqual(self.search(u'1234ab'), set([self.piet]))
+        self.assertEqual(self.search(u'vries piet'), set())
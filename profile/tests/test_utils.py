@@ -1,10 +1,16 @@
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from mock import patch
 
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
 from cc3.cyclos.tests.test_factories import UserFactory
 
-from ..utils import generate_username, squeeze_email
+from ..utils import (
+    UsernameNotAvailable, generate_slug, generate_username,
+    get_cached_account_balances, squeeze_email)
+from .test_factories import UserProfileFactory
 
 
 class SqueezeEmailTestCase(TestCase):
@@ -89,3 +95,77 @@ class GenerateUsernameTestCase(TestCase):
         # Return value must contain the given username followed by 4 digits.
         self.assertIn('infomaykinmedianl', value)
         self.assertTrue(len(value), len('infomaykinmedianl') + 4)
+
+    @patch('cc3.cyclos.backends.search')
+    def test_single_query(self, mock):
+        """
+        Tests the taken usernames are fetched in one query, however many
+        usernames are taken, and the username chosen is searched in Cyclos.
+        """
+        mock.side_effect = [
+            [(99, 'John Doe', 'jd@example.com', 'johndoe', '12')], []]
+        UserFactory.create(username='johndoe1234')
+
+        with self.assertNumQueries(1):
+            value = generate_username('johndoe')
+
+        # The taken username and the one chosen are searched.
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(mock.call_args[1], {'username': value})
+        self.assertNotIn(value, ('johndoe', 'johndoe1234'))
+        self.assertTrue(value.startswith('johndoe'))
+        self.assertEqual(len(value), len('johndoe') + 4)
+
+    @patch('cc3.cyclos.backends.search')
+    def test_taken_in_cyclos(self, mock):
+        """
+        Tests a username is never returned when Cyclos has it, and an error
+        is raised when every username tried is taken.
+        """
+        mock.return_value = [
+            (99, 'John Doe', 'jd@example.com', 'johndoe', '12')]
+
+        self.assertRaises(
+            UsernameNotAvailable, generate_username, 'johndoe')
+        searched = [call[1]['username'] for call in mock.call_args_list]
+        self.assertEqual(len(set(searched)), len(searched))
+
+
+class GenerateSlugTestCase(TestCase):
+    """
+    Test case for the ``generate_slug`` function.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+    def test_generate_slug(self):
+        self.assertEqual(generate_slug(u'Jan de Vries'), u'jan-de-vries')
+
+        UserProfileFactory.create(slug=u'jan-de-vries')
+        UserProfileFactory.create(slug=u'jan-de-vries1')
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                generate_slug(u'Jan de Vries'), u'jan-de-vries2')
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class GetCachedAccountBalancesTestCase(TestCase):
+    """
+    Test case for the ``get_cached_account_balances`` function.
+    """
+    @patch('icare4u_front.profile.utils.get_account_balances')
+    def test_cached(self, mock):
+        """
+        Tests only the balances missing from the cache are looked up, and
+        unknown members are not cached.
+        """
+        mock.side_effect = lambda usernames, workers: dict(
+            (username, None if username == 'unknown' else 10)
+            for username in usernames)
+
+        self.assertEqual(get_cached_account_balances(['a', 'unknown']),
+                         {'a': 10, 'unknown': None})
+        self.assertEqual(get_cached_account_balances(['a', 'b', 'unknown']),
+                         {'a': 10, 'b': 10, 'unknown': None})
+        self.assertEqual(sorted(mock.call_args[0][0]), ['b', 'unknown'])
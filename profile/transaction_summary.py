@@ -0,0 +1,71 @@
+import logging
+
+from cc3.cyclos import backends
+from cc3.cyclos.services import MemberNotFoundException
+
+from .utils import thread_pool_map
+
+LOG = logging.getLogger(__name__)
+
+
+class TransactionSummary(object):
+    """
+    Running totals of the Cyclos transactions of a business in a period,
+    counted since its most recent balance reset.
+
+    Transactions are fed one at a time with ``add``, in chronological order.
+    A transaction whose description is one of ``reset_transfer_descriptions``
+    is a balance reset: the totals start again from zero and ``from_date``
+    moves to the reset date.
+    """
+    def __init__(self, from_date, reset_transfer_descriptions=()):
+        self.from_date = from_date
+        self.reset_transfer_descriptions = reset_transfer_descriptions
+        self.spent = 0
+        self.received = 0
+        self.last_reset = None
+
+    def add(self, transaction):
+        if transaction.description in self.reset_transfer_descriptions:
+            # Reset-transaction found
+            self.spent = 0
+            self.received = 0
+            self.from_date = transaction.created.date()
+            self.last_reset = transaction
+            return
+
+        if transaction.amount > 0:
+            self.received += transaction.amount
+        else:
+            self.spent += transaction.amount
+
+    def extend(self, transactions):
+        for transaction in transactions:
+            self.add(transaction)
+        return self
+
+
+def summarize_transactions(businesses, from_date, to_date,
+                           reset_transfer_descriptions=(), workers=1):
+    """
+    Downloads the Cyclos transactions between ``from_date`` and ``to_date``
+    of every business in ``businesses`` once, on at most ``workers`` threads,
+    and summarizes them.
+
+    :return: Dictionary mapping each business primary key to its
+    ``TransactionSummary``, or to ``None`` if the member does not exist in
+    Cyclos.
+    """
+    def _summarize(business):
+        username = business.profile.user.username
+        try:
+            transactions = backends.transactions(
+                username=username, from_date=from_date, to_date=to_date)
+        except MemberNotFoundException:
+            LOG.error(u'Member not found (in Cyclos): {0}'.format(username))
+            return business.pk, None
+
+        return business.pk, TransactionSummary(
+            from_date, reset_transfer_descriptions).extend(transactions)
+
+    return dict(thread_pool_map(_summarize, businesses, workers))
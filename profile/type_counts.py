@@ -0,0 +1,86 @@
+"""
+Profile counts by type for the ``USERS_BY_TYPE`` statistics dashboard.
+
+``ProfileTypeCount`` keeps, per community and profile type, the number of
+profiles and of active ones, so the dashboard only reads a few rows. The
+counts are kept up to date with ``F()`` updates by the same signals as the
+monthly user rollup (see ``profile.user_growth``), and can be rebuilt by the
+``rebuild_profile_type_counts`` management command.
+"""
+from collections import defaultdict
+
+from django.db.transaction import atomic
+
+from .managers import PROFILE_TYPE_RELATIONS
+from .utils import add_to_counts
+
+
+def count_profile_types(profiles):
+    """
+    Counts the profiles of a ``UserProfile`` queryset by community and
+    profile type, in one pass.
+
+    :return: Dictionary of ``[total, active]`` counts keyed by
+    ``(community_id, profile_type)``, with a ``community_id`` of 0 for the
+    profiles without a community. Profiles without a type are left out.
+    """
+    counts = defaultdict(lambda: [0, 0])
+    for row in profiles.values_list(
+            'community_id', 'user__is_active',
+            *[relation for _type, relation in PROFILE_TYPE_RELATIONS]
+            ).iterator():
+        community_id, is_active = row[:2]
+
+        for (profile_type, _relation), profile_id in zip(
+                PROFILE_TYPE_RELATIONS, row[2:]):
+            if profile_id is not None:
+                count = counts[(community_id or 0, profile_type)]
+                count[0] += 1
+                if is_active:
+                    count[1] += 1
+                break
+
+    return counts
+
+
+def rebuild_profile_type_counts():
+    """
+    Recounts the profiles of every community.
+
+    :return: The number of rows written.
+    """
+    from .models import ProfileTypeCount, UserProfile
+
+    counts = count_profile_types(UserProfile.all_objects.all())
+    with atomic():
+        ProfileTypeCount.objects.all().delete()
+        ProfileTypeCount.objects.bulk_create([
+            ProfileTypeCount(
+                community_id=community_id, profile_type=profile_type,
+                total=total, active=active)
+            for (community_id, profile_type), (total, active)
+            in counts.iteritems()])
+    return len(counts)
+
+
+def update_profile_type_counts(before, after):
+    """
+    Moves the users from their counts in the ``before`` to those in the
+    ``after`` ``profile.user_growth.user_rows``. Users without a profile
+    type are not counted.
+    """
+    from .models import ProfileTypeCount
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for rows, sign in ((before, -1), (after, 1)):
+        for _user_id, community_id, profile_type, _month, is_active in \
+                rows.itervalues():
+            if not profile_type:
+                continue
+            counts = deltas[(('community_id', community_id or 0),
+                             ('profile_type', profile_type))]
+            counts['total'] += sign
+            if is_active:
+                counts['active'] += sign
+
+    add_to_counts(ProfileTypeCount, deltas)
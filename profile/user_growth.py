@@ -0,0 +1,122 @@
+"""
+Monthly user growth rollup for the statistics dashboards.
+
+``MonthlyUserRollup`` holds, per community, profile type and month joined,
+how many users joined and how many of them are still active. The
+``TOTAL_*_USERS_BY_MONTH`` statistics queries add these rows up into running
+totals, instead of joining every user against every month.
+
+The rows are kept up to date by signals: the users a saved or deleted user,
+profile or profile type object counts for are looked up before and after
+the change, and the difference is added to their rows. The
+``update_monthly_user_rollup`` management command rebuilds the rollup in
+one pass over the users, for changes made without signals.
+"""
+from collections import defaultdict
+
+from django.db.transaction import atomic
+
+from cc3.cyclos.models import User
+
+from .managers import PROFILE_TYPE_RELATIONS
+from .utils import add_to_counts
+
+
+def _user_rows(users):
+    """
+    Yields ``(user_id, community_id, profile_type, month, is_active)`` for
+    the users of a ``User`` queryset, ``profile_type`` being '' for users
+    without a profile type and ``month`` the month joined, as an ``int`` like
+    201605.
+    """
+    relations = [
+        'cc3_profile__userprofile__{0}'.format(relation)
+        for _type, relation in PROFILE_TYPE_RELATIONS]
+
+    for row in users.values_list(
+            'pk', 'date_joined', 'is_active', 'cc3_profile__community_id',
+            *relations).iterator():
+        user_id, date_joined, is_active, community_id = row[:4]
+
+        profile_type = ''
+        for (_type, _relation), profile_id in zip(
+                PROFILE_TYPE_RELATIONS, row[4:]):
+            if profile_id is not None:
+                profile_type = _type
+                break
+
+        yield (user_id, community_id, profile_type,
+               date_joined.year * 100 + date_joined.month, is_active)
+
+
+def user_rows(user_ids):
+    """
+    Returns the ``_user_rows`` of the users with the given ids, by id.
+    """
+    if not user_ids:
+        return {}
+    return dict(
+        (row[0], row) for row in _user_rows(User.objects.filter(
+            pk__in=user_ids)))
+
+
+def count_monthly_users():
+    """
+    Counts the users by community, profile type and month joined.
+
+    :return: Dictionary of ``[joined, active]`` counts keyed by
+    ``(community_id, profile_type, month)``, where ``community_id`` is 0 for
+    the users without a community and ``month`` is an ``int`` like 201605.
+    """
+    counts = defaultdict(lambda: [0, 0])
+    for _user_id, community_id, profile_type, month, is_active in \
+            _user_rows(User.objects.all()):
+        count = counts[(community_id or 0, profile_type, month)]
+        count[0] += 1
+        if is_active:
+            count[1] += 1
+
+    return counts
+
+
+def rebuild_monthly_user_rollup():
+    """
+    Replaces the ``MonthlyUserRollup`` rows with fresh counts.
+
+    :return: The number of rows written.
+    """
+    from .models import MonthlyUserRollup
+
+    rows = [
+        MonthlyUserRollup(
+            community_id=community_id, profile_type=profile_type,
+            month=month, joined=joined, active=active)
+        for (community_id, profile_type, month), (joined, active)
+        in count_monthly_users().iteritems()]
+
+    with atomic():
+        MonthlyUserRollup.objects.all().delete()
+        MonthlyUserRollup.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
+def update_monthly_user_rollup(before, after):
+    """
+    Moves the users from their rows in the ``before`` to those in the
+    ``after`` ``user_rows``.
+    """
+    from .models import MonthlyUserRollup
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for rows, sign in ((before, -1), (after, 1)):
+        for _user_id, community_id, profile_type, month, is_active in \
+                rows.itervalues():
+            counts = deltas[(('community_id', community_id or 0),
+                             ('profile_type', profile_type),
+                             ('month', month))]
+            counts['joined'] += sign
+            if is_active:
+                counts['active'] += sign
+
+    add_to_counts(MonthlyUserRollup, deltas)
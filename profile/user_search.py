@@ -0,0 +1,194 @@
+"""
+User search of the community admin.
+
+The searchable fields of every ``UserProfile`` (names, email, address, phone
+numbers, card numbers, Stadlander ``rel_number`` and terminal names) are
+normalised into the one ``UserSearchDocument`` of the profile, kept in sync
+by signals. On MySQL the documents are full-text indexed, so a search is a
+``MATCH ... AGAINST`` on one table instead of ``LIKE '%term%'`` over the
+joins of all the ``CommunityUserAdmin.search_fields``.
+
+Like the payee search, every word of a search term matches the documents
+having a token starting with it.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.transaction import atomic
+
+from cc3.cards.models import Card, Terminal
+
+from .payee_search import name_tokens, normalize_name, tokenize_regex
+
+# Shortest word in the MySQL full-text index (``innodb_ft_min_token_size``).
+FULLTEXT_MIN_TOKEN_SIZE = getattr(settings, 'FULLTEXT_MIN_TOKEN_SIZE', 3)
+
+# Default InnoDB full-text stopwords, which are not in the index either.
+FULLTEXT_STOPWORDS = frozenset([
+    u'a', u'about', u'an', u'are', u'as', u'at', u'be', u'by', u'com',
+    u'de', u'en', u'for', u'from', u'how', u'i', u'in', u'is', u'it', u'la',
+    u'of', u'on', u'or', u'that', u'the', u'this', u'to', u'was', u'what',
+    u'when', u'where', u'who', u'will', u'with', u'und', u'www',
+])
+
+
+def squeeze(value):
+    """
+    Returns ``value`` normalised, without whitespace and punctuation, so
+    postal codes and phone numbers are found however they are written.
+    """
+    return u''.join(tokenize_regex.split(normalize_name(value)))
+
+
+def user_search_document(profile, card_numbers=(), rel_numbers=(),
+                         terminal_names=()):
+    """
+    Returns the search document of a ``UserProfile`` with its ``user``: the
+    normalised tokens of its searchable fields, separated by spaces.
+    """
+    tokens = name_tokens(
+        profile.first_name, profile.tussenvoegsel, profile.last_name,
+        profile.user.first_name, profile.user.last_name, profile.user.email,
+        profile.business_name, profile.address, profile.extra_address,
+        profile.num_street, profile.postal_code, profile.phone_number,
+        profile.mobile_number, *(
+            list(card_numbers) + list(rel_numbers) + list(terminal_names)))
+    tokens.update(
+        squeeze(value) for value in (
+            profile.postal_code, profile.phone_number, profile.mobile_number)
+        if value)
+    tokens.discard(u'')
+    return u' '.join(sorted(tokens))
+
+
+def update_user_search_document(profile_id, create=True):
+    """
+    Brings the search document of a ``UserProfile`` in line with its current
+    fields.
+
+    :param create: Whether to create the document if it does not exist yet.
+    Receivers of deletions do not, as the profile may be being deleted.
+    """
+    from .models import UserProfile, UserSearchDocument
+
+    profile = UserProfile.all_objects.select_related('user').filter(
+        pk=profile_id).first()
+    if profile is None:
+        return
+
+    document = user_search_document(
+        profile,
+        Card.objects.filter(owner_id=profile.user_id).values_list(
+            'number__number', flat=True),
+        [rel_number for rel_number in UserProfile.all_objects.filter(
+            pk=profile.pk).values_list(
+            'stadlanderprofile__rel_number', flat=True)
+         if rel_number is not None],
+        Terminal.objects.filter(business_id=profile.user_id).values_list(
+            'name', flat=True))
+
+    existing = UserSearchDocument.objects.filter(profile_id=profile.pk)
+    if create:
+        if existing.values_list('document', flat=True).first() != document:
+            UserSearchDocument.objects.update_or_create(
+                profile_id=profile.pk, defaults={'document': document})
+    else:
+        existing.exclude(document=document).update(document=document)
+
+
+def update_user_search_documents(user_id, create=True):
+    """
+    Updates the search documents of the profiles of a user, see
+    ``update_user_search_document``.
+    """
+    from .models import UserProfile
+
+    for profile_id in UserProfile.all_objects.filter(
+            user_id=user_id).values_list('pk', flat=True):
+        update_user_search_document(profile_id, create)
+
+
+def user_search_documents():
+    """
+    Yields the ``(profile_id, document)`` of every ``UserProfile``, reading
+    each related table once.
+    """
+    from .models import UserProfile
+
+    card_numbers = defaultdict(list)
+    for owner_id, number in Card.objects.values_list(
+            'owner_id', 'number__number').iterator():
+        card_numbers[owner_id].append(number)
+
+    terminal_names = defaultdict(list)
+    for business_id, name in Terminal.objects.values_list(
+            'business_id', 'name').iterator():
+        terminal_names[business_id].append(name)
+
+    rel_numbers = defaultdict(list)
+    for profile_id, rel_number in UserProfile.all_objects.filter(
+            stadlanderprofile__isnull=False).values_list(
+            'pk', 'stadlanderprofile__rel_number').iterator():
+        rel_numbers[profile_id].append(rel_number)
+
+    for profile in UserProfile.all_objects.select_related('user').iterator():
+        yield profile.pk, user_search_document(
+            profile, card_numbers[profile.user_id], rel_numbers[profile.pk],
+            terminal_names[profile.user_id])
+
+
+def rebuild_user_search_documents():
+    """
+    Rebuilds the whole ``UserSearchDocument`` table.
+
+    :return: The number of documents.
+    """
+    from .models import UserSearchDocument
+
+    documents = [
+        UserSearchDocument(profile_id=profile_id, document=document)
+        for profile_id, document in user_search_documents()]
+
+    with atomic():
+        UserSearchDocument.objects.all().delete()
+        UserSearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+    return len(documents)
+
+
+def match_user_profiles(queryset, term):
+    """
+    Filters a ``UserProfile`` queryset down to the profiles whose search
+    document has a token starting with each word of ``term``.
+    """
+    words = sorted(name_tokens(term))
+    if not words:
+        return queryset
+
+    from .models import UserSearchDocument
+
+    documents = UserSearchDocument.objects.all()
+
+    if connection.vendor == 'mysql':
+        # Words missing from the full-text index are matched with ``LIKE``
+        # on the documents the other words matched.
+        indexed = [word for word in words
+                   if len(word) >= FULLTEXT_MIN_TOKEN_SIZE and
+                   word not in FULLTEXT_STOPWORDS]
+        if indexed:
+            documents = documents.extra(
+                where=[u'MATCH ({0}.{1}) AGAINST (%s IN BOOLEAN MODE)'.format(
+                    connection.ops.quote_name(
+                        UserSearchDocument._meta.db_table),
+                    connection.ops.quote_name('document'))],
+                params=[u' '.join(u'+{0}*'.format(word) for word in indexed)])
+            words = [word for word in words if word not in indexed]
+
+    for word in words:
+        documents = documents.filter(
+            Q(document__startswith=word) |
+            Q(document__contains=u' {0}'.format(word)))
+
+    return queryset.filter(pk__in=documents.values('profile_id'))
@@ -1,8 +1,17 @@
+import logging
 import re
+import uuid
+from itertools import chain, count
+from multiprocessing.pool import ThreadPool
 from string import ascii_letters, digits
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.db.models import Case, F, Value, When
+from django.db.transaction import atomic
 from django.template.defaultfilters import slugify
+from django.utils import translation
 from django.utils.translation import get_language
 
 from cms.models import Page
@@ -10,6 +19,9 @@ from cms.models import Page
 from cc3.accounts.utils import get_non_obvious_number
 from cc3.cyclos import backends
 from cc3.cyclos.models import User
+from cc3.cyclos.services import MemberNotFoundException
+
+LOG = logging.getLogger(__name__)
 
 
 class SignalContextManager(object):
@@ -81,38 +93,235 @@ def squeeze_email(email):
     return username
 
 
-def generate_username(username):
+# Number of random suffixes tried before taking the first free one.
+RANDOM_SUFFIX_ATTEMPTS = 100
+
+
+def first_free_name(candidates, taken):
     """
-    Given a string ``username``, it queries the database to check if there
-    is already a ``User`` with that username. If so, tries to generate a
-    new username with a random number.
+    Returns the first of ``candidates`` not in ``taken``, ignoring case.
 
-    It will repeat the process recursively, if necessary, until a unique
-    username is set.
+    :param taken: Set of lower cased names.
     """
-    test_username = username.ljust(4, '0')
+    for candidate in candidates:
+        if candidate.lower() not in taken:
+            return candidate
 
-    # max cyclos username length is 30, so if recursing, then use max 26 chars
-    # of username passed in with 4 digits, otherwise an invalid cyclos username
-    # is generated
-    try:
-        User.objects.get(username=test_username)
-        test_username = "{0}{1}".format(
+
+def username_candidates(username):
+    """
+    Yields ``username``, padded to 4 characters, and then ``username`` with
+    4 digit suffixes, random ones first.
+    """
+    yield username.ljust(4, '0')
+
+    # max cyclos username length is 30, so use max 26 chars of username
+    # passed in with 4 digits, otherwise an invalid cyclos username is
+    # generated
+    for _ in xrange(RANDOM_SUFFIX_ATTEMPTS):
+        yield "{0}{1}".format(
             username[:26], get_non_obvious_number(number_digits=4))
-        return generate_username(test_username)
-    except User.DoesNotExist:
-        # Check now the Cyclos backend, in search for existing
-        # users with this username.
-        if not backends.search(username=test_username):
-            # Nice username for the new user. It doesn't exist in Django DB,
-            # nor in Cyclos DB.
+    for number in xrange(1000, 10000):
+        yield "{0}{1}".format(username[:26], number)
+
+
+class UsernameNotAvailable(Exception):
+    """
+    Raised when ``generate_username`` finds no free username.
+    """
+
+
+# Number of usernames free in the database which are searched in Cyclos
+# before giving up.
+CYCLOS_USERNAME_ATTEMPTS = 10
+
+
+def generate_username(username):
+    """
+    Given a string ``username``, returns it if there is no ``User`` with that
+    username in the database, nor in Cyclos. Otherwise returns ``username``
+    followed by a random number which is not taken.
+
+    The usernames starting like ``username`` are fetched in one query, and
+    each username chosen is searched in Cyclos, which is usually once.
+
+    :raises UsernameNotAvailable: If no free username is found.
+    """
+    taken = set(name.lower() for name in User.objects.filter(
+        username__istartswith=username[:26]).values_list(
+        'username', flat=True))
+
+    candidates = username_candidates(username)
+    for _ in xrange(CYCLOS_USERNAME_ATTEMPTS):
+        test_username = first_free_name(candidates, taken)
+        if test_username is None:
+            break
+
+        # Check now the Cyclos backend, in search for existing users with
+        # this username.
+        members = backends.search(username=test_username)
+        if not members:
             return test_username
-        else:
-            # There was another previous user registered with this username in
-            # Cyclos DB. Retry.
-            test_username = "{0}{1}".format(
-                username[:26], get_non_obvious_number(number_digits=4))
-            return generate_username(test_username)
+
+        taken.add(test_username.lower())
+        taken.update(
+            member[3].lower() for member in members
+            if isinstance(member, (list, tuple)) and len(member) > 3)
+
+    raise UsernameNotAvailable(
+        u"No free username found for '{0}'".format(username))
+
+
+def generate_slug(name):
+    """
+    Returns the slug of ``name`` if no ``UserProfile`` has it yet, otherwise
+    the slug followed by the lowest number which makes it unique.
+
+    The slugs starting like the slug of ``name`` are fetched in one query.
+    """
+    from .models import UserProfile
+
+    slug = slugify(name)
+    taken = set(existing.lower() for existing in UserProfile.all_objects.filter(
+        slug__istartswith=slug).values_list('slug', flat=True))
+
+    return first_free_name(chain(
+        [slug], (u"{0}{1}".format(slug, number) for number in count(1))),
+        taken)
+
+
+def thread_pool_map(func, items, workers=1):
+    """
+    Returns ``[func(item) for item in items]``, spreading the calls over a
+    pool of at most ``workers`` threads when ``workers`` is greater than 1.
+
+    Worker threads run with the caller's active language, and close the
+    database connection Django opens for them after every item.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    language = translation.get_language()
+
+    def _call(item):
+        translation.activate(language)
+        try:
+            return func(item)
+        finally:
+            connection.close()
+
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(_call, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def add_to_counts(model, deltas):
+    """
+    Adds to the counters of rows of ``model`` with ``F()`` updates, so
+    concurrent changes add up. Missing rows are created.
+
+    :param deltas: Dictionary of ``{field: delta}`` dictionaries, keyed by
+    the lookups of the rows as tuples of ``(field, value)`` pairs.
+
+    Counters which would drop below zero, which only happens if they were
+    off already, are set to zero (and logged) while the other counters of
+    the row are still updated. The counts are right again once rebuilt.
+    """
+    for lookup, counts in deltas.iteritems():
+        counts = dict(
+            (field, delta) for field, delta in counts.iteritems() if delta)
+        if not counts:
+            continue
+
+        rows = model.objects.filter(**dict(lookup))
+        updates = dict(
+            (field, F(field) + delta) for field, delta in counts.iteritems())
+        not_negative = dict(
+            ('{0}__gte'.format(field), -delta)
+            for field, delta in counts.iteritems() if delta < 0)
+        clamped = dict(updates, **dict(
+            (field, Case(
+                When(**{'{0}__gte'.format(field): -delta,
+                        'then': F(field) + delta}),
+                default=Value(0), output_field=model._meta.get_field(field)))
+            for field, delta in counts.iteritems() if delta < 0))
+
+        if rows.filter(**not_negative).update(**updates):
+            continue
+        if rows.exists():
+            LOG.warning(
+                u'{0} {1} counters drifted below zero, clamped to zero '
+                u'until the counts are rebuilt'.format(
+                    model.__name__, dict(lookup)))
+            rows.update(**clamped)
+            continue
+        if not any(delta > 0 for delta in counts.itervalues()):
+            continue
+
+        try:
+            with atomic():
+                model.objects.create(**dict(lookup, **dict(
+                    (field, max(delta, 0))
+                    for field, delta in counts.iteritems())))
+        except IntegrityError:
+            # Created by a concurrent change meanwhile.
+            rows.update(**clamped)
+
+
+def get_account_balances(usernames, workers=1):
+    """
+    Retrieves the Cyclos ``accountStatus.balance`` for every username in
+    ``usernames``.
+
+    Each lookup is a SOAP round trip, so they are spread over at most
+    ``workers`` threads (see ``thread_pool_map``).
+
+    Returns a dictionary mapping each username to its balance, or to ``None``
+    when the member does not exist in Cyclos.
+    """
+    def _get_balance(username):
+        try:
+            return username, backends.get_account_status(
+                username).accountStatus.balance
+        except MemberNotFoundException:
+            LOG.error(u'Member not found (in Cyclos): {0}'.format(username))
+            return username, None
+
+    return dict(thread_pool_map(_get_balance, usernames, workers))
+
+
+def _account_balance_key(username):
+    return 'icare4u_account_balance_{0}'.format(username)
+
+
+def get_cached_account_balances(usernames, workers=1):
+    """
+    Returns ``get_account_balances(usernames, workers)``, taking the balances
+    looked up in the last ``ACCOUNT_BALANCE_CACHE_TIMEOUT`` seconds from the
+    cache. Only the other usernames are looked up in Cyclos.
+    """
+    keys = dict((_account_balance_key(username), username)
+                for username in usernames)
+    balances = dict(
+        (keys[key], balance)
+        for key, balance in cache.get_many(keys.keys()).iteritems())
+
+    missing = [username for username in keys.itervalues()
+               if username not in balances]
+    if missing:
+        looked_up = get_account_balances(missing, workers)
+        cache.set_many(
+            dict((_account_balance_key(username), balance)
+                 for username, balance in looked_up.iteritems()
+                 if balance is not None),
+            getattr(settings, 'ACCOUNT_BALANCE_CACHE_TIMEOUT', 60))
+        balances.update(looked_up)
+
+    return balances
 
 
 def generate_mandate_id(user):
@@ -188,3 +397,32 @@ def get_cms_page_url(reverse_id):
     except Page.DoesNotExist:
         url = ''
     return url
+
+
+def _profile_gates_version_key(user_id):
+    return 'icare4u_profile_gates_version_{0}'.format(user_id)
+
+
+def get_profile_gates_version(user_id):
+    """
+    Returns the current version of the ``ProfileMiddleware`` gate decisions
+    (terms and conditions, profile update and good cause) for a user.
+
+    A user who passed all the gates is not checked again until the version
+    changes, see ``clear_profile_gates``.
+    """
+    key = _profile_gates_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key) or version
+    return version
+
+
+def clear_profile_gates(user_id):
+    """
+    Starts a new version of the gate decisions for a user, so the
+    ``ProfileMiddleware`` checks all the gates again on the next request.
+    """
+    cache.delete(_profile_gates_version_key(user_id))
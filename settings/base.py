@@ -569,6 +569,8 @@ INTER_COMMUNITIES_TRANSACTIONS_MEMBER_GROUPS = \
     [CYCLOS_INSTITUTION_MEMBER_GROUP, ]
 
 CONTACT_AUTO_MINIMUM_CHARS = 4
+# Maximum number of payees returned by the contact name autocomplete.
+CONTACT_AUTO_MAX_RESULTS = 20
 
 # CC3 applications settings.
 
@@ -828,6 +830,11 @@ STADLANDER_AD_REWARD_SENDER = 'stadlander'
 # STADLANDER_WSDL = "https://acceptatie.stadlander.nl/services.html?wsdl"
 STADLANDER_WEB_SERVICE_URL = "https://acceptatie.stadlander.nl/services.html"
 STADLANDER_WEB_SERVICE_API_CALL = "getQoinData"
+# seconds to wait for the connection and the response of a PAPI key check
+STADLANDER_WEB_SERVICE_TIMEOUT = 10
+
+# Number of concurrent PayStadlander payments in a batch of rules actions
+STADLANDER_PAYMENT_WORKERS = 4
 
 
 # initially this was 10
@@ -915,6 +922,23 @@ SEPA_EXPORT_DEBIT_TRANSFER_DESCRIPTION = "Bijschrijving na automatisch incasso"
 SEPA_EXPORT_CREDIT_TRANSFER_TYPE_ID = 36
 SEPA_EXPORT_CREDIT_TRANSFER_DESCRIPTION = "Afschrijving na automatisch incasso"
 
+# Number of concurrent Cyclos balance lookups during a SEPA export
+SEPA_EXPORT_BALANCE_WORKERS = 8
+
+# Number of businesses whose balance is reset concurrently after a SEPA export
+SEPA_EXPORT_RESET_WORKERS = 4
+
+# Number of processes rendering the invoice PDFs of a month
+INVOICE_PDF_WORKERS = 4
+
+# Directory of the rendered invoice PDFs, not served as media
+INVOICE_PDF_ROOT = PROJECT_DIR.ancestor(1).child('private', 'invoices')
+
+# Number of concurrent Cyclos balance lookups for a page of the community
+# admin user list, and the seconds the balances are cached
+COMMUNITY_ADMIN_BALANCE_WORKERS = 8
+ACCOUNT_BALANCE_CACHE_TIMEOUT = 60
+
 # Module path for custom stats SQL
 STATS_CUSTOM_SQL_MODULE = 'icare4u_front.custom.sql.statistics'
 
@@ -1,20 +1,40 @@
 import json
 import logging
 
+from django.conf import settings
+from django.core.exceptions import MultipleObjectsReturned
+
 from cc3.cyclos import backends
 from cc3.cyclos.common import TransactionException
 from cc3.rewards.transactions import cause_reward
-from cc3.rules.models import Rule
+from cc3.rules.models import ActionStatus, Rule, RuleStatus
 
+from ..profile.utils import thread_pool_map
 from .models import StadlanderProfile
 
 LOG = logging.getLogger(__name__)
 
+PAY_STADLANDER_ACTION_CLASS = u'icare4u_front.stadlander.actions.PayStadlander'
+
 
 def jsonify(*args, **kwargs):
     return json.dumps((args, kwargs))  # Tuples are faster to create
 
 
+def _rel_number(persoonsnummer):
+    try:
+        return int(persoonsnummer)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rule_id(kwargs):
+    try:
+        return int(kwargs['rule_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
 class PayStadlander(object):
 
     @staticmethod
@@ -30,62 +50,187 @@ class PayStadlander(object):
                 profile__user__is_active=True
             )
         except StadlanderProfile.DoesNotExist:
-            LOG.error(
-                u'PayStadlander failed. '
-                u'Persoonsnummer {0} does not have a StadlanderProfile.'.format(
-                    kwargs['persoonsnummer']))
-            kwargs['payment'] = \
-                u'PayStadlander action failed, Persoonsnummer {0} does not ' \
-                u'have a StadlanderProfile.'.format(kwargs['persoonsnummer'])
-            kwargs['cause_payment'] = \
-                u'PayStadlander actionfailed, Persoonsnummer {0} does not ' \
-                u'have a StadlanderProfile.'.format(kwargs['persoonsnummer'])
+            PayStadlander._no_profile(kwargs)
         except Exception, e:
-            LOG.error(e)
-            kwargs['payment'] = \
-                u'PayStadlander action failed, Unexpected error {0}.'.format(e)
-            kwargs['cause_payment'] = \
-                u'PayStadlander action failed, Unexpected error {0}.'.format(e)
+            PayStadlander._unexpected_error(kwargs, e)
 
         if sso_profile:
-            description = kwargs.get('description', None)
-            if not description:
+            rule = None
+            if not kwargs.get('description', None):
                 rule = Rule.objects.get(pk=kwargs['rule_id'])
-                description = u"{0} ({1})".format(rule.description, rule.name)
-
-            transaction = None
-            amount = int(kwargs['amount'])
-            receiver_user = sso_profile.profile.user
-            receiver = receiver_user.username
-            try:
-                transaction = backends.user_payment(
-                    kwargs['sender'], receiver, amount, description)
-
-                kwargs['payment'] = u'success'
-            except TransactionException as e:
-                LOG.warning(u'Unable to perform the stadlander reward '
-                            u'transaction: {0}'.format(e))
-                kwargs['payment'] = u'failed {0}'.format(e)
-
-            try:
-                if transaction:
-                    cause_reward(amount, receiver_user, transaction.transfer_id)
-                    kwargs['cause_payment'] = u'success'
-                else:
-                    LOG.error(
-                        u'Donation in action PayStadlander failed. '
-                        u'Stadlander Reward payment failed.'.format(
-                            receiver_user))
-                    kwargs['cause_payment'] = \
-                        u'failed, User {0} Stadlander Reward payment ' \
-                        u'failed.'.format(receiver_user)
-            except Exception, e:
+            PayStadlander._pay(kwargs, sso_profile, rule)
+
+        return jsonify(args, kwargs)
+
+    @staticmethod
+    def perform_batch(actions, workers=None):
+        """
+        Performs the action for each of ``actions``, the keyword arguments
+        of ``perform`` calls, for example all the pending actions of a rules
+        run.
+
+        The Stadlander profiles and the rules of all the actions are fetched
+        with one query each, and the payments and cause rewards are spread
+        over at most ``workers`` threads (``STADLANDER_PAYMENT_WORKERS`` by
+        default).
+
+        :return: The results of the actions, in the order of ``actions``,
+        as ``perform`` returns them.
+        """
+        actions = [dict(kwargs) for kwargs in actions]
+        if workers is None:
+            workers = getattr(settings, 'STADLANDER_PAYMENT_WORKERS', 4)
+
+        sso_profiles = {}
+        duplicates = set()
+        for sso_profile in StadlanderProfile.objects.filter(
+                rel_number__in=set(
+                    _rel_number(kwargs['persoonsnummer'])
+                    for kwargs in actions),
+                profile__user__is_active=True
+        ).select_related('profile__user'):
+            if sso_profile.rel_number in sso_profiles:
+                duplicates.add(sso_profile.rel_number)
+            sso_profiles[sso_profile.rel_number] = sso_profile
+
+        rules = Rule.objects.in_bulk(set(
+            _rule_id(kwargs) for kwargs in actions
+            if not kwargs.get('description', None)) - set([None]))
+
+        def _perform(kwargs):
+            LOG.info(u"Action PayStadlander perform called with {0} ".format(
+                jsonify((), kwargs)))
+
+            rel_number = _rel_number(kwargs['persoonsnummer'])
+            rule_id = _rule_id(kwargs)
+            if rel_number in duplicates:
+                PayStadlander._unexpected_error(
+                    kwargs, MultipleObjectsReturned(
+                        u'More than one StadlanderProfile for persoonsnummer '
+                        u'{0}'.format(kwargs['persoonsnummer'])))
+            elif rel_number not in sso_profiles:
+                PayStadlander._no_profile(kwargs)
+            elif kwargs.get('description', None):
+                PayStadlander._pay(kwargs, sso_profiles[rel_number], None)
+            elif rule_id not in rules:
+                PayStadlander._unexpected_error(kwargs, Rule.DoesNotExist(
+                    u'Rule {0} does not exist'.format(
+                        kwargs.get('rule_id'))))
+            else:
+                PayStadlander._pay(
+                    kwargs, sso_profiles[rel_number], rules[rule_id])
+
+            return jsonify((), kwargs)
+
+        return thread_pool_map(_perform, actions, workers)
+
+    @staticmethod
+    def _no_profile(kwargs):
+        LOG.error(
+            u'PayStadlander failed. '
+            u'Persoonsnummer {0} does not have a StadlanderProfile.'.format(
+                kwargs['persoonsnummer']))
+        kwargs['payment'] = \
+            u'PayStadlander action failed, Persoonsnummer {0} does not ' \
+            u'have a StadlanderProfile.'.format(kwargs['persoonsnummer'])
+        kwargs['cause_payment'] = \
+            u'PayStadlander actionfailed, Persoonsnummer {0} does not ' \
+            u'have a StadlanderProfile.'.format(kwargs['persoonsnummer'])
+
+    @staticmethod
+    def _unexpected_error(kwargs, e):
+        LOG.error(e)
+        kwargs['payment'] = \
+            u'PayStadlander action failed, Unexpected error {0}.'.format(e)
+        kwargs['cause_payment'] = \
+            u'PayStadlander action failed, Unexpected error {0}.'.format(e)
+
+    @staticmethod
+    def _pay(kwargs, sso_profile, rule):
+        """
+        Pays the reward of an action to the user of ``sso_profile``, and the
+        donation to their good cause, and stores the outcome in ``kwargs``.
+
+        :param rule: The ``Rule`` whose description is used if ``kwargs`` has
+        none.
+        """
+        description = kwargs.get('description', None)
+        if not description:
+            description = u"{0} ({1})".format(rule.description, rule.name)
+
+        transaction = None
+        amount = int(kwargs['amount'])
+        receiver_user = sso_profile.profile.user
+        receiver = receiver_user.username
+        try:
+            transaction = backends.user_payment(
+                kwargs['sender'], receiver, amount, description)
+
+            kwargs['payment'] = u'success'
+        except TransactionException as e:
+            LOG.warning(u'Unable to perform the stadlander reward '
+                        u'transaction: {0}'.format(e))
+            kwargs['payment'] = u'failed {0}'.format(e)
+
+        try:
+            if transaction:
+                cause_reward(amount, receiver_user, transaction.transfer_id)
+                kwargs['cause_payment'] = u'success'
+            else:
                 LOG.error(
                     u'Donation in action PayStadlander failed. '
-                    u'User {0} is not committed with any cause.'.format(
-                        sso_profile.profile.user.pk))
+                    u'Stadlander Reward payment failed.'.format(
+                        receiver_user))
                 kwargs['cause_payment'] = \
-                    u'failed, User {0} is not committed with any ' \
-                    u'cause.'.format(receiver_user)
+                    u'failed, User {0} Stadlander Reward payment ' \
+                    u'failed.'.format(receiver_user)
+        except Exception, e:
+            LOG.error(
+                u'Donation in action PayStadlander failed. '
+                u'User {0} is not committed with any cause.'.format(
+                    sso_profile.profile.user.pk))
+            kwargs['cause_payment'] = \
+                u'failed, User {0} is not committed with any ' \
+                u'cause.'.format(receiver_user)
 
-        return jsonify(args, kwargs)
+
+def perform_run_actions(run, workers=None):
+    """
+    Performs the pending PayStadlander actions of a ``FileTypeSetRun`` with
+    ``PayStadlander.perform_batch``, and records the result of each in an
+    ``ActionStatus`` of its ``RuleStatus``.
+
+    An action is pending when the rule passed (the result of the run names a
+    ``RuleStatus``) and its ``RuleStatus`` has no ``ActionStatus`` yet, so
+    running this again for the same run performs no action twice.
+
+    :return: The number of performed actions.
+    """
+    identities = dict(
+        (result['result'], result['identity'])
+        for rule_results_item in json.loads(run.rule_results)
+        for result in rule_results_item if result['result'])
+
+    rule_statuses = list(RuleStatus.objects.filter(
+        pk__in=identities.keys(),
+        rule__action_class=PAY_STADLANDER_ACTION_CLASS).exclude(
+        pk__in=ActionStatus.objects.values('rule_status_id')).select_related(
+        'rule').order_by('pk'))
+
+    actions = []
+    for rule_status in rule_statuses:
+        rule = rule_status.rule
+        kwargs = dict(zip(rule.parameter_names.split(','),
+                          rule.parameter_values.split(',')))
+        kwargs[rule.instance_identifier] = identities[rule_status.pk]
+        # hand over rule id, so that any rule field(s) can be used in
+        # payment description
+        kwargs['rule_id'] = rule.pk
+        actions.append(kwargs)
+
+    results = PayStadlander.perform_batch(actions, workers)
+    ActionStatus.objects.bulk_create([
+        ActionStatus(rule_status=rule_status, performed=result)
+        for rule_status, result in zip(rule_statuses, results)])
+
+    return len(results)
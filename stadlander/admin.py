@@ -2,7 +2,9 @@ from django.contrib import admin
 
 from adminsortable.admin import SortableAdmin
 
-from .models import StadlanderProfile, CommunityWoonplaat, RewardCategory
+from .models import (
+    StadlanderProfile, StadlanderStatusUpdate, CommunityWoonplaat,
+    RewardCategory)
 
 
 class CommunityWoonplaatAdmin(admin.ModelAdmin):
@@ -14,6 +16,14 @@ class RewardCategoryAdmin(SortableAdmin):
     list_editable = ('reward_first_ad', 'active')
 
 
+class StadlanderStatusUpdateAdmin(admin.ModelAdmin):
+    list_display = ('rel_number', 'active', 'pending', 'queued', 'attempts',
+                    'next_attempt', 'delivered')
+    list_filter = ('pending', 'active')
+    search_fields = ('rel_number',)
+
+
 admin.site.register(StadlanderProfile)
+admin.site.register(StadlanderStatusUpdate, StadlanderStatusUpdateAdmin)
 admin.site.register(CommunityWoonplaat, CommunityWoonplaatAdmin)
 admin.site.register(RewardCategory, RewardCategoryAdmin)
@@ -5,21 +5,46 @@ from string import ascii_letters, digits
 from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.core.exceptions import MultipleObjectsReturned
+from django.db.transaction import atomic
 from django import forms
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext as _
 from django.utils import timezone
 
 from cc3.cyclos import backends
-from cc3.cyclos.models import User, CyclosGroupSet
+from cc3.cyclos.models import User
 
-from .models import StadlanderProfile, CommunityWoonplaat, PotentialLinkFound
+from .models import StadlanderProfile, PotentialLinkFound
+from .references import get_stadlander_groupset, get_woonplaat_community
 from .utils import check_papi_key
 from ..profile.models import UserProfile, IndividualProfile, GENDER_CHOICES
+from ..profile.utils import generate_username, squeeze_email
 
 LOG = logging.getLogger(__name__)
 
 
+def set_changed_fields(instance, values):
+    """
+    Sets the fields of ``instance`` whose value differs from the one in
+    ``values``, compared as the field would store them.
+
+    :return: The names of the fields set.
+    """
+    changed = []
+    for name, value in values.items():
+        field = instance._meta.get_field(name)
+        if field.is_relation:
+            current = getattr(instance, field.attname)
+            new = value.pk if value is not None else None
+        else:
+            current = field.to_python(getattr(instance, name))
+            new = field.to_python(value)
+        if current != new:
+            setattr(instance, name, value)
+            changed.append(name)
+    return changed
+
+
 class StadlanderSSOBackend(ModelBackend):
 
     def authenticate(self, token=None):
@@ -38,13 +63,33 @@ class StadlanderSSOBackend(ModelBackend):
                 raise forms.ValidationError(_(u"Your Stadlander session may have timed out"))
 
     def get_user_from_sso_items(self, items):
+        user, user_profile, created = self.update_user_from_sso_items(items)
+
+        # Cyclos payments cannot be rolled back, so the reward is only paid
+        # once the new Stadlander profile is committed.
+        if created:
+            user_profile.pay_stadlander_reward()
+
+        return user
+
+    @atomic
+    def update_user_from_sso_items(self, items):
+        """
+        Finds or creates the user, profiles and Stadlander profile of the SSO
+        info, and brings them up to date.
+
+        :return: Tuple of the ``User``, its ``UserProfile`` and whether the
+        ``StadlanderProfile`` was created.
+        """
         # validation checks
         # must be single profile (identified by rel_number) matching user (by email)
         # find user, user_profile, individual_profile and stadlander_profile for rel_number and email
 
         # existing stadlander profile?
         try:
-            stadlander_profile = StadlanderProfile.objects.get(
+            stadlander_profile = StadlanderProfile.objects.select_related(
+                'profile__user', 'profile__individual_profile',
+            ).get(
                 rel_number=items['rel_number'],
             )
         except StadlanderProfile.DoesNotExist:
@@ -56,26 +101,23 @@ class StadlanderSSOBackend(ModelBackend):
 
         # stadlander profile exists
         if stadlander_profile:
+            user = stadlander_profile.profile.user
             # rel_number same email as we have already?
-            if stadlander_profile.profile.user.email.lower() != items['mail'].lower():
+            if user.email.lower() != items['mail'].lower():
                 # Check if this emailadres is already used, as we can't update the email to an existing address
-                if User.objects.filter(email=items['mail']):
+                if User.objects.filter(email=items['mail']).exists():
                     LOG.info(u"Stadlander authentication failed because email "
                         u"address on Django side ({0}) doesn't match SL side "
-                        u"item {1}".format(
-                            stadlander_profile.profile.user.email,
-                            items['mail']))
+                        u"item {1}".format(user.email, items['mail']))
                     raise forms.ValidationError(
                     _(u"You are not able to log into the Samen-Doen "
                       "site because your e-mailadres isn't unique"))
 
                 # update users email address
-                user = stadlander_profile.profile.user
                 user.email = items['mail']
-                user.save()
-
-#                raise forms.ValidationError(
-#                    _(u"Sorry, your account details do not match those we have on file"))
+                user_changed = ['email']
+            else:
+                user_changed = []
         else:
             # Check if this email adress is already used,
             # if exactly one matching User found, and that User does not already
@@ -95,22 +137,19 @@ class StadlanderSSOBackend(ModelBackend):
                     _(u"You are not able to log into the Samen-Doen "
                       "site because your e-mailadres isn't unique"))
 
-        # existing user with email supplied for stadlander profile?
-        try:
-            user = User.objects.get(email=items['mail'])
-            # is it the same user as that of the profile?
-            if stadlander_profile and stadlander_profile.profile.user != user:
-                raise forms.ValidationError(
-                    _(u"Sorry, your account details do not match those we have on file"))
-
-            # update user from SSO info - NB duplicates CC3Profile first_name and last_name fields
-            user.first_name = items['initials']
-            user.last_name = items['last_name']
-            user.save()
-
-        except User.DoesNotExist:
-            # create the user if none exists with the email address supplied for the profile
+            # create the user, none exists with the email address supplied for the profile
             user, created = self.get_or_create_user_from_email(items['mail'])
+            user_changed = []
+
+        # update user from SSO info - NB duplicates CC3Profile first_name and last_name fields
+        # and activate Stadlander user #1775
+        user_changed += set_changed_fields(user, {
+            'first_name': items['initials'],
+            'last_name': items['last_name'],
+            'is_active': True,
+        })
+        if user_changed:
+            user.save()
 
         # user cannot be None now, stadlander_profile can be -
         # so prepare data, and create get/create user_profile with user
@@ -128,112 +167,90 @@ class StadlanderSSOBackend(ModelBackend):
             date_of_birth = None
 
         # get the community from the 'residence' field
-        community_woonplaat = CommunityWoonplaat.objects.get(woonplaat__iexact=items['residence'])
-
-        # check for StadlanderProfile with rel_number, if does not exist, then create, and set t&c to false
-        cc3_community = community_woonplaat.community
-        groupset = CyclosGroupSet.objects.get(pk=settings.STADLANDER_GROUPSET_ID)
+        cc3_community = get_woonplaat_community(items['residence'])
+
+        profile_data = {
+            'first_name': items['initials'],
+            'last_name': items['last_name'],
+            'address': items['street'],
+            'postal_code': items['zip_code'],
+            'city': items['residence'],
+            'num_street': items['number'],
+            'extra_address': items['addition'],
+            'tussenvoegsel': items['insert'],
+            'gender': gender,
+            'date_of_birth': date_of_birth,
+        }
 
-        if not user.is_active:
-            # activate Stadlander user #1775
-            user.is_active = True
-            user.save()
-
-        user_profile, user_profile_created = UserProfile.objects.get_or_create(
-            user=user,
-            defaults={
+        if stadlander_profile:
+            user_profile = stadlander_profile.profile
+            user_profile_created = False
+        else:
+            # check for StadlanderProfile with rel_number, if does not exist, then create, and set t&c to false
+            defaults = dict(profile_data, **{
                 'terms_and_conditions': False,
                 'community': cc3_community,
                 'country': cc3_community.country,
-                'groupset': groupset,
-                'first_name': items['initials'],
-                'last_name': items['last_name'],
-                'address': items['street'],
-                'postal_code': items['zip_code'],
-                'city': items['residence'],
-                'num_street': items['number'],
-                'extra_address': items['addition'],
-                'tussenvoegsel': items['insert'],
-                'gender': gender,
-                'date_of_birth': date_of_birth,
+                'groupset': get_stadlander_groupset(),
                 # individuals not visible by default on marketplace
                 'is_visible': False
-            }
-        )
+            })
+            user_profile, user_profile_created = UserProfile.objects.get_or_create(
+                user=user, defaults=defaults)
 
-        # make sure community is up to date
         if not user_profile_created:
-            # update the community if not a new profile
-            user_profile.community = cc3_community
-            user_profile.first_name = items['initials']
-            user_profile.last_name = items['last_name']
-
-            user_profile.address = items['street']
-            user_profile.postal_code = items['zip_code']
-            user_profile.city = items['residence']
-            user_profile.extra_address = items['addition']
-            user_profile.num_street = items['number']
-            user_profile.tussenvoegsel = items['insert']
-            user_profile.gender = gender
-            user_profile.date_of_birth = date_of_birth
-            user_profile.business_name = user_profile.name
-            user_profile.slug = slugify(user_profile.business_name)
-            user_profile.save()
-
-            LOG.info("Stadlander authentication backend updated ({0}) user".format(user.id))
+            # make sure community and details are up to date
+            profile_changed = set_changed_fields(user_profile, dict(
+                profile_data, community=cc3_community))
         else:
-            user_profile.business_name = user_profile.name
-            user_profile.slug = slugify(user_profile.business_name)
+            profile_changed = []
+        profile_changed += set_changed_fields(user_profile, {
+            'business_name': user_profile.name,
+        })
+        profile_changed += set_changed_fields(user_profile, {
+            'slug': slugify(user_profile.business_name),
+        })
+
+        if user_profile_created or profile_changed:
             user_profile.save()
-            LOG.info("Stadlander authentication backend created ({0}) user".format(user.id))
+            LOG.info("Stadlander authentication backend {0} ({1}) user".format(
+                'created' if user_profile_created else 'updated', user.id))
 
-        individual_profile, individual_profile_created = IndividualProfile.objects.get_or_create(
-            profile=user_profile)#, defaults={'date_of_birth': date_of_birth}
-#        )
-
-        # update profile details if not created
-#        if not individual_profile_created:
-#            individual_profile.date_of_birth = date_of_birth
+        try:
+            individual_profile = user_profile.individual_profile
+            individual_profile_created = False
+        except IndividualProfile.DoesNotExist:
+            individual_profile, individual_profile_created = IndividualProfile.objects.get_or_create(
+                profile=user_profile)
+        individual_profile.profile = user_profile
 
         # create cyclos account with additional save to profile
-        individual_profile.save()
+        if user_profile_created or profile_changed or individual_profile_created:
+            individual_profile.save()
 
         if not stadlander_profile:
             individual_profile.set_good_cause()
 
             user_profile.create_new_stadlander_profile(
-                rel_number=items['rel_number'])
+                rel_number=items['rel_number'], reward=False)
 
-        return user
+        return user, user_profile, not stadlander_profile
 
     def get_or_create_user_from_email(self, email):
         """
 
         :rtype : User or None
         """
-        from cc3.accounts.utils import get_non_obvious_number
-
         try:
             return User.objects.get(email=email), False
         except User.DoesNotExist:
             # max length of username on cyclos side is 30 chars
             # user won't ever know their generated username
-            username = slugify("%s" % email)[:30]
-            username = "".join([ch for ch in username if ch in (ascii_letters + digits)])
+            username = generate_username(squeeze_email(email))
 
             # generate hideous password
             password = ''.join(random.choice(ascii_letters + digits) for x in range(16))
 
-            # check username doesn't already exist (on django side)
-            test_username = username.ljust(4, '0')
-            while True:
-                list_of_members_with_username = User.objects.filter(username=test_username)
-                if len(list_of_members_with_username) == 0:
-                    break
-                test_username = "%s%s" % (username, get_non_obvious_number(number_digits=4))
-
-            username = test_username
-
             return User.objects.create_user(username, email, password), True
 
     def get_user(self, user_id):
@@ -0,0 +1,28 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cc3.files.models import FileTypeSetRun
+
+from ...actions import perform_run_actions
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Perform the pending PayStadlander actions of a rules run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('run_id', type=int)
+        parser.add_argument('--workers', type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            run = FileTypeSetRun.objects.get(pk=options['run_id'])
+        except FileTypeSetRun.DoesNotExist:
+            raise CommandError(u'Rules run {0} does not exist'.format(
+                options['run_id']))
+
+        count = perform_run_actions(run, options['workers'])
+        LOG.info(u'PayStadlander actions of rules run {0}: {1} '
+                 u'performed'.format(run.pk, count))
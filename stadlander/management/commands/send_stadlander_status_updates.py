@@ -0,0 +1,16 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ...outbox import send_stadlander_status_updates
+
+LOG = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Send the pending Stadlander tenant status updates to Tobias'
+
+    def handle(self, *args, **options):
+        delivered, failed = send_stadlander_status_updates()
+        LOG.info(u'Stadlander status updates: {0} delivered, {1} failed'.format(
+            delivered, failed))
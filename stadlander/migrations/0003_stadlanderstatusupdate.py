@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stadlander', '0002_auto_20160616_1053'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StadlanderStatusUpdate',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('rel_number', models.IntegerField(unique=True)),
+                ('active', models.BooleanField(default=True)),
+                ('pending', models.BooleanField(default=True)),
+                ('queued', models.DateTimeField(help_text='When the status last changed')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField()),
+                ('delivered', models.DateTimeField(null=True, blank=True)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='stadlanderstatusupdate',
+            index_together=set([('pending', 'next_attempt')]),
+        ),
+    ]
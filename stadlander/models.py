@@ -1,31 +1,27 @@
 # -*- coding: utf-8 -*-
-import datetime
-import json
 import logging
 
 from adminsortable.models import Sortable
 from cc3.cyclos.models.account import account_closed_signal, CC3Profile
 
 from django.conf import settings
-from django.core.exceptions import MultipleObjectsReturned
-from django.core.mail import EmailMessage
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils.translation import get_language, ugettext_lazy as _
 
-from cc3.cyclos.models import CC3Community
-from cc3.excelexport.utils import generate_xls
+from cc3.cyclos.models import CC3Community, CyclosGroupSet
 from cc3.files.models import FileTypeSetRun
 from cc3.mail.utils import send_mail_to
 from cc3.mail.models import MAIL_TYPE_NEW_STADLANDER_REGISTRATION
 from cc3.marketplace.models import Ad
-from cc3.rules.models import RuleStatus, ActionStatus
 
-
-from icare4u_front.csvimporttemp.models import Huurcontract
-from icare4u_front.profile.models import UserProfile
-from icare4u_front.stadlander.utils import update_stadlander_status
+from icare4u_front.profile.models import (
+    UserProfile, clear_user_profile_gates, clear_user_profile_types,
+    snapshot_search_document_owner, update_user_profile_search_document)
+from icare4u_front.stadlander.outbox import queue_stadlander_status
+from icare4u_front.stadlander.references import clear_reference_cache
+from icare4u_front.stadlander.reports import send_rule_results_report
 
 LOG = logging.getLogger(__name__)
 
@@ -64,6 +60,29 @@ class StadlanderProfile(models.Model):
             context=context)
 
 
+class StadlanderStatusUpdate(models.Model):
+    """
+    Active status of a Stadlander tenant to be delivered to Tobias, see
+    ``icare4u_front.stadlander.outbox``. There is one per ``rel_number``,
+    holding the latest status.
+    """
+    rel_number = models.IntegerField(unique=True)
+    active = models.BooleanField(default=True)
+    pending = models.BooleanField(default=True)
+    queued = models.DateTimeField(
+        help_text=_(u'When the status last changed'))
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField()
+    delivered = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        index_together = ('pending', 'next_attempt')
+
+    def __unicode__(self):
+        return u"{0} ({1})".format(self.rel_number, self.active)
+
+
 class CommunityWoonplaat(models.Model):
     """
     Model used for mapping incoming stad/woonplaats SSO data about a user to a
@@ -80,6 +99,14 @@ class CommunityWoonplaat(models.Model):
         ordering = ['community', 'woonplaat']
 
 
+for _model in (CommunityWoonplaat, CC3Community, CyclosGroupSet):
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            clear_reference_cache, sender=_model,
+            dispatch_uid='icare4u_clear_stadlander_references_{0}'.format(
+                _model.__name__))
+
+
 class RewardCategory(Sortable):
     """
     Categories available for Stadlander tenents to base their reward payments
@@ -123,86 +150,7 @@ def process_file_process(sender, instance, created, **kwargs):
 
 def send_rule_results_via_email(instance):
     # generate report based on filetypesetrun and email
-    headers = ['persoonsnummer', 'contractnummer', 'qoinware_username',
-               'rule_name', 'reward', 'action_result']
-    data = []
-
-    rule_results_list = json.loads(instance.rule_results)
-    for rule_results_item in rule_results_list:
-        for rule_results_dict in rule_results_item:
-            rule_status_list = []
-            reward = 0
-            persoonsnummer = rule_results_dict['identity']
-            contractnummer = None
-            try:
-                stadlander_profile = StadlanderProfile.objects.get(
-                    rel_number=persoonsnummer)
-                stadlander_profile_username = stadlander_profile.profile.user.username
-            except StadlanderProfile.DoesNotExist:
-                stadlander_profile = None
-                stadlander_profile_username = None
-            except MultipleObjectsReturned:
-                stadlander_profile = None
-                stadlander_profile_username = "**--Multiple--**"
-
-            if rule_results_dict['result']:
-                rule_status = RuleStatus.objects.get(
-                    pk=rule_results_dict['result'])
-                rule = rule_status.rule
-
-                if rule_status.content_type.model_class() == Huurcontract:
-                    huurcontract = Huurcontract.objects.get(
-                        pk=rule_status.object_id)
-                    contractnummer = huurcontract.contractnummer
-                # most hideous of hideous hacks. VERY SPECIFIC
-                if len(rule.parameter_values.split(',')) > 1:
-                    reward = rule.parameter_values.split(',')[1]
-                try:
-                    action_status = ActionStatus.objects.filter(
-                        rule_status=rule_status
-                    )[0].performed
-                except Exception, e:
-                    LOG.error(e)
-                    action_status = ""
-
-                rule_status_list += [
-                    persoonsnummer, contractnummer,
-                    stadlander_profile_username, rule.name,
-                    reward, action_status]
-            else:
-                rule_status_list += [
-                    persoonsnummer, contractnummer,
-                    stadlander_profile_username, None,
-                    reward, None]
-
-            data.append(rule_status_list)
-    LOG.debug(data)
-
-    # add headers as the generate_xls function doesnt' do this...
-    # TODO fix headers in generate_xls
-    data.insert(0, headers)
-    attachment = generate_xls(data, headers, 'UTF-8')
-    attachment_filename = 'Report{0}.xls'.format(
-        datetime.datetime.today().date()
-    )
-    email_addresses = instance.filetypeset.email_addresses.strip()
-    if email_addresses:
-        email_address_list = [x.strip() for x in email_addresses.split(',')]
-
-        msg = EmailMessage(
-            u'Rules report {0}'.format(datetime.datetime.today().date()),
-            u'',
-            settings.DEFAULT_FROM_EMAIL,
-            email_address_list
-        )
-
-        msg.attach(attachment_filename, attachment.getvalue(),
-                   'application/ms-excel')
-        msg.send()
-
-    # keep a file-based record of the report in case of email issues
-    with open(settings.LOG_DIR.child(attachment_filename), "w") as xls_file:
-        xls_file.write(attachment.getvalue())
+    send_rule_results_report(instance)
 
 
 class PotentialLinkFound(Exception):
@@ -222,13 +170,27 @@ def email_stadlander_on_creation(sender, instance, created, **kwargs):
         instance.send_signup_notifications()
         LOG.info("email_stadlander_on_creation DONE (%s)" % instance.pk)
         try:
-            rel_number_str = "%s" % instance.rel_number
-            LOG.info("update_stadlander_status (%s)" % rel_number_str)
-            update_stadlander_status(rel_number_str, 'True')
+            LOG.info("queue_stadlander_status (%s)" % instance.rel_number)
+            queue_stadlander_status(instance.rel_number, True)
         except Exception, e:
             LOG.error(e.message)
 
 
+for _signal in (post_save, post_delete):
+    _signal.connect(
+        clear_user_profile_types, sender=StadlanderProfile,
+        dispatch_uid='icare4u_clear_user_profile_types_StadlanderProfile')
+    _signal.connect(
+        clear_user_profile_gates, sender=StadlanderProfile,
+        dispatch_uid='icare4u_clear_user_profile_gates_StadlanderProfile')
+    _signal.connect(
+        update_user_profile_search_document, sender=StadlanderProfile,
+        dispatch_uid='icare4u_user_search_document_StadlanderProfile')
+pre_save.connect(
+    snapshot_search_document_owner, sender=StadlanderProfile,
+    dispatch_uid='icare4u_search_document_owner_StadlanderProfile')
+
+
 @receiver(account_closed_signal, sender=CC3Profile)
 def handle_account_closed_signal(sender, instance, **kwargs):
     rel_number = None
@@ -238,7 +200,7 @@ def handle_account_closed_signal(sender, instance, **kwargs):
         stadlander_profile = StadlanderProfile.objects.get(
             profile_id=instance.pk)
         rel_number = stadlander_profile.rel_number
-        update_stadlander_status("%s" % rel_number, 'False')
+        queue_stadlander_status(rel_number, False)
     except Exception, e:
         LOG.error("handle_account_closed_signal {0} exception {1}{2}".format(
             rel_number, e.args, e.message))
@@ -0,0 +1,111 @@
+"""
+Outbox of the active status changes of Stadlander tenants, for Tobias.
+
+Requests only store the status a tenant should have in Tobias, in one
+``StadlanderStatusUpdate`` per ``rel_number``, and the
+``send_stadlander_status_updates`` command delivers the pending ones. A
+failed delivery is retried later, waiting twice as long after every failure,
+until ``STADLANDER_TOBIAS_MAX_ATTEMPTS`` deliveries failed. The update is
+then no longer pending, and is left undelivered with its ``last_error`` for
+the admin.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+LOG = logging.getLogger(__name__)
+
+
+def queue_stadlander_status(rel_number, active):
+    """
+    Queues the active status of a tenant for Tobias. Queueing the status
+    already pending or delivered for ``rel_number`` does nothing, queueing a
+    status which failed tries it again.
+    """
+    from .models import StadlanderStatusUpdate
+
+    now = timezone.now()
+    update, created = StadlanderStatusUpdate.objects.get_or_create(
+        rel_number=rel_number, defaults={
+            'active': active, 'queued': now, 'next_attempt': now})
+    if created or (update.active == active and (
+            update.pending or update.delivered is not None)):
+        return update
+
+    update.active = active
+    update.pending = True
+    update.queued = now
+    update.attempts = 0
+    update.next_attempt = now
+    update.delivered = None
+    update.last_error = u''
+    update.save()
+    return update
+
+
+def retry_delay(attempts):
+    """
+    Returns how long to wait before the next delivery after ``attempts``
+    failed ones.
+    """
+    delay = getattr(settings, 'STADLANDER_TOBIAS_RETRY_DELAY', 60)
+    max_delay = getattr(settings, 'STADLANDER_TOBIAS_MAX_RETRY_DELAY', 86400)
+    return timedelta(seconds=min(delay * 2 ** (attempts - 1), max_delay))
+
+
+def send_stadlander_status_updates(client=None, batch_size=None):
+    """
+    Delivers the pending status updates which are due, oldest first, with one
+    ``TobiasClient``. An update which fails is recorded and the others are
+    still delivered.
+
+    :param client: ``TobiasClient`` to deliver the updates with.
+    :param batch_size: Maximum number of updates delivered.
+    :return: Tuple of the number of delivered and failed updates.
+    """
+    from .models import StadlanderStatusUpdate
+    from .utils import TobiasClient
+
+    batch_size = batch_size or getattr(
+        settings, 'STADLANDER_TOBIAS_BATCH_SIZE', 500)
+    max_attempts = getattr(settings, 'STADLANDER_TOBIAS_MAX_ATTEMPTS', 10)
+    updates = list(StadlanderStatusUpdate.objects.filter(
+        pending=True, next_attempt__lte=timezone.now()
+    ).order_by('next_attempt', 'pk')[:batch_size])
+    if not updates:
+        return 0, 0
+
+    delivered = failed = 0
+    own_client = client is None
+    if own_client:
+        client = TobiasClient()
+    try:
+        for update in updates:
+            try:
+                client.update_status(
+                    u'{0}'.format(update.rel_number),
+                    'True' if update.active else 'False')
+            except Exception, e:
+                LOG.exception(
+                    u'Stadlander status update {0} failed: {1}'.format(
+                        update.rel_number, e))
+                attempts = update.attempts + 1
+                StadlanderStatusUpdate.objects.filter(
+                    pk=update.pk, queued=update.queued).update(
+                    attempts=attempts, pending=attempts < max_attempts,
+                    last_error=u'{0}'.format(e),
+                    next_attempt=timezone.now() + retry_delay(attempts))
+                failed += 1
+            else:
+                # Left pending if the status changed in the meantime.
+                StadlanderStatusUpdate.objects.filter(
+                    pk=update.pk, queued=update.queued).update(
+                    pending=False, delivered=timezone.now(), last_error=u'')
+                delivered += 1
+    finally:
+        if own_client:
+            client.close()
+
+    return delivered, failed
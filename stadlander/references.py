@@ -0,0 +1,82 @@
+"""
+In process cache of the reference data used on every Stadlander SSO login:
+the communities by residence (``CommunityWoonplaat``) and the Stadlander
+``CyclosGroupSet``.
+
+The cache of a process is cleared when the reference data is saved in it,
+and expires after ``STADLANDER_REFERENCE_CACHE_TIMEOUT`` seconds for the
+changes made in other processes.
+"""
+import time
+
+from django.conf import settings
+from django.core.exceptions import MultipleObjectsReturned
+
+_cache = {}
+
+
+def _get_cached(key, load):
+    expires, value = _cache.get(key, (0, None))
+    if expires < time.time():
+        value = load()
+        _cache[key] = (
+            time.time() + getattr(
+                settings, 'STADLANDER_REFERENCE_CACHE_TIMEOUT', 300),
+            value)
+    return value
+
+
+def clear_reference_cache(*args, **kwargs):
+    """
+    Empties the cache. Also a signal receiver.
+    """
+    _cache.clear()
+
+
+def normalize_residence(residence):
+    return u' '.join(u'{0}'.format(residence or u'').split()).lower()
+
+
+def _load_woonplaat_communities():
+    from .models import CommunityWoonplaat
+
+    communities = {}
+    for community_woonplaat in CommunityWoonplaat.objects.select_related(
+            'community'):
+        communities.setdefault(
+            normalize_residence(community_woonplaat.woonplaat), []).append(
+            community_woonplaat.community)
+    return communities
+
+
+def get_woonplaat_community(residence):
+    """
+    Returns the ``CC3Community`` of a residence received in the Stadlander
+    SSO info, ignoring case and extra whitespace.
+
+    :raises CommunityWoonplaat.DoesNotExist: If no community is set up for
+    the residence.
+    :raises MultipleObjectsReturned: If several are.
+    """
+    from .models import CommunityWoonplaat
+
+    communities = _get_cached(
+        'woonplaat_communities', _load_woonplaat_communities).get(
+        normalize_residence(residence), [])
+    if not communities:
+        raise CommunityWoonplaat.DoesNotExist(
+            u"No community for woonplaat '{0}'".format(residence))
+    if len(communities) > 1:
+        raise MultipleObjectsReturned(
+            u"Several communities for woonplaat '{0}'".format(residence))
+    return communities[0]
+
+
+def get_stadlander_groupset():
+    """
+    Returns the ``CyclosGroupSet`` of ``STADLANDER_GROUPSET_ID``.
+    """
+    from cc3.cyclos.models import CyclosGroupSet
+
+    return _get_cached('groupset', lambda: CyclosGroupSet.objects.get(
+        pk=settings.STADLANDER_GROUPSET_ID))
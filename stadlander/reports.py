@@ -0,0 +1,188 @@
+"""
+Report of the rule results of a ``FileTypeSetRun``, emailed to the
+addresses of its ``FileTypeSet`` and kept in ``LOG_DIR``.
+
+The Stadlander profiles, rule statuses, rental contracts and action statuses
+of all the results are loaded with one query each, and the rows are written
+to the spreadsheet as they are built.
+"""
+import datetime
+import json
+import logging
+import numbers
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import EmailMessage
+
+import xlwt
+
+from cc3.rules.models import RuleStatus, ActionStatus
+
+from icare4u_front.csvimporttemp.models import Huurcontract
+
+LOG = logging.getLogger(__name__)
+
+REPORT_HEADERS = ['persoonsnummer', 'contractnummer', 'qoinware_username',
+                  'rule_name', 'reward', 'action_result']
+
+# Username reported for a persoonsnummer with several Stadlander profiles.
+MULTIPLE_USERNAMES = "**--Multiple--**"
+
+# Rows of an .xls sheet, the header included.
+MAX_SHEET_ROWS = 65536
+
+# Rows written between flushes of the sheet data.
+FLUSH_ROWS = 1000
+
+
+def _rel_number(identity):
+    try:
+        return int(identity)
+    except (TypeError, ValueError):
+        return None
+
+
+def rule_result_rows(rule_results):
+    """
+    Yields the report row of every rule result.
+
+    :param rule_results: The decoded ``FileTypeSetRun.rule_results``, a list
+    of lists of ``{'identity': ..., 'result': ...}`` dictionaries.
+    """
+    from .models import StadlanderProfile
+
+    results = [rule_results_dict for rule_results_item in rule_results
+               for rule_results_dict in rule_results_item]
+
+    usernames = {}
+    for rel_number, username in StadlanderProfile.objects.filter(
+            rel_number__in=set(
+                _rel_number(result['identity']) for result in results)
+    ).values_list('rel_number', 'profile__user__username'):
+        if rel_number in usernames:
+            usernames[rel_number] = MULTIPLE_USERNAMES
+        else:
+            usernames[rel_number] = username
+
+    rule_statuses = RuleStatus.objects.select_related('rule').in_bulk(
+        set(result['result'] for result in results if result['result']))
+
+    huurcontract_type = ContentType.objects.get_for_model(Huurcontract)
+    contractnummers = dict(Huurcontract.objects.filter(pk__in=set(
+        rule_status.object_id for rule_status in rule_statuses.values()
+        if rule_status.content_type_id == huurcontract_type.pk)
+    ).values_list('pk', 'contractnummer'))
+
+    performed = {}
+    for rule_status_id, action_performed in ActionStatus.objects.filter(
+            rule_status__in=rule_statuses.keys()).values_list(
+            'rule_status_id', 'performed'):
+        performed.setdefault(rule_status_id, action_performed)
+
+    for result in results:
+        persoonsnummer = result['identity']
+        username = usernames.get(_rel_number(persoonsnummer))
+        rule_status = rule_statuses.get(result['result'])
+
+        if not rule_status:
+            if result['result']:
+                LOG.error(u'RuleStatus {0} does not exist'.format(
+                    result['result']))
+            yield [persoonsnummer, None, username, None, 0, None]
+            continue
+
+        rule = rule_status.rule
+        contractnummer = None
+        if rule_status.content_type_id == huurcontract_type.pk:
+            contractnummer = contractnummers.get(rule_status.object_id)
+
+        # most hideous of hideous hacks. VERY SPECIFIC
+        reward = 0
+        if len(rule.parameter_values.split(',')) > 1:
+            reward = rule.parameter_values.split(',')[1]
+
+        if rule_status.pk not in performed:
+            LOG.error(u'No ActionStatus for RuleStatus {0}'.format(
+                rule_status.pk))
+
+        yield [persoonsnummer, contractnummer, username, rule.name, reward,
+               performed.get(rule_status.pk, "")]
+
+
+def _cell_value(value):
+    if value is None or isinstance(value, (basestring, numbers.Number)):
+        return value
+    return u'{0}'.format(value)
+
+
+def write_xls(rows, headers, path, encoding='UTF-8'):
+    """
+    Writes ``rows`` to the .xls file ``path``, below ``headers``, starting a
+    new sheet whenever one is full.
+
+    :return: The number of rows written.
+    """
+    book = xlwt.Workbook(encoding=encoding)
+    sheets = 0
+    rowx = MAX_SHEET_ROWS
+    count = 0
+
+    def add_sheet():
+        sheet = book.add_sheet(u'Sheet {0}'.format(sheets + 1))
+        for colx, header in enumerate(headers):
+            sheet.write(0, colx, header)
+        return sheet
+
+    for row in rows:
+        if rowx == MAX_SHEET_ROWS:
+            sheet = add_sheet()
+            sheets += 1
+            rowx = 1
+
+        for colx, value in enumerate(row):
+            sheet.write(rowx, colx, _cell_value(value))
+        rowx += 1
+        count += 1
+
+        if rowx % FLUSH_ROWS == 0:
+            sheet.flush_row_data()
+
+    if not sheets:
+        add_sheet()
+
+    book.save(path)
+    return count
+
+
+def send_rule_results_report(instance):
+    """
+    Writes the report of the rule results of a ``FileTypeSetRun`` to
+    ``LOG_DIR`` and emails it to the addresses of its ``FileTypeSet``.
+
+    :return: Path of the report.
+    """
+    today = datetime.datetime.today().date()
+    attachment_filename = 'Report{0}.xls'.format(today)
+
+    # keep a file-based record of the report in case of email issues
+    path = settings.LOG_DIR.child(attachment_filename)
+    count = write_xls(
+        rule_result_rows(json.loads(instance.rule_results)), REPORT_HEADERS,
+        path)
+    LOG.info(u'Rules report {0}: {1} rows'.format(path, count))
+
+    email_addresses = instance.filetypeset.email_addresses.strip()
+    if email_addresses:
+        email_address_list = [x.strip() for x in email_addresses.split(',')]
+
+        msg = EmailMessage(
+            u'Rules report {0}'.format(today),
+            u'',
+            settings.DEFAULT_FROM_EMAIL,
+            email_address_list
+        )
+        msg.attach_file(path, 'application/ms-excel')
+        msg.send()
+
+    return path
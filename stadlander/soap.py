@@ -0,0 +1,208 @@
+"""
+Client of the Stadlander web service, which returns the tenant data of a
+PAPI key (``GetQoinData`` / ``GetPositoosData``).
+
+One ``StadlanderSoapClient`` is kept per process (see
+``get_stadlander_client``). Every thread gets its own ``requests.Session``,
+so the HTTPS connection to Stadlander is kept alive between logins instead
+of being set up again for every call. The responses are parsed once, while
+they are read, by ``iterparse``.
+"""
+import logging
+import socket
+import threading
+import time
+from xml.etree import cElementTree
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+import requests
+from requests.packages.urllib3.exceptions import HTTPError as Urllib3Error
+
+LOG = logging.getLogger(__name__)
+
+SOAP_ENVELOPE_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+
+# Operations by ``STADLANDER_WEB_SERVICE_API_CALL`` value.
+API_CALL_OPERATIONS = {
+    'getQoinData': 'GetQoinData',
+    'getPositoosData': 'GetPositoosData',
+}
+
+REQUEST_TEMPLATE = (
+    u'<?xml version="1.0" encoding="UTF-8"?>\n'
+    u'<soap:Envelope xmlns:soap="{soap_ns}" '
+    u'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+    u'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+    u'<soap:Header/>\n'
+    u'<soap:Body>\n'
+    u'<{operation} xmlns="{namespace}">\n'
+    u'<papi_key>{papi_key}</papi_key>\n'
+    u'</{operation}>\n'
+    u'</soap:Body>\n'
+    u'</soap:Envelope>'
+)
+
+
+class StadlanderSoapError(Exception):
+    """
+    The Stadlander web service could not be reached or returned a SOAP
+    fault.
+    """
+    pass
+
+
+def local_name(tag):
+    """
+    Strips the ``{namespace}`` off an ElementTree tag.
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_items(source):
+    """
+    Parses the ``<item><key/><value/></item>`` pairs of a Stadlander response
+    into a dictionary, in one pass over ``source``::
+
+        <item><key xsi:type="xsd:string">rel_number</key>
+              <value xsi:type="xsd:string">91876</value></item>
+        <item><key xsi:type="xsd:string">residence</key>
+              <value xsi:type="xsd:string">HALSTEREN</value></item>
+
+    :param source: File like object with the response body.
+    :raises StadlanderSoapError: If the response is a SOAP fault.
+    """
+    items = {}
+    fault = None
+    for _, element in cElementTree.iterparse(source):
+        name = local_name(element.tag)
+        if name == 'item':
+            values = dict(
+                (local_name(child.tag), child.text or u'')
+                for child in element)
+            items[values.get('key', u'')] = values.get('value', u'')
+            element.clear()
+        elif name in ('faultcode', 'faultstring'):
+            fault = fault or {}
+            fault[name] = element.text or u''
+        elif name == 'Fault':
+            fault = fault or {}
+
+    if fault is not None:
+        raise StadlanderSoapError(u'SoapFault {0}: {1}'.format(
+            fault.get('faultcode', u''), fault.get('faultstring', u'')))
+    return items
+
+
+class StadlanderSoapClient(object):
+    """
+    Thread safe client of the Stadlander web service.
+
+    :param url: Location, SOAP action and namespace of the web service.
+    :param timeout: Seconds to wait for the connection and for the response
+    of every call.
+    """
+    def __init__(self, url, timeout=None):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._errors = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    @property
+    def session(self):
+        """
+        The ``requests.Session`` of the current thread.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def call(self, operation, papi_key, timeout=None):
+        """
+        Calls ``operation`` for ``papi_key``.
+
+        :param timeout: Overrides the timeout of the client for this call.
+        :return: Dictionary of the items of the response.
+        :raises StadlanderSoapError: If the call failed.
+        """
+        body = REQUEST_TEMPLATE.format(
+            soap_ns=SOAP_ENVELOPE_NS, operation=operation,
+            namespace=escape(self.url, {'"': '&quot;'}),
+            papi_key=escape(u'{0}'.format(papi_key)))
+        headers = {
+            'Content-Type': 'text/xml; charset="UTF-8"',
+            'SOAPAction': '"{0}{1}"'.format(self.url, operation),
+        }
+
+        start = time.time()
+        try:
+            response = self.session.post(
+                self.url, data=body.encode('utf-8'), headers=headers,
+                timeout=timeout or self.timeout, stream=True)
+            try:
+                content_type = response.headers.get('Content-Type', '')
+                if not response.ok and 'xml' not in content_type:
+                    response.raise_for_status()
+                response.raw.decode_content = True
+                items = parse_items(response.raw)
+            finally:
+                response.close()
+        except (requests.RequestException, Urllib3Error, socket.error,
+                SyntaxError), e:
+            self._record(operation, time.time() - start, error=True)
+            raise StadlanderSoapError(u'{0}'.format(e))
+        except StadlanderSoapError:
+            self._record(operation, time.time() - start, error=True)
+            raise
+
+        self._record(operation, time.time() - start)
+        return items
+
+    def _record(self, operation, seconds, error=False):
+        with self._lock:
+            self._calls += 1
+            self._total_time += seconds
+            self._max_time = max(self._max_time, seconds)
+            if error:
+                self._errors += 1
+
+        LOG.info(u'Stadlander {0} {1} in {2:.3f}s'.format(
+            operation, 'failed' if error else 'done', seconds))
+
+    def stats(self):
+        """
+        Returns the number of calls, failed calls, and the total and maximum
+        seconds they took since the client was created.
+        """
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'errors': self._errors,
+                'total_time': self._total_time,
+                'max_time': self._max_time,
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_stadlander_client():
+    """
+    Returns the ``StadlanderSoapClient`` of the process for
+    ``STADLANDER_WEB_SERVICE_URL``.
+    """
+    global _client
+
+    url = settings.STADLANDER_WEB_SERVICE_URL
+    timeout = getattr(settings, 'STADLANDER_WEB_SERVICE_TIMEOUT', 10)
+    with _client_lock:
+        if _client is None or (_client.url, _client.timeout) != (url, timeout):
+            _client = StadlanderSoapClient(url, timeout=timeout)
+        return _client
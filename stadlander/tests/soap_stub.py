@@ -0,0 +1,99 @@
+"""
+Local stand in for the Stadlander web service, for the tests.
+"""
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from xml.sax.saxutils import escape
+
+RESPONSE_TEMPLATE = (
+    u'<?xml version="1.0" encoding="UTF-8"?>'
+    u'<SOAP-ENV:Envelope '
+    u'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+    u'xmlns:ns1="https://acceptatie.stadlander.nl/services.html" '
+    u'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+    u'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+    u'<SOAP-ENV:Body><ns1:{operation}Response><return>{items}</return>'
+    u'</ns1:{operation}Response></SOAP-ENV:Body></SOAP-ENV:Envelope>'
+)
+
+ITEM_TEMPLATE = (
+    u'<item><key xsi:type="xsd:string">{key}</key>'
+    u'<value xsi:type="xsd:string">{value}</value></item>'
+)
+
+FAULT_RESPONSE = (
+    u'<?xml version="1.0" encoding="UTF-8"?>'
+    u'<SOAP-ENV:Envelope '
+    u'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/">'
+    u'<SOAP-ENV:Body><SOAP-ENV:Fault><faultcode>SOAP-ENV:Server</faultcode>'
+    u'<faultstring>Invalid PAPI key</faultstring></SOAP-ENV:Fault>'
+    u'</SOAP-ENV:Body></SOAP-ENV:Envelope>'
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1, so the connections are kept alive.
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.getheader('Content-Length')))
+        stub.requests.append((self.headers.getheader('SOAPAction'), body))
+        stub.connections.add(self.client_address)
+
+        operation = self.headers.getheader('SOAPAction').strip('"').rsplit(
+            'services.html', 1)[-1]
+        if stub.items is None:
+            status, response = 500, FAULT_RESPONSE
+        else:
+            status, response = 200, RESPONSE_TEMPLATE.format(
+                operation=operation, items=u''.join(
+                    ITEM_TEMPLATE.format(key=escape(key), value=escape(value))
+                    for key, value in sorted(stub.items.items())))
+        response = response.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StadlanderStub(object):
+    """
+    Serves ``items`` as the response to every call, or a SOAP fault if
+    ``items`` is ``None``, on a free port of localhost::
+
+        with StadlanderStub({'rel_number': '123'}) as stub:
+            client = StadlanderSoapClient(stub.url)
+
+    The calls received are kept in ``requests``, as ``(SOAPAction, body)``
+    tuples, and the client addresses they came from in ``connections``.
+    """
+    def __init__(self, items=None):
+        self.items = items
+        self.requests = []
+        self.connections = set()
+        self.server = StubServer(('127.0.0.1', 0), StubHandler)
+        self.server.stub = self
+        self.url = 'http://127.0.0.1:{0}/services.html'.format(
+            self.server.server_address[1])
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -1,6 +1,8 @@
 import json
 import logging
 
+from mock import patch
+
 from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
 from django.utils.translation import activate
@@ -9,6 +11,7 @@ from django.conf import settings
 from icare4u_front.profile.tests.test_factories import \
     IndividualProfileFactory, UserProfileFactory
 
+from ..actions import PayStadlander
 from ..models import StadlanderProfile, CommunityWoonplaat
 from ..backends import StadlanderSSOBackend
 
@@ -107,3 +110,50 @@ class StadlanderActionsTestCase(TestCase):
 
         self.assertEqual(performed_result[0][1]['payment'], u'success')
         self.assertEqual(performed_result[0][1]['cause_payment'], u'success')
+
+    def test_pay_stadlander_perform_batch(self):
+        kwargs = {
+            'sender': 'stadlander',
+            'amount': '25',
+            'persoonsnummer': 123,
+            'rule_id': self.rule.id,
+        }
+        unknown_kwargs = dict(kwargs, persoonsnummer=456)
+
+        with self.assertNumQueries(2):
+            # Only the lookups, as the payments are mocked.
+            with patch('icare4u_front.stadlander.actions.PayStadlander._pay'):
+                PayStadlander.perform_batch(
+                    [kwargs, unknown_kwargs], workers=1)
+
+        results = [
+            json.loads(result) for result in PayStadlander.perform_batch(
+                [kwargs, unknown_kwargs], workers=1)]
+
+        self.assertEqual(results[0][0][1]['payment'], u'success')
+        self.assertEqual(results[0][0][1]['cause_payment'], u'success')
+        self.assertEqual(results[0][0][1]['persoonsnummer'], 123)
+        self.assertEqual(results[0][1], {})
+        self.assertTrue(
+            results[1][0][1]['payment'].startswith(
+                u'PayStadlander action failed'))
+
+    def test_pay_stadlander_perform_batch_bad_rule_id(self):
+        """
+        Tests an action with an invalid ``rule_id`` only fails that action.
+        """
+        kwargs = {
+            'sender': 'stadlander',
+            'amount': '25',
+            'persoonsnummer': 123,
+            'rule_id': self.rule.id,
+        }
+
+        results = [
+            json.loads(result) for result in PayStadlander.perform_batch(
+                [dict(kwargs, rule_id='x'), kwargs], workers=1)]
+
+        self.assertTrue(
+            results[0][0][1]['payment'].startswith(
+                u'PayStadlander action failed'))
+        self.assertEqual(results[1][0][1]['payment'], u'success')
@@ -6,6 +6,9 @@ from django.utils.translation import activate
 from django.conf import settings
 from django.utils.translation import ugettext as _
 
+from mock import patch
+
+from icare4u_front.profile.models import UserProfile
 from icare4u_front.profile.tests.test_factories import UserProfileFactory
 
 from ..models import StadlanderProfile, CommunityWoonplaat, PotentialLinkFound
@@ -152,3 +155,48 @@ class SSOBackendTestCase(TestCase):
             _("You are not able to log into the Samen-Doen site because your "
               "e-mailadres isn't unique"),
             self.sso_backend.get_user_from_sso_items, items)
+
+    def test_get_user_from_sso_items_unchanged(self):
+        """
+        Test a repeat login with unchanged data runs a single query and saves
+        nothing.
+        """
+        items = {'rel_number': 123, 'mail': self.user_profile.user.email,
+                 'initials': 'ABC', 'last_name': 'Example',
+                 'first_name': 'Test', 'street': 'Streetname',
+                 'zip_code': '1234AA', 'residence': 'AMSTERDAM',
+                 'addition': '', 'number': '416', 'insert': '',
+                 'gender': 'Male', 'date_of_birth': '1980-06-01'}
+        self.sso_backend.get_user_from_sso_items(items)
+
+        # The query and the savepoint of the transaction in the test.
+        with self.assertNumQueries(3):
+            user = self.sso_backend.get_user_from_sso_items(items)
+        self.assertEqual(user.pk, self.user_profile.user.pk)
+
+        items['street'] = 'Other street'
+        user = self.sso_backend.get_user_from_sso_items(items)
+        self.assertEqual(
+            UserProfile.objects.get(user=user).address, 'Other street')
+
+    @patch.object(UserProfile, 'pay_stadlander_reward')
+    def test_get_user_from_sso_items_reward_after_commit(self, pay):
+        """
+        Test the reward is paid once for a new Stadlander profile, after the
+        profile is saved, so a failing payment does not undo the login.
+        """
+        items = {'rel_number': 456, 'mail': 'foo@bar.com',
+                 'initials': 'ABC', 'last_name': 'Example',
+                 'first_name': 'Test', 'street': 'Streetname',
+                 'zip_code': '1234AA', 'residence': 'Amsterdam',
+                 'addition': '', 'number': '416', 'insert': '',
+                 'gender': 'Male', 'date_of_birth': '1980-06-01'}
+        pay.side_effect = Exception('Cyclos is down')
+        self.assertRaises(
+            Exception, self.sso_backend.get_user_from_sso_items, items)
+        self.assertTrue(
+            StadlanderProfile.objects.filter(rel_number=456).exists())
+
+        pay.side_effect = None
+        self.sso_backend.get_user_from_sso_items(items)
+        self.assertEqual(pay.call_count, 1)
@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+import requests
+
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+
+from icare4u_front.profile.tests.test_factories import UserProfileFactory
+
+from ..models import StadlanderProfile, StadlanderStatusUpdate
+from ..outbox import queue_stadlander_status, send_stadlander_status_updates
+
+
+class FakeTobiasClient(object):
+    def __init__(self, fail=False, error=None):
+        self.fail = fail
+        self.error = error
+        self.updates = []
+
+    def update_status(self, persoonsnummer, active):
+        self.updates.append((persoonsnummer, active))
+        if self.fail:
+            raise requests.ConnectionError('Tobias is down')
+        if self.error and persoonsnummer in self.error:
+            raise ValueError('Unexpected response')
+
+
+class StadlanderOutboxTestCase(TestCase):
+    """
+    Test case for the outbox of the Stadlander Tobias status updates.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+    def test_queued_on_creation(self):
+        StadlanderProfile.objects.create(
+            rel_number=123, profile=UserProfileFactory.create())
+
+        update = StadlanderStatusUpdate.objects.get(rel_number=123)
+        self.assertTrue(update.active)
+        self.assertTrue(update.pending)
+
+    def test_send(self):
+        queue_stadlander_status(123, True)
+        queue_stadlander_status(456, True)
+        queue_stadlander_status(456, False)
+
+        client = FakeTobiasClient()
+        self.assertEqual(send_stadlander_status_updates(client), (2, 0))
+        self.assertEqual(
+            sorted(client.updates), [(u'123', 'True'), (u'456', 'False')])
+        self.assertFalse(
+            StadlanderStatusUpdate.objects.filter(pending=True).exists())
+
+        # The delivered status is not sent again.
+        queue_stadlander_status(123, True)
+        self.assertEqual(send_stadlander_status_updates(client), (0, 0))
+
+    def test_retry(self):
+        queue_stadlander_status(123, True)
+
+        self.assertEqual(
+            send_stadlander_status_updates(FakeTobiasClient(fail=True)),
+            (0, 1))
+        update = StadlanderStatusUpdate.objects.get(rel_number=123)
+        self.assertTrue(update.pending)
+        self.assertEqual(update.attempts, 1)
+        self.assertGreater(update.next_attempt, timezone.now())
+
+        # Not retried before the next attempt is due.
+        client = FakeTobiasClient()
+        self.assertEqual(send_stadlander_status_updates(client), (0, 0))
+
+        StadlanderStatusUpdate.objects.update(
+            next_attempt=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_stadlander_status_updates(client), (1, 0))
+        self.assertEqual(client.updates, [(u'123', 'True')])
+
+    def test_error_continues(self):
+        queue_stadlander_status(123, True)
+        queue_stadlander_status(456, True)
+
+        client = FakeTobiasClient(error=[u'123'])
+        self.assertEqual(send_stadlander_status_updates(client), (1, 1))
+        self.assertEqual(len(client.updates), 2)
+
+        update = StadlanderStatusUpdate.objects.get(rel_number=123)
+        self.assertTrue(update.pending)
+        self.assertEqual(update.last_error, u'Unexpected response')
+        self.assertFalse(
+            StadlanderStatusUpdate.objects.get(rel_number=456).pending)
+
+    @override_settings(STADLANDER_TOBIAS_MAX_ATTEMPTS=2)
+    def test_max_attempts(self):
+        queue_stadlander_status(123, True)
+
+        client = FakeTobiasClient(fail=True)
+        for attempt in range(2):
+            StadlanderStatusUpdate.objects.update(
+                next_attempt=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(send_stadlander_status_updates(client), (0, 1))
+
+        update = StadlanderStatusUpdate.objects.get(rel_number=123)
+        self.assertFalse(update.pending)
+        self.assertIsNone(update.delivered)
+        self.assertEqual(update.attempts, 2)
+
+        # Failed updates are not retried, unless queued again.
+        StadlanderStatusUpdate.objects.update(
+            next_attempt=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_stadlander_status_updates(client), (0, 0))
+
+        queue_stadlander_status(123, True)
+        update = StadlanderStatusUpdate.objects.get(rel_number=123)
+        self.assertTrue(update.pending)
+        self.assertEqual(update.attempts, 0)
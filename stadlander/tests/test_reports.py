@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from cc3.core.utils.test_backend import DummyCyclosBackend
+from cc3.cyclos.backends import set_backend
+
+from icare4u_front.profile.tests.test_factories import UserProfileFactory
+
+from ..models import StadlanderProfile
+from ..reports import (
+    MULTIPLE_USERNAMES, REPORT_HEADERS, rule_result_rows, write_xls)
+
+
+class RuleResultsReportTestCase(TestCase):
+    """
+    Test case for the report of the rule results of a ``FileTypeSetRun``.
+    """
+    def setUp(self):
+        set_backend(DummyCyclosBackend())
+
+        self.profile = UserProfileFactory.create()
+        StadlanderProfile.objects.create(rel_number=123, profile=self.profile)
+        StadlanderProfile.objects.create(
+            rel_number=456, profile=UserProfileFactory.create())
+        StadlanderProfile.objects.create(
+            rel_number=456, profile=UserProfileFactory.create())
+
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_rule_result_rows(self):
+        rule_results = [
+            [{'identity': '123', 'result': None}],
+            [{'identity': '456', 'result': None},
+             {'identity': '789', 'result': None}],
+        ]
+
+        self.assertEqual(list(rule_result_rows(rule_results)), [
+            ['123', None, self.profile.user.username, None, 0, None],
+            ['456', None, MULTIPLE_USERNAMES, None, 0, None],
+            ['789', None, None, None, 0, None],
+        ])
+
+    def test_write_xls(self):
+        path = os.path.join(self.tmp_dir, 'Report.xls')
+        rows = ([str(number), None, None, None, 0, None]
+                for number in range(10))
+
+        self.assertEqual(write_xls(rows, REPORT_HEADERS, path), 10)
+        self.assertTrue(os.path.getsize(path))
@@ -0,0 +1,68 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from ..soap import StadlanderSoapClient, StadlanderSoapError
+from ..utils import check_papi_key
+from .soap_stub import StadlanderStub
+
+ITEMS = {
+    u'rel_number': u'91876',
+    u'initials': u'A.',
+    u'insert': u'',
+    u'last_name': u'Faas',
+    u'residence': u'HALSTEREN',
+}
+
+
+class StadlanderSoapClientTestCase(TestCase):
+    """
+    Test case for the Stadlander web service client, against a local stub.
+    """
+    def test_call(self):
+        with StadlanderStub(ITEMS) as stub:
+            client = StadlanderSoapClient(stub.url, timeout=5)
+            self.assertEqual(client.call('GetQoinData', 'abc&1'), ITEMS)
+
+        soap_action, body = stub.requests[0]
+        self.assertEqual(soap_action, '"{0}GetQoinData"'.format(stub.url))
+        self.assertIn('<papi_key>abc&amp;1</papi_key>', body)
+
+    def test_keep_alive(self):
+        """
+        Tests the calls of a thread reuse the same connection.
+        """
+        with StadlanderStub(ITEMS) as stub:
+            client = StadlanderSoapClient(stub.url, timeout=5)
+            client.call('GetQoinData', 'abc')
+            client.call('GetQoinData', 'def')
+
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(len(stub.connections), 1)
+
+    def test_fault(self):
+        with StadlanderStub(None) as stub:
+            client = StadlanderSoapClient(stub.url, timeout=5)
+            self.assertRaises(
+                StadlanderSoapError, client.call, 'GetQoinData', 'abc')
+
+        stats = client.stats()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['errors'], 1)
+
+    def test_check_papi_key(self):
+        with StadlanderStub(ITEMS) as stub:
+            with override_settings(
+                    STADLANDER_WEB_SERVICE_URL=stub.url,
+                    STADLANDER_WEB_SERVICE_API_CALL='getPositoosData'):
+                self.assertEqual(check_papi_key('abc'), ITEMS)
+
+            with override_settings(
+                    STADLANDER_WEB_SERVICE_URL=stub.url,
+                    STADLANDER_WEB_SERVICE_API_CALL='getQoinData'):
+                stub.items = None
+                self.assertIsNone(check_papi_key('abc'))
+
+        self.assertEqual(
+            [soap_action for soap_action, _ in stub.requests],
+            ['"{0}GetPositoosData"'.format(stub.url),
+             '"{0}GetQoinData"'.format(stub.url)])